@@ -56,6 +56,40 @@ BERT_MODEL_RESULT_DICT = {
     "qqp_paws": "raw_paws.dev_and_test.jsonl", 
 }
 
+def read_model_predictions(path: str) -> pd.DataFrame:
+    """
+    One row per example with the `probs` (and `logits`) of the model: the JSON lines of a
+    predictor, or the `.npz` written by `evaluate_mult --predictions-output-format npz`, whose
+    float32 arrays are loaded directly (as float64, like pandas reads the JSON lines).
+    """
+    if not path.endswith(".npz"):
+        return pd.read_json(path, lines=True)
+    with np.load(path) as predictions:
+        df = pd.DataFrame({
+            "id": predictions["id"],
+            "logits": list(predictions["logits"].astype(np.float64)),
+            "probs": list(predictions["probs"].astype(np.float64)),
+        })
+        df.attrs["id_key"] = str(predictions["id_key"])
+    return df
+
+def align_to_predictions(df: pd.DataFrame, df_model: pd.DataFrame) -> pd.DataFrame:
+    """
+    The rows of `df` (one per line of the data file, e.g. the bias predictions) in the order
+    of the rows of `df_model`: through the id column of `.npz` predictions, matched against
+    the `id_key` field or the line number, and as is for JSON lines.
+    """
+    id_key = df_model.attrs.get("id_key")
+    if id_key is None:
+        return df
+    if id_key:
+        positions = pd.Index(df[id_key].astype(str)).get_indexer(df_model["id"])
+        if (positions < 0).any():
+            raise KeyError("%d predictions have no %s in the data" % ((positions < 0).sum(), id_key))
+    else:
+        positions = df_model["id"].to_numpy()
+    return df.iloc[positions].reset_index(drop=True)
+
 class Inference:
 
     def __init__(self, data_path: str,
@@ -118,9 +152,10 @@ class Inference:
                 print(f"bert path : {self.bert_path}")
                 print(f"bias path : {self.bias_path}")
 
-            self.df_bert[mode] = pd.read_json(self.bert_path ,lines=True)
+            self.df_bert[mode] = read_model_predictions(self.bert_path)
             
-            self.df_bias[mode] = pd.read_json(self.bias_path ,lines=True)               
+            self.df_bias[mode] = align_to_predictions(
+                pd.read_json(self.bias_path ,lines=True), self.df_bert[mode])
 
             if mode == "train":
 
@@ -331,15 +366,14 @@ def get_c(
         print(os.path.join(model_path, model_val_pred_file))
         print(f"current config : {config}")
 
-    df_bias_dev = pd.read_json(os.path.join(data_path, bias_val_pred_file), lines=True)
+    df_bert_dev = read_model_predictions(os.path.join(model_path, model_val_pred_file))
+
+    df_bias_dev = align_to_predictions(
+        pd.read_json(os.path.join(data_path, bias_val_pred_file), lines=True), df_bert_dev)
     bias_dev_score = [b for b in df_bias_dev[bias_probs_key]]
     bias_dev_score = np.array(bias_dev_score)
     # ya1x0_dev = fusion(bias_dev_score, x0)
 
-    df_bert_dev = pd.read_json(
-        os.path.join(model_path, model_val_pred_file), lines=True
-    )
-
     ya1x1prob_dev = []
     if fusion is not None:
         for p, h in zip(df_bert_dev[model_probs_key], bias_dev_score):
@@ -376,14 +410,12 @@ def get_c_te(
 ) -> List[float]:
     print(os.path.join(
         data_path, bias_val_pred_file))
-    df_bias_dev = pd.read_json(os.path.join(
-        data_path, bias_val_pred_file), lines=True)
+    df_bert_dev = read_model_predictions(os.path.join(model_path, model_val_pred_file))
+    df_bias_dev = align_to_predictions(pd.read_json(os.path.join(
+        data_path, bias_val_pred_file), lines=True), df_bert_dev)
     bias_dev_score = [b for b in df_bias_dev[bias_probs_key]]
     bias_dev_score = np.array(bias_dev_score)
     # ya1x0_dev = fusion(bias_dev_score, x0)
-    df_bert_dev = pd.read_json(
-        os.path.join(model_path, model_val_pred_file), lines=True
-    )
     
     c = sharpness_correction(bias_dev_score, df_bert_dev[model_probs_key], config=config)
     n_labels = bias_dev_score[0].shape[0]
@@ -147,7 +147,7 @@ def sharpness_correction(
     if verbose:
         print("Config: ", config)
 
-    model = CounterFactualModel(n_labels=config["N_LABELS"])
+    model = CounterFactualModel(n_labels=config["N_LABELS"], fuse=config["FUSE"])
     optimizer = torch.optim.Adam(
         model.parameters(),
         lr=config["LEARNING_RATE"]
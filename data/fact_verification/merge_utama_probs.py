@@ -1,7 +1,9 @@
 import argparse
+import gzip
+import io
 import json
 import math
-from typing import Dict, List, Union
+from typing import IO, Dict, List, Union
 
 # Configs'
 GROUND_TRUTH_LABEL = "gold_label"
@@ -38,9 +40,22 @@ def _merge(
     return doc
 
 
+def _open_text(file_path: str) -> IO[str]:
+    # plain, gzip (.gz) or zstd (.zst) compressed, also detected from the magic bytes
+    with open(file_path, 'rb') as f:
+        magic = f.read(4)
+    if file_path.endswith('.gz') or magic.startswith(b'\x1f\x8b'):
+        return gzip.open(file_path, 'rt')
+    if file_path.endswith('.zst') or magic.startswith(b'\x28\xb5\x2f\xfd'):
+        import zstandard
+        raw = open(file_path, 'rb')
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return open(file_path, 'r')
+
+
 def _read_jsonl(file_path: str) -> List[Dict[str, Union[str, int]]]:
     output = []
-    f = open(file_path, 'r')
+    f = _open_text(file_path)
     line = f.readline()
     while line:
         doc = json.loads(line)
@@ -76,7 +91,7 @@ if __name__ == "__main__":
     is_verbose = int(args.is_verbose)
 
     docs = _read_jsonl(args.org_train_jsonl)
-    bias_preds = json.load(open(args.utama_json, "r"))
+    bias_preds = json.load(_open_text(args.utama_json))
     merged_data = _merge(
         docs=docs,
         bias_preds=bias_preds,
@@ -1,5 +1,9 @@
 import my_package.commands
+import my_package.data.data_collators
 import my_package.data.dataset_readers
 import my_package.data.fields
+import my_package.data.samplers
 import my_package.models
-import my_package.predictors
\ No newline at end of file
+import my_package.predictors
+import my_package.training.callbacks
+import my_package.training.metrics
\ No newline at end of file
@@ -1 +1,10 @@
 from my_package.commands  import my_evaluate_command
+from my_package.commands import instance_memory_command
+from my_package.commands import cache_embeddings_command
+from my_package.commands import archive_head_command
+from my_package.commands import quantization_benchmark_command
+from my_package.commands import export_model_command
+from my_package.commands import teacher_probs_command
+from my_package.commands import robustness_latency_command
+from my_package.commands import predict_debias_command
+from my_package.commands import temperature_scaling_command
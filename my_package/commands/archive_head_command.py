@@ -0,0 +1,72 @@
+"""
+The `archive_head` subcommand exports one head of a trained `multi_head_classifier` as a
+standalone archive of its own classifier, with the shared encoder, so that it can be
+evaluated and used like a model trained on its own.
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+from copy import deepcopy
+
+import torch
+from overrides import overrides
+
+from allennlp.commands.subcommand import Subcommand
+from allennlp.common import Params
+from allennlp.models import Model
+from allennlp.models.archival import archive_model, load_archive
+
+from my_package.models.multi_head_classifier import MultiHeadClassifier
+
+logger = logging.getLogger(__name__)
+
+
+@Subcommand.register("archive_head")
+class ArchiveHead(Subcommand):
+    @overrides
+    def add_subparser(self, parser: argparse._SubParsersAction) -> argparse.ArgumentParser:
+        description = """Export one head of a multi-head classifier as a standalone archive"""
+        subparser = parser.add_parser(
+            self.name, description=description, help="Archive one head of a multi-head model."
+        )
+
+        subparser.add_argument(
+            "archive_file", type=str, help="path to an archived multi_head_classifier"
+        )
+
+        subparser.add_argument("head", type=str, help="name of the head to export")
+
+        subparser.add_argument(
+            "output_file", type=str, help="path of the model.tar.gz to write"
+        )
+
+        subparser.add_argument(
+            "--weights-file", type=str, help="a path that overrides which weights file to use"
+        )
+
+        subparser.set_defaults(func=archive_head_from_args)
+
+        return subparser
+
+
+def archive_head(archive_file: str, head: str, output_file: str, weights_file: str = None) -> Model:
+    archive = load_archive(archive_file, weights_file=weights_file)
+    config = MultiHeadClassifier.head_config(archive.config.as_dict(quiet=True), head)
+    state_dict = archive.model.head_state_dict(head)
+
+    model = Model.from_params(vocab=archive.model.vocab, params=Params(deepcopy(config["model"])))
+    model.load_state_dict(state_dict)
+
+    with tempfile.TemporaryDirectory() as serialization_dir:
+        Params(config).to_file(os.path.join(serialization_dir, "config.json"))
+        archive.model.vocab.save_to_files(os.path.join(serialization_dir, "vocabulary"))
+        torch.save(model.state_dict(), os.path.join(serialization_dir, "best.th"))
+        archive_model(serialization_dir, archive_path=output_file)
+    logger.info("Archived head %s of %s to %s", head, archive_file, output_file)
+    return model
+
+
+def archive_head_from_args(args: argparse.Namespace) -> Model:
+    return archive_head(args.archive_file, args.head, args.output_file, args.weights_file)
@@ -0,0 +1,139 @@
+"""
+The `cache_embeddings` subcommand runs the frozen encoder of an archived classifier over a
+dataset once and writes the pooled embeddings, labels and side features to a memory-mapped
+cache directory (see `my_package.modules.pooled_embedding_cache`). Heads with different
+losses can then be trained and evaluated from the cache with the "pooled_embedding_cache"
+dataset reader.
+"""
+
+import argparse
+import logging
+from typing import Any, Dict
+
+import numpy
+import torch
+from overrides import overrides
+
+from allennlp.commands.subcommand import Subcommand
+from allennlp.common import logging as common_logging
+from allennlp.common.util import prepare_environment
+from allennlp.data import DataLoader
+from allennlp.models.archival import load_archive
+from allennlp.nn import util as nn_util
+
+from my_package.modules.pooled_embedding_cache import PooledEmbeddingCacheWriter, pooled_encode
+
+logger = logging.getLogger(__name__)
+
+
+@Subcommand.register("cache_embeddings")
+class CacheEmbeddings(Subcommand):
+    @overrides
+    def add_subparser(self, parser: argparse._SubParsersAction) -> argparse.ArgumentParser:
+        description = """Write the pooled encoder outputs of a dataset to a memory-mapped cache"""
+        subparser = parser.add_parser(
+            self.name, description=description, help="Cache the pooled embeddings of a dataset."
+        )
+
+        subparser.add_argument("archive_file", type=str, help="path to an archived trained model")
+
+        subparser.add_argument(
+            "input_file", type=str, help="path to the file containing the data to encode"
+        )
+
+        subparser.add_argument(
+            "output_dir", type=str, help="directory to write the embedding cache to"
+        )
+
+        subparser.add_argument(
+            "--weights-file", type=str, help="a path that overrides which weights file to use"
+        )
+
+        subparser.add_argument(
+            "--cuda-device", type=int, default=-1, help="id of GPU to use (if any)"
+        )
+
+        subparser.add_argument(
+            "-o",
+            "--overrides",
+            type=str,
+            default="",
+            help=(
+                "a json(net) structure used to override the experiment configuration, e.g., "
+                "'{\"dataset_reader.type\": \"poe_snli\"}'.  Nested parameters can be specified "
+                "either with nested dictionaries or with dot syntax."
+            ),
+        )
+
+        subparser.add_argument(
+            "--batch-size", type=int, help="If non-empty, the batch size to use while encoding."
+        )
+
+        subparser.add_argument(
+            "--file-friendly-logging",
+            action="store_true",
+            default=False,
+            help="outputs tqdm status on separate lines and slows tqdm refresh rate",
+        )
+
+        subparser.set_defaults(func=cache_embeddings_from_args)
+
+        return subparser
+
+
+def batch_columns(batch: Dict[str, Any], vocab, label_namespace: str) -> Dict[str, numpy.ndarray]:
+    """
+    The per-example columns of a batch: the label strings and every side feature tensor.
+    Text fields and metadata are left out.
+    """
+    columns: Dict[str, numpy.ndarray] = {}
+    for name, value in batch.items():
+        if not isinstance(value, torch.Tensor):
+            continue
+        if name == "label":
+            columns[name] = numpy.array(
+                [vocab.get_token_from_index(int(i), label_namespace) for i in value.view(-1)]
+            )
+        else:
+            columns[name] = value.detach().cpu().numpy()
+    return columns
+
+
+def cache_embeddings_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    common_logging.FILE_FRIENDLY_LOGGING = args.file_friendly_logging
+
+    archive = load_archive(
+        args.archive_file,
+        weights_file=args.weights_file,
+        cuda_device=args.cuda_device,
+        overrides=args.overrides,
+    )
+    config = archive.config
+    prepare_environment(config)
+    model = archive.model
+    model.eval()
+
+    data_loader_params = config.get("validation_data_loader", None)
+    if data_loader_params is None:
+        data_loader_params = config.get("data_loader")
+    if args.batch_size:
+        data_loader_params["batch_size"] = args.batch_size
+    data_loader = DataLoader.from_params(
+        params=data_loader_params,
+        reader=archive.validation_dataset_reader,
+        data_path=args.input_file,
+    )
+    data_loader.index_with(model.vocab)
+
+    label_namespace = getattr(model, "_label_namespace", "labels")
+    metadata = {"archive_file": args.archive_file, "input_file": args.input_file}
+    logger.info("Caching the pooled embeddings of %s to %s", args.input_file, args.output_dir)
+    with PooledEmbeddingCacheWriter(args.output_dir, metadata) as writer, torch.no_grad():
+        for batch in data_loader:
+            batch = nn_util.move_to_device(batch, args.cuda_device)
+            embeddings = pooled_encode(model, batch["tokens"])
+            writer.append(
+                embeddings.cpu().numpy(), batch_columns(batch, model.vocab, label_namespace)
+            )
+    logger.info("Finished caching.")
+    return metadata
@@ -0,0 +1,74 @@
+"""
+The `export_model` subcommand traces an archived classifier (`custom_basic_classifier` or
+one of the debiasing classifiers) to a TorchScript or ONNX graph over token ids and masks,
+for CPU serving with `utils/exported_classifier.py`.
+"""
+
+import argparse
+import logging
+from typing import Any, Dict
+
+from overrides import overrides
+
+from allennlp.commands.subcommand import Subcommand
+from allennlp.common import Params
+from allennlp.models.archival import load_archive
+
+from my_package.modules.export import EXPORT_FORMATS, export_classifier
+
+logger = logging.getLogger(__name__)
+
+
+@Subcommand.register("export_model")
+class ExportModel(Subcommand):
+    @overrides
+    def add_subparser(self, parser: argparse._SubParsersAction) -> argparse.ArgumentParser:
+        description = """Export an archived classifier to a TorchScript or ONNX graph"""
+        subparser = parser.add_parser(
+            self.name, description=description, help="Export a classifier for serving."
+        )
+
+        subparser.add_argument("archive_file", type=str, help="path to an archived trained model")
+
+        subparser.add_argument(
+            "output_dir", type=str, help="directory to write the graph and runtime.json to"
+        )
+
+        subparser.add_argument(
+            "--format",
+            type=str,
+            default="torchscript",
+            choices=sorted(EXPORT_FORMATS),
+            help="the graph format to export",
+        )
+
+        subparser.add_argument(
+            "--weights-file", type=str, help="a path that overrides which weights file to use"
+        )
+
+        subparser.set_defaults(func=export_model_from_args)
+
+        return subparser
+
+
+def runtime_config(config: Params) -> Dict[str, Any]:
+    """
+    The tokenizer settings of the archive's dataset reader that the runtime needs.
+    """
+    reader = config.get("validation_dataset_reader", config.get("dataset_reader")).as_dict(quiet=True)
+    tokenizer = reader.get("tokenizer", {})
+    runtime: Dict[str, Any] = {}
+    if tokenizer.get("type") == "pretrained_transformer":
+        runtime["transformer_model"] = tokenizer["model_name"]
+        max_lengths = [
+            indexer.get("max_length") for indexer in reader.get("token_indexers", {}).values()
+        ]
+        runtime["max_length"] = max_lengths[0] if max_lengths else tokenizer.get("max_length")
+    return runtime
+
+
+def export_model_from_args(args: argparse.Namespace) -> str:
+    archive = load_archive(args.archive_file, weights_file=args.weights_file, cuda_device=-1)
+    return export_classifier(
+        archive.model, args.output_dir, args.format, runtime_config(archive.config)
+    )
@@ -0,0 +1,129 @@
+"""
+The `instance_memory` subcommand reads the first instances of a dataset with each
+metadata mode of the dataset reader and reports the average number of bytes held per instance.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from itertools import islice
+from typing import Any, Dict, List, Set
+
+import numpy
+import torch
+from overrides import overrides
+
+from allennlp.commands.subcommand import Subcommand
+from allennlp.common import Params
+from allennlp.data import Instance
+from allennlp.data.dataset_readers import DatasetReader
+
+from my_package.data.fields.metadata_fields import METADATA_MODES
+
+logger = logging.getLogger(__name__)
+
+
+@Subcommand.register("instance_memory")
+class InstanceMemory(Subcommand):
+    @overrides
+    def add_subparser(self, parser: argparse._SubParsersAction) -> argparse.ArgumentParser:
+        description = """Report the memory held per instance for each reader metadata mode"""
+        subparser = parser.add_parser(
+            self.name, description=description, help="Report bytes per instance of a reader."
+        )
+
+        subparser.add_argument(
+            "config_file", type=str, help="experiment configuration with a dataset_reader"
+        )
+
+        subparser.add_argument(
+            "input_file", type=str, help="path to the file containing the data to read"
+        )
+
+        subparser.add_argument(
+            "--max-instances", type=int, default=1000, help="number of instances to measure"
+        )
+
+        subparser.add_argument(
+            "--modes",
+            type=str,
+            default=",".join(METADATA_MODES),
+            help="comma separated metadata modes to compare",
+        )
+
+        subparser.add_argument(
+            "--output-file", type=str, help="optional path to write the report to as JSON"
+        )
+
+        subparser.set_defaults(func=instance_memory_from_args)
+
+        return subparser
+
+
+def deep_sizeof(obj: Any, seen: Set[int]) -> int:
+    """
+    Returns the number of bytes reachable from `obj` that have not been counted yet.
+    """
+    if id(obj) in seen or isinstance(obj, type):
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, torch.Tensor):
+        return sys.getsizeof(obj) + obj.element_size() * obj.nelement()
+    if isinstance(obj, numpy.ndarray):
+        return sys.getsizeof(obj) + (obj.nbytes if obj.base is not None else 0)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            # Properties that shadow a slot compute their value on access; don't count them.
+            if isinstance(getattr(type(obj), name, None), property) or not hasattr(obj, name):
+                continue
+            size += deep_sizeof(getattr(obj, name), seen)
+    return size
+
+
+def instance_nbytes(instance: Instance) -> int:
+    return deep_sizeof(instance, set())
+
+
+def measure_reader(reader: DatasetReader, input_file: str, max_instances: int) -> Dict[str, float]:
+    # `_read` yields the instances before token indexers are attached, so the shared indexers
+    # are not counted against every instance.
+    sizes = [instance_nbytes(instance) for instance in islice(reader._read(input_file), max_instances)]
+    return {
+        "num_instances": len(sizes),
+        "bytes_per_instance": float(numpy.mean(sizes)) if sizes else 0.0,
+    }
+
+
+def instance_memory_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    reader_params = Params.from_file(args.config_file).pop("dataset_reader").as_dict()
+    modes: List[str] = args.modes.split(",")
+
+    report: Dict[str, Any] = {}
+    for mode in modes:
+        params = dict(reader_params, combine_input_fields=False, metadata_mode=mode)
+        reader = DatasetReader.from_params(Params(params))
+        report[mode] = measure_reader(reader, args.input_file, args.max_instances)
+        logger.info(
+            "%s: %.1f bytes per instance", mode, report[mode]["bytes_per_instance"]
+        )
+
+    if "eager" in report:
+        eager = report["eager"]["bytes_per_instance"]
+        for mode in modes:
+            report[mode]["saved_fraction"] = (
+                1.0 - report[mode]["bytes_per_instance"] / eager if eager else 0.0
+            )
+
+    print(json.dumps(report, indent=2))
+    if args.output_file:
+        with open(args.output_file, "w") as fh:
+            json.dump(report, fh, indent=2)
+    return report
@@ -5,21 +5,36 @@ and report any metrics calculated by the model.
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 import json
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 from copy import deepcopy
 
 from overrides import overrides
 
 from allennlp.commands.subcommand import Subcommand
-from allennlp.common import logging as common_logging
-from allennlp.common.util import prepare_environment
-from allennlp.data import DataLoader
+from allennlp.common.checks import ConfigurationError
+from allennlp.common import Params, logging as common_logging
+from allennlp.common.util import dump_metrics, prepare_environment
+from allennlp.data import DataLoader, DatasetReader, Vocabulary
+from allennlp.data.data_loaders import SimpleDataLoader
 from allennlp.models.archival import load_archive
 from allennlp.training.util import evaluate
 
+from my_package.modules.bulk_inference import example_ids
+from my_package.modules.prediction_cache import (
+    PredictionCache,
+    PredictionRecorder,
+    archive_config,
+    evaluation_cache_keys,
+    write_binary_predictions,
+)
+from my_package.modules.quantization import quantize_dynamic_int8
+from my_package.modules.sharded_evaluation import ShardedEvaluator, evaluation_batch_size
+
 logger = logging.getLogger(__name__)
 
 
@@ -48,6 +63,22 @@ class Evaluate(Subcommand):
             help="optional path to write the predictions to as JSON lines",
         )
 
+        subparser.add_argument(
+            "--predictions-output-format",
+            type=str,
+            choices=["jsonl", "npz"],
+            default="jsonl",
+            help="format of the predictions: the JSON lines of `evaluate`, or one .npz per "
+            "dataset with the float32 logits and probs of every example and an id column",
+        )
+
+        subparser.add_argument(
+            "--id-key",
+            type=str,
+            help="example field used as the id column of the npz predictions, e.g. pairID "
+            "(default: the line number of the example)",
+        )
+
         subparser.add_argument(
             "--weights-file", type=str, help="a path that overrides which weights file to use"
         )
@@ -73,6 +104,35 @@ class Evaluate(Subcommand):
             "--batch-size", type=int, help="If non-empty, the batch size to use during evaluation."
         )
 
+        subparser.add_argument(
+            "--quantize",
+            action="store_true",
+            default=False,
+            help="evaluate on CPU with the encoder's linear layers dynamically quantized to int8",
+        )
+
+        subparser.add_argument(
+            "--num-shards",
+            type=int,
+            default=1,
+            help="evaluate on CPU with every dataset split across this many worker processes, "
+            "each with its own copy of the model",
+        )
+
+        subparser.add_argument(
+            "--threads-per-shard",
+            type=int,
+            help="number of intra-op threads of every worker process (default: the CPUs split "
+            "evenly between the workers)",
+        )
+
+        subparser.add_argument(
+            "--prediction-cache",
+            type=str,
+            help="directory of a prediction cache: the outputs of every dataset are stored there "
+            "and reused when the same archive, data file and reader config are evaluated again",
+        )
+
         subparser.add_argument(
             "--batch-weight-key",
             type=str,
@@ -110,7 +170,66 @@ class Evaluate(Subcommand):
         return subparser
 
 
-def evaluate_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+def load_evaluation_data(
+    data_loader_params: Params,
+    dataset_reader: DatasetReader,
+    data_path: str,
+    vocab: Optional[Vocabulary] = None,
+) -> DataLoader:
+    """
+    Builds the data loader of `data_path` and reads all its instances into memory, indexed
+    with `vocab` when it is given.
+    """
+    logger.info("Reading evaluation data from %s", data_path)
+    data_loader = DataLoader.from_params(
+        params=data_loader_params.duplicate(), reader=dataset_reader, data_path=data_path
+    )
+    if vocab is not None:
+        data_loader.index_with(vocab)
+    for _ in data_loader.iter_instances():
+        pass
+    return data_loader
+
+
+def archived_reader_config(args: argparse.Namespace) -> Dict[str, Any]:
+    config = archive_config(args.archive_file, args.overrides)
+    return config.get("validation_dataset_reader") or config["dataset_reader"]
+
+
+def prediction_cache_keys(args: argparse.Namespace, evaluation_data_paths: List[str]) -> List[str]:
+    """
+    The prediction cache key of every dataset, see `evaluation_cache_keys`.
+    """
+    return evaluation_cache_keys(
+        args.archive_file,
+        evaluation_data_paths,
+        weights_file=args.weights_file,
+        overrides=args.overrides,
+        quantize=args.quantize,
+        extend_vocab=args.extend_vocab,
+        batch_weight_key=args.batch_weight_key,
+    )
+
+
+def evaluate_from_cache(
+    cache: PredictionCache,
+    key: str,
+    output_file: Optional[str] = None,
+    predictions_output_file: Optional[str] = None,
+) -> Dict[str, Any]:
+    metrics = cache.load(key).meta["metrics"]
+    if predictions_output_file is not None:
+        cache.copy_predictions(key, predictions_output_file)
+    if output_file is not None:
+        dump_metrics(output_file, metrics, log=True)
+    return metrics
+
+
+def evaluate_from_args(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """
+    Evaluates the model on every dataset of `args.input_file` and returns the metrics by
+    dataset path.
+    """
     common_logging.FILE_FRIENDLY_LOGGING = args.file_friendly_logging
 
     # Disable some of the more verbose logging statements
@@ -118,6 +237,70 @@ def evaluate_from_args(args: argparse.Namespace) -> Dict[str, Any]:
     logging.getLogger("allennlp.nn.initializers").disabled = True
     logging.getLogger("allennlp.modules.token_embedders.embedding").setLevel(logging.INFO)
 
+    # split files
+    evaluation_data_path_list = args.input_file.split(":")
+    output_file_list = [None] * len(evaluation_data_path_list)
+    predictions_output_file_list = [None] * len(evaluation_data_path_list)
+    binary_predictions = args.predictions_output_format == "npz"
+    if (args.output_file != None):
+        output_file_list = args.output_file.split(":")
+        assert len(output_file_list) == len(evaluation_data_path_list), "number of output path must be equal number of dataset "
+    if (args.predictions_output_file != None):
+        predictions_output_file_list = args.predictions_output_file.split(";")
+        assert len(predictions_output_file_list) == len(evaluation_data_path_list), "number of predictions_output_file path must be equal number of dataset "
+
+    # The datasets already evaluated with the same archive, data and reader are served from
+    # the prediction cache, without loading the model.
+    all_metrics: Dict[str, Dict[str, Any]] = {}
+    cache = PredictionCache(args.prediction_cache) if args.prediction_cache else None
+    cache_keys: List[Optional[str]] = [None] * len(evaluation_data_path_list)
+    if cache is not None:
+        cache_keys = prediction_cache_keys(args, evaluation_data_path_list)
+    pending = []
+    cached_reader: Optional[DatasetReader] = None
+    for index, evaluation_data_path in enumerate(evaluation_data_path_list):
+        predictions_output_file = predictions_output_file_list[index]
+        # The JSON predictions are only served from entries that hold the ones `evaluate`
+        # wrote, the others are evaluated again.
+        json_predictions = predictions_output_file is not None and not binary_predictions
+        if (
+            cache is not None
+            and cache_keys[index] in cache
+            and (not json_predictions or cache.has_predictions(cache_keys[index]))
+        ):
+            logger.info("Predictions of %s found in the cache", evaluation_data_path)
+            cached = cache.load(cache_keys[index])
+            all_metrics[evaluation_data_path] = evaluate_from_cache(
+                cache,
+                cache_keys[index],
+                output_file_list[index],
+                predictions_output_file if json_predictions else None,
+            )
+            if binary_predictions and predictions_output_file is not None:
+                # The ids are read with the reader of the archive, the model is not needed.
+                if cached_reader is None:
+                    cached_reader = DatasetReader.from_params(Params(archived_reader_config(args)))
+                write_binary_predictions(
+                    predictions_output_file,
+                    cached.logits,
+                    cached.probs,
+                    example_ids(cached_reader, evaluation_data_path, args.id_key),
+                    cached.meta["labels"],
+                    id_key=args.id_key,
+                    gold=cached.gold,
+                )
+        else:
+            pending.append(index)
+    if not pending:
+        logger.info("Finished evaluating.")
+        return all_metrics
+
+    if args.num_shards > 1:
+        if args.cuda_device >= 0:
+            raise ConfigurationError("--num-shards evaluates on CPU, use --cuda-device -1")
+        if args.extend_vocab:
+            raise ConfigurationError("--num-shards cannot be used with --extend-vocab")
+
     # Load from archive
     archive = load_archive(
         args.archive_file,
@@ -128,62 +311,144 @@ def evaluate_from_args(args: argparse.Namespace) -> Dict[str, Any]:
     config = deepcopy(archive.config)
     prepare_environment(config)
     model = archive.model
+    if args.quantize:
+        if args.cuda_device >= 0:
+            raise ConfigurationError("--quantize runs on CPU, use --cuda-device -1")
+        model = quantize_dynamic_int8(model, inplace=True)
     model.eval()
 
     # Load the evaluation data
     dataset_reader = archive.validation_dataset_reader
 
-    # split files
-    evaluation_data_path_list = args.input_file.split(":")
-    if (args.output_file != None):
-        output_file_list = args.output_file.split(":")
-        assert len(output_file_list) == len(evaluation_data_path_list), "number of output path must be equal number of dataset "
-    if (args.predictions_output_file != None):
-        predictions_output_file_list = args.predictions_output_file.split(";")
-        assert len(predictions_output_file_list) == len(evaluation_data_path_list), "number of predictions_output_file path must be equal number of dataset "
+    data_loader_params = config.get("validation_data_loader", None)
+    if data_loader_params is None:
+        data_loader_params = config.get("data_loader")
+    if args.batch_size:
+        data_loader_params["batch_size"] = args.batch_size
 
-    # output file
-    output_file_path = None
-    predictions_output_file_path = None
-
-    for index in range(len(evaluation_data_path_list)):
-        config = deepcopy(archive.config)
-        evaluation_data_path =  evaluation_data_path_list[index]
-        if (args.output_file != None):
-            output_file_path = output_file_list[index]
-        if (args.predictions_output_file != None):
-            predictions_output_file_path = predictions_output_file_list[index]
+    embedding_sources = (
+        json.loads(args.embedding_sources_mapping) if args.embedding_sources_mapping else {}
+    )
 
-        logger.info("Reading evaluation data from %s", evaluation_data_path)
-        data_loader_params = config.get("validation_data_loader", None)
-        if data_loader_params is None:
-            data_loader_params = config.get("data_loader")
-        if args.batch_size:
-            data_loader_params["batch_size"] = args.batch_size
-        data_loader = DataLoader.from_params(
-            params=data_loader_params, reader=dataset_reader, data_path=evaluation_data_path
+    # The next dataset is read (and, unless the vocabulary is extended with it, indexed) by a
+    # background worker while the current one is evaluated.
+    index_vocab = None if args.extend_vocab else model.vocab
+    sharded = args.num_shards > 1
+    sharded_evaluator = (
+        ShardedEvaluator(
+            args.num_shards,
+            args.archive_file,
+            weights_file=args.weights_file,
+            overrides=args.overrides,
+            quantize=args.quantize,
+            threads_per_shard=args.threads_per_shard,
         )
-
-        embedding_sources = (
-            json.loads(args.embedding_sources_mapping) if args.embedding_sources_mapping else {}
+        if sharded
+        else nullcontext()
+    )
+    with ThreadPoolExecutor(max_workers=1) as executor, sharded_evaluator:
+        next_data_loader = executor.submit(
+            load_evaluation_data,
+            data_loader_params,
+            dataset_reader,
+            evaluation_data_path_list[pending[0]],
+            index_vocab,
         )
-    
-        if args.extend_vocab:
-            logger.info("Vocabulary is being extended with test instances.")
-            model.vocab.extend_from_instances(instances=data_loader.iter_instances())
-            model.extend_embedder_vocab(embedding_sources)
-
-        data_loader.index_with(model.vocab)
+        for position, index in enumerate(pending):
+            evaluation_data_path = evaluation_data_path_list[index]
+            data_loader = next_data_loader.result()
+            if position + 1 < len(pending):
+                next_data_loader = executor.submit(
+                    load_evaluation_data,
+                    data_loader_params,
+                    dataset_reader,
+                    evaluation_data_path_list[pending[position + 1]],
+                    index_vocab,
+                )
+
+            if args.extend_vocab:
+                logger.info("Vocabulary is being extended with test instances.")
+                model.vocab.extend_from_instances(instances=data_loader.iter_instances())
+                model.extend_embedder_vocab(embedding_sources)
+                data_loader.index_with(model.vocab)
+
+            logger.info("Evaluating on %s", evaluation_data_path)
+            predictions_output_file = predictions_output_file_list[index]
+            binary_output = binary_predictions and predictions_output_file is not None
+            if cache is None and not sharded and not binary_output:
+                all_metrics[evaluation_data_path] = evaluate(
+                    model,
+                    data_loader,
+                    args.cuda_device,
+                    args.batch_weight_key,
+                    output_file=output_file_list[index],
+                    predictions_output_file=predictions_output_file,
+                )
+                continue
+
+            # The outputs are cached (or written as arrays, or merged across shards) in file
+            # order, so the instances are batched in order.
+            batch_size = evaluation_batch_size(data_loader_params)
+            instances = list(data_loader.iter_instances())
+            if sharded:
+                evaluation = sharded_evaluator.evaluate(
+                    model,
+                    instances,
+                    batch_size,
+                    args.batch_weight_key,
+                    human_readable=predictions_output_file is not None and not binary_predictions,
+                )
+                metrics, logits, probs, gold = evaluation[:4]
+                if evaluation.predictions is not None:
+                    with open(predictions_output_file, "w") as fh:
+                        fh.writelines(line + "\n" for line in evaluation.predictions)
+                if output_file_list[index] is not None:
+                    dump_metrics(output_file_list[index], metrics, log=True)
+            else:
+                ordered_data_loader = SimpleDataLoader(instances, batch_size, vocab=model.vocab)
+                with PredictionRecorder(model) as recorder:
+                    metrics = evaluate(
+                        model,
+                        ordered_data_loader,
+                        args.cuda_device,
+                        args.batch_weight_key,
+                        output_file=output_file_list[index],
+                        predictions_output_file=(
+                            None if binary_predictions else predictions_output_file
+                        ),
+                    )
+                logits, probs, gold = recorder.arrays()
+            label_namespace = getattr(model, "_label_namespace", "labels")
+            index_to_label = model.vocab.get_index_to_token_vocabulary(label_namespace)
+            labels = [index_to_label[i] for i in range(len(index_to_label))]
+            if cache is not None:
+                cache.save(
+                    cache_keys[index],
+                    logits,
+                    probs,
+                    gold,
+                    meta={
+                        "archive_file": args.archive_file,
+                        "data_path": evaluation_data_path,
+                        "labels": labels,
+                        "batch_size": batch_size,
+                        "metrics": metrics,
+                    },
+                    predictions_file=None if binary_predictions else predictions_output_file,
+                )
+            if binary_output:
+                write_binary_predictions(
+                    predictions_output_file,
+                    logits,
+                    probs,
+                    example_ids(dataset_reader, evaluation_data_path, args.id_key),
+                    labels,
+                    id_key=args.id_key,
+                    gold=gold,
+                )
+            all_metrics[evaluation_data_path] = metrics
 
-        metrics = evaluate(
-            model,
-            data_loader,
-            args.cuda_device,
-            args.batch_weight_key,
-            output_file=output_file_path,
-            predictions_output_file=predictions_output_file_path,
-        )
     logger.info("Finished evaluating.")
 
-    return metrics
+    return all_metrics
 
@@ -0,0 +1,266 @@
+"""
+The `predict_debias` subcommand runs counterfactual inference debiasing end to end: it
+predicts with every archived model (e.g. one per seed) and with a bias scorer on a
+development file and on test files in memory, fits the TIE and TE_model constants on the
+development predictions and reports the factual, TIE and TE_model accuracy and macro F1 of
+every model on every test file, with their mean and standard deviation across the models.
+"""
+
+import argparse
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy
+from overrides import overrides
+
+from allennlp.commands.subcommand import Subcommand
+from allennlp.common.checks import ConfigurationError
+from allennlp.models import Model
+from allennlp.models.archival import load_archive
+
+from my_package.data.dataset_readers.sentence_pair_reader import SentencePairReader
+from my_package.data.score_tables import ScoreTable
+from my_package.modules.bulk_inference import BulkPredictions, bulk_predict, example_ids
+from my_package.modules.counterfactual_inference import (
+    counterfactual_scores,
+    fit_corrections,
+    score_metrics,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@Subcommand.register("predict_debias")
+class PredictDebias(Subcommand):
+    @overrides
+    def add_subparser(self, parser: argparse._SubParsersAction) -> argparse.ArgumentParser:
+        description = """Debias models with counterfactual inference and report TIE and TE_model"""
+        subparser = parser.add_parser(
+            self.name, description=description, help="Predict and debias with a bias model."
+        )
+
+        subparser.add_argument(
+            "archive_files", type=str, nargs="+", help="paths to the archived models (e.g. seeds)"
+        )
+
+        subparser.add_argument(
+            "--dev-file", type=str, required=True, help="path to the data the constants are fit on"
+        )
+
+        subparser.add_argument(
+            "--test",
+            type=str,
+            action="append",
+            required=True,
+            help="NAME=PATH of a test set, e.g. hans=data/nli/heuristics_evaluation_set.jsonl"
+            " (repeatable)",
+        )
+
+        subparser.add_argument(
+            "--bias-scorer",
+            type=str,
+            required=True,
+            help="path to an archived bias model, or to an id-keyed score table holding the bias "
+            "probabilities of the dev and test examples",
+        )
+
+        subparser.add_argument(
+            "--bias-column",
+            type=str,
+            default="bias_probs",
+            help="column of the bias probabilities in the score table",
+        )
+
+        subparser.add_argument(
+            "--bias-labels",
+            type=str,
+            help="comma separated labels of the score table columns (default: the labels of the "
+            "models)",
+        )
+
+        subparser.add_argument(
+            "--batch-size", type=int, default=64, help="the batch size to use for inference"
+        )
+
+        subparser.add_argument(
+            "--cuda-device", type=int, default=-1, help="id of GPU to use (if any)"
+        )
+
+        subparser.add_argument(
+            "--fit-epochs", type=int, default=16, help="epochs of the fit of the constants"
+        )
+
+        subparser.add_argument(
+            "--fit-learning-rate",
+            type=float,
+            default=1e-4,
+            help="learning rate of the fit of the constants",
+        )
+
+        subparser.add_argument(
+            "--seed", type=int, default=42, help="seed of the shuffling of the fit"
+        )
+
+        subparser.add_argument(
+            "--output-file", type=str, help="optional path to write the report to as JSON"
+        )
+
+        subparser.set_defaults(func=predict_debias_from_args)
+
+        return subparser
+
+
+def model_labels(model: Model) -> List[str]:
+    label_namespace = getattr(model, "_label_namespace", "labels")
+    index_to_label = model.vocab.get_index_to_token_vocabulary(label_namespace)
+    return [index_to_label[index] for index in range(len(index_to_label))]
+
+
+class BiasScorer:
+    """
+    The bias probabilities of the examples of a data file, in the label order of the models,
+    from an archived bias model or from an id-keyed score table.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        column: str = "bias_probs",
+        table_labels: Optional[List[str]] = None,
+        batch_size: int = 64,
+        cuda_device: int = -1,
+    ) -> None:
+        self._batch_size = batch_size
+        self._cuda_device = cuda_device
+        self._table_labels = table_labels
+        self._table: Optional[ScoreTable] = None
+        self._archive = None
+        if os.path.isdir(path) and os.path.exists(os.path.join(path, "meta.json")):
+            self._table = ScoreTable(path, columns=[column])
+            self._column = column
+            if self._table.id_key is None:
+                raise ConfigurationError(
+                    "A positional score table cannot score several files, build an id-keyed one"
+                )
+        else:
+            self._archive = load_archive(path, cuda_device=cuda_device)
+            self._archive.model.eval()
+
+    def bias_probs(
+        self, file_path: str, reader: SentencePairReader, labels: List[str]
+    ) -> numpy.ndarray:
+        """
+        The bias probabilities of the examples `reader` keeps from `file_path`, in file order,
+        with the columns in the order of `labels`.
+        """
+        if self._table is not None:
+            rows = []
+            for example_id in example_ids(reader, file_path, self._table.id_key):
+                row = self._table.row_of({self._table.id_key: example_id}, 0)
+                if row is None:
+                    raise ConfigurationError(
+                        "%s is not in score table %s" % (example_id, self._table.path)
+                    )
+                rows.append(row)
+            probs = numpy.asarray(self._table.columns[self._column][rows], dtype=numpy.float64)
+            bias_labels = self._table_labels or labels
+        else:
+            model = self._archive.model
+            probs = bulk_predict(
+                model,
+                self._archive.validation_dataset_reader,
+                file_path,
+                batch_size=self._batch_size,
+                cuda_device=self._cuda_device,
+            ).probs.astype(numpy.float64)
+            bias_labels = model_labels(model)
+        if sorted(bias_labels) != sorted(labels):
+            raise ConfigurationError(
+                "The bias labels %s are not the labels of the model %s" % (bias_labels, labels)
+            )
+        return probs[:, [bias_labels.index(label) for label in labels]]
+
+
+def mean_and_std(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    The mean and the standard deviation of every number of the nested `reports`.
+    """
+    first = reports[0]
+    if isinstance(first, dict):
+        return {key: mean_and_std([report[key] for report in reports]) for key in first}
+    values = numpy.array(reports, dtype=numpy.float64)
+    return {"mean": float(values.mean()), "std": float(values.std())}
+
+
+def predict_debias_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    tests = dict(spec.split("=", 1) for spec in args.test)
+    scorer = BiasScorer(
+        args.bias_scorer,
+        column=args.bias_column,
+        table_labels=args.bias_labels.split(",") if args.bias_labels else None,
+        batch_size=args.batch_size,
+        cuda_device=args.cuda_device,
+    )
+    fit_kwargs = dict(epochs=args.fit_epochs, learning_rate=args.fit_learning_rate, seed=args.seed)
+
+    # The bias probabilities do not depend on the model, they are computed once per file and
+    # per label order and reader of the models.
+    bias_probs: Dict[Tuple[str, Tuple[str, ...], str], numpy.ndarray] = {}
+    models_report: Dict[str, Any] = {}
+    for archive_file in args.archive_files:
+        archive = load_archive(archive_file, cuda_device=args.cuda_device)
+        model = archive.model.eval()
+        reader = archive.validation_dataset_reader
+        labels = model_labels(model)
+        reader_config = archive.config.get(
+            "validation_dataset_reader", archive.config.get("dataset_reader")
+        )
+        reader_key = json.dumps(reader_config.as_dict(quiet=True), sort_keys=True)
+
+        def predict(path: str) -> Tuple[BulkPredictions, numpy.ndarray]:
+            predictions = bulk_predict(
+                model, reader, path, batch_size=args.batch_size, cuda_device=args.cuda_device
+            )
+            key = (path, tuple(labels), reader_key)
+            if key not in bias_probs:
+                bias_probs[key] = scorer.bias_probs(path, reader, labels)
+            if len(bias_probs[key]) != len(predictions.probs):
+                raise ConfigurationError(
+                    "%d bias predictions for %d examples of %s"
+                    % (len(bias_probs[key]), len(predictions.probs), path)
+                )
+            return predictions, bias_probs[key]
+
+        logger.info("Fitting the constants of %s on %s", archive_file, args.dev_file)
+        dev, dev_bias_probs = predict(args.dev_file)
+        c, c_te = fit_corrections(dev.probs.astype(numpy.float64), dev_bias_probs, **fit_kwargs)
+        model_report: Dict[str, Any] = {"c": c.tolist(), "c_te": c_te.tolist()}
+        for name, path in tests.items():
+            logger.info("Debiasing %s on %s", archive_file, path)
+            test, test_bias_probs = predict(path)
+            scores = counterfactual_scores(
+                test.probs.astype(numpy.float64), test_bias_probs, c, c_te
+            )
+            model_report[name] = {
+                mode: score_metrics(mode_scores, labels, test.gold_labels, reader)
+                for mode, mode_scores in scores.items()
+            }
+        models_report[archive_file] = model_report
+        logger.info("%s: %s", archive_file, json.dumps(model_report))
+
+    report = {
+        "models": models_report,
+        "summary": mean_and_std(
+            [
+                {name: models_report[archive_file][name] for name in tests}
+                for archive_file in args.archive_files
+            ]
+        ),
+    }
+    logger.info("Summary: %s", json.dumps(report["summary"], indent=2))
+    if args.output_file:
+        with open(args.output_file, "w") as fh:
+            json.dump(report, fh, indent=2)
+    return report
@@ -0,0 +1,121 @@
+"""
+The `quantization_benchmark` subcommand compares an archived classifier in float32 with its
+dynamically int8-quantized version on CPU over a benchmark split, and reports the metrics of
+both, the accuracy delta and the throughput gain.
+"""
+
+import argparse
+import io
+import json
+import logging
+import time
+from itertools import islice
+from typing import Any, Dict, List
+
+import torch
+from overrides import overrides
+
+from allennlp.commands.subcommand import Subcommand
+from allennlp.data import Instance
+from allennlp.data.data_loaders import SimpleDataLoader
+from allennlp.models import Model
+from allennlp.models.archival import load_archive
+from allennlp.training.util import evaluate
+
+from my_package.modules.quantization import quantize_dynamic_int8
+
+logger = logging.getLogger(__name__)
+
+
+@Subcommand.register("quantization_benchmark")
+class QuantizationBenchmark(Subcommand):
+    @overrides
+    def add_subparser(self, parser: argparse._SubParsersAction) -> argparse.ArgumentParser:
+        description = """Compare a model with its int8 dynamically quantized version on CPU"""
+        subparser = parser.add_parser(
+            self.name, description=description, help="Benchmark int8 quantized CPU inference."
+        )
+
+        subparser.add_argument("archive_file", type=str, help="path to an archived trained model")
+
+        subparser.add_argument(
+            "input_file", type=str, help="path to the file containing the benchmark data"
+        )
+
+        subparser.add_argument(
+            "--max-instances", type=int, default=2000, help="number of instances to evaluate"
+        )
+
+        subparser.add_argument(
+            "--batch-size", type=int, default=32, help="the batch size to use during evaluation"
+        )
+
+        subparser.add_argument(
+            "--threads", type=int, help="number of CPU threads torch may use"
+        )
+
+        subparser.add_argument(
+            "-o",
+            "--overrides",
+            type=str,
+            default="",
+            help="a json(net) structure used to override the experiment configuration",
+        )
+
+        subparser.add_argument(
+            "--output-file", type=str, help="optional path to write the report to as JSON"
+        )
+
+        subparser.set_defaults(func=quantization_benchmark_from_args)
+
+        return subparser
+
+
+def model_size_mb(model: Model) -> float:
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2 ** 20
+
+
+def benchmark(model: Model, instances: List[Instance], batch_size: int) -> Dict[str, Any]:
+    data_loader = SimpleDataLoader(instances, batch_size, vocab=model.vocab)
+    start = time.perf_counter()
+    metrics = evaluate(model, data_loader, cuda_device=-1)
+    seconds = time.perf_counter() - start
+    return {
+        "metrics": metrics,
+        "seconds": seconds,
+        "instances_per_second": len(instances) / seconds,
+        "size_mb": model_size_mb(model),
+    }
+
+
+def quantization_benchmark_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    archive = load_archive(args.archive_file, cuda_device=-1, overrides=args.overrides)
+    model = archive.model.eval()
+    reader = archive.validation_dataset_reader
+    instances = list(islice(reader.read(args.input_file), args.max_instances))
+    logger.info("Benchmarking on %d instances of %s", len(instances), args.input_file)
+
+    report: Dict[str, Any] = {"num_instances": len(instances)}
+    report["fp32"] = benchmark(model, instances, args.batch_size)
+    report["int8"] = benchmark(quantize_dynamic_int8(model), instances, args.batch_size)
+    if "accuracy" in report["fp32"]["metrics"]:
+        report["accuracy_delta"] = (
+            report["int8"]["metrics"]["accuracy"] - report["fp32"]["metrics"]["accuracy"]
+        )
+    report["speedup"] = report["int8"]["instances_per_second"] / report["fp32"]["instances_per_second"]
+    logger.info(
+        "int8: %.2fx throughput, accuracy delta %s",
+        report["speedup"],
+        report.get("accuracy_delta"),
+    )
+
+    print(json.dumps(report, indent=2))
+    if args.output_file:
+        with open(args.output_file, "w") as fh:
+            json.dump(report, fh, indent=2)
+    return report
@@ -0,0 +1,132 @@
+"""
+The `robustness_latency` subcommand compares archived models, typically a debiased teacher and
+the students distilled from it, on challenge sets (HANS, FEVER-symmetric, PAWS, ...) and on
+inference cost: accuracy on every set next to the number of parameters, the size, the
+throughput and the per-batch latency on the chosen device.
+"""
+
+import argparse
+import json
+import logging
+from typing import Any, Dict
+
+import numpy
+import torch
+from overrides import overrides
+
+from allennlp.commands.subcommand import Subcommand
+from allennlp.common.checks import ConfigurationError
+from allennlp.models.archival import load_archive
+
+from my_package.commands.quantization_benchmark_command import model_size_mb
+from my_package.modules.bulk_inference import BulkPredictions, bulk_predict, challenge_accuracy
+
+logger = logging.getLogger(__name__)
+
+
+@Subcommand.register("robustness_latency")
+class RobustnessLatency(Subcommand):
+    @overrides
+    def add_subparser(self, parser: argparse._SubParsersAction) -> argparse.ArgumentParser:
+        description = """Compare models on challenge sets and on inference latency"""
+        subparser = parser.add_parser(
+            self.name, description=description, help="Compare robustness against latency."
+        )
+
+        subparser.add_argument(
+            "archive_files", type=str, nargs="+", help="paths to the archived models to compare"
+        )
+
+        subparser.add_argument(
+            "--dataset",
+            type=str,
+            action="append",
+            required=True,
+            help="NAME=PATH of an evaluation set, e.g. hans=data/nli/heuristics_evaluation_set.jsonl"
+            " (repeatable)",
+        )
+
+        subparser.add_argument(
+            "--latency-dataset",
+            type=str,
+            help="NAME of the set the latency is measured on (default: the first one)",
+        )
+
+        subparser.add_argument(
+            "--max-instances",
+            type=int,
+            help="only evaluate the first instances of every set",
+        )
+
+        subparser.add_argument(
+            "--batch-size", type=int, default=32, help="the batch size to use during evaluation"
+        )
+
+        subparser.add_argument(
+            "--cuda-device", type=int, default=-1, help="id of GPU to use (if any)"
+        )
+
+        subparser.add_argument("--threads", type=int, help="number of CPU threads torch may use")
+
+        subparser.add_argument(
+            "--output-file", type=str, help="optional path to write the report to as JSON"
+        )
+
+        subparser.set_defaults(func=robustness_latency_from_args)
+
+        return subparser
+
+
+def latency_report(predictions: BulkPredictions, batch_size: int) -> Dict[str, float]:
+    # The first batch pays for the lazy initializations, it is left out of the latencies.
+    seconds = numpy.array(predictions.batch_seconds[1:] or predictions.batch_seconds)
+    return {
+        "batch_size": batch_size,
+        "instances_per_second": len(predictions.ids) / sum(predictions.batch_seconds),
+        "batch_latency_ms_p50": float(numpy.percentile(seconds, 50) * 1000),
+        "batch_latency_ms_p95": float(numpy.percentile(seconds, 95) * 1000),
+    }
+
+
+def robustness_latency_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    datasets = dict(spec.split("=", 1) for spec in args.dataset)
+    latency_dataset = args.latency_dataset or args.dataset[0].split("=", 1)[0]
+    if latency_dataset not in datasets:
+        raise ConfigurationError("Unknown latency dataset %s" % latency_dataset)
+
+    report: Dict[str, Any] = {}
+    for archive_file in args.archive_files:
+        archive = load_archive(archive_file, cuda_device=args.cuda_device)
+        model = archive.model.eval()
+        reader = archive.validation_dataset_reader
+        label_namespace = getattr(model, "_label_namespace", "labels")
+        index_to_label = model.vocab.get_index_to_token_vocabulary(label_namespace)
+        labels = [index_to_label[index] for index in range(len(index_to_label))]
+
+        model_report: Dict[str, Any] = {
+            "num_parameters": sum(parameter.numel() for parameter in model.parameters()),
+            "size_mb": model_size_mb(model),
+        }
+        for name, path in datasets.items():
+            logger.info("Evaluating %s on %s", archive_file, path)
+            predictions = bulk_predict(
+                model,
+                reader,
+                path,
+                batch_size=args.batch_size,
+                cuda_device=args.cuda_device,
+                max_instances=args.max_instances,
+            )
+            model_report["%s_accuracy" % name] = challenge_accuracy(predictions, labels, reader)
+            if name == latency_dataset:
+                model_report.update(latency_report(predictions, args.batch_size))
+        report[archive_file] = model_report
+        logger.info("%s: %s", archive_file, json.dumps(model_report))
+
+    print(json.dumps(report, indent=2))
+    if args.output_file:
+        with open(args.output_file, "w") as fh:
+            json.dump(report, fh, indent=2)
+    return report
@@ -0,0 +1,108 @@
+"""
+The `teacher_probs` subcommand runs an archived (debiased) teacher over a training file in
+bulk and writes its probabilities as an id-keyed score table with a `distill_probs` column, to
+train a student with the `distill_*` readers and `"score_table": <output_dir>`.
+"""
+
+import argparse
+import json
+import logging
+from typing import Any, Dict
+
+import numpy
+import torch
+from overrides import overrides
+
+from allennlp.commands.subcommand import Subcommand
+from allennlp.models.archival import load_archive
+
+from my_package.data.score_tables import write_score_table
+from my_package.modules.bulk_inference import bulk_predict
+
+logger = logging.getLogger(__name__)
+
+
+@Subcommand.register("teacher_probs")
+class TeacherProbs(Subcommand):
+    @overrides
+    def add_subparser(self, parser: argparse._SubParsersAction) -> argparse.ArgumentParser:
+        description = """Write the probabilities of a teacher model as a distillation score table"""
+        subparser = parser.add_parser(
+            self.name, description=description, help="Generate teacher probabilities in bulk."
+        )
+
+        subparser.add_argument("archive_file", type=str, help="path to the archived teacher")
+
+        subparser.add_argument("input_file", type=str, help="path to the training data")
+
+        subparser.add_argument("output_dir", type=str, help="directory of the score table")
+
+        subparser.add_argument(
+            "--id-key",
+            type=str,
+            required=True,
+            help="example id key of the data, e.g. pairID (MNLI), id (FEVER, QQP)",
+        )
+
+        subparser.add_argument(
+            "--column", type=str, default="distill_probs", help="name of the probability column"
+        )
+
+        subparser.add_argument(
+            "--temperature",
+            type=float,
+            default=1.0,
+            help="soften the teacher probabilities with this temperature",
+        )
+
+        subparser.add_argument(
+            "--batch-size", type=int, default=128, help="the batch size to use for inference"
+        )
+
+        subparser.add_argument(
+            "--cuda-device", type=int, default=-1, help="id of GPU to use (if any)"
+        )
+
+        subparser.add_argument(
+            "-o",
+            "--overrides",
+            type=str,
+            default="",
+            help="a json(net) structure used to override the experiment configuration",
+        )
+
+        subparser.set_defaults(func=teacher_probs_from_args)
+
+        return subparser
+
+
+def soften(probs: numpy.ndarray, temperature: float) -> numpy.ndarray:
+    if temperature == 1.0:
+        return probs
+    logits = numpy.log(numpy.clip(probs, 1e-12, None)) / temperature
+    return torch.softmax(torch.from_numpy(logits), dim=-1).numpy()
+
+
+def teacher_probs_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    archive = load_archive(args.archive_file, cuda_device=args.cuda_device, overrides=args.overrides)
+    predictions = bulk_predict(
+        archive.model,
+        archive.validation_dataset_reader,
+        args.input_file,
+        id_key=args.id_key,
+        batch_size=args.batch_size,
+        cuda_device=args.cuda_device,
+    )
+    write_score_table(
+        args.output_dir,
+        {args.column: soften(predictions.probs, args.temperature)},
+        ids=predictions.ids,
+        id_key=args.id_key,
+    )
+    summary = {
+        "num_rows": len(predictions.ids),
+        "seconds": sum(predictions.batch_seconds),
+        "output_dir": args.output_dir,
+    }
+    logger.info("Teacher probabilities: %s", json.dumps(summary))
+    return summary
@@ -0,0 +1,104 @@
+"""
+The `temp_scale` subcommand fits the temperature of classifiers on CPU from their validation
+logits, for many models (e.g. seeds) in one invocation. The logits are read from an
+evaluation dump (the `.npz` predictions of `evaluate_mult --predictions-output-format npz`
+or an entry of its prediction cache) or, for an archived model, from the prediction cache
+when it holds them and from one forward pass over the validation data otherwise.
+"""
+
+import argparse
+import json
+import logging
+from typing import Any, Dict
+
+import torch
+from overrides import overrides
+
+from allennlp.commands.subcommand import Subcommand
+
+from my_package.modules.prediction_cache import PredictionCache
+from my_package.modules.temperature_scaling import fit_temperatures
+
+logger = logging.getLogger(__name__)
+
+
+@Subcommand.register("temp_scale")
+class TemperatureScaling(Subcommand):
+    @overrides
+    def add_subparser(self, parser: argparse._SubParsersAction) -> argparse.ArgumentParser:
+        description = """Fit the temperature of models from their validation logits"""
+        subparser = parser.add_parser(
+            self.name, description=description, help="Fit temperatures on CPU."
+        )
+
+        subparser.add_argument(
+            "sources",
+            type=str,
+            nargs="+",
+            help="archived models, .npz predictions of evaluate_mult or prediction cache entries",
+        )
+
+        subparser.add_argument(
+            "--input-file",
+            type=str,
+            help="path to the validation data, needed for archived models",
+        )
+
+        subparser.add_argument(
+            "--prediction-cache",
+            type=str,
+            help="prediction cache directory of evaluate_mult: the validation logits of archived "
+            "models are read from it when present, and stored in it otherwise",
+        )
+
+        subparser.add_argument(
+            "--batch-size", type=int, help="If non-empty, the batch size to use for inference."
+        )
+
+        subparser.add_argument(
+            "-o",
+            "--overrides",
+            type=str,
+            default="",
+            help="a json(net) structure used to override the experiment configuration",
+        )
+
+        subparser.add_argument("--threads", type=int, help="number of CPU threads torch may use")
+
+        subparser.add_argument(
+            "--lr", type=float, default=0.01, help="learning rate of the LBFGS fit"
+        )
+
+        subparser.add_argument(
+            "--max-iter",
+            type=int,
+            default=500,
+            help="iterations of the LBFGS fit, cheap on cached logits (50 in set_temperature)",
+        )
+
+        subparser.add_argument(
+            "--output-file", type=str, help="optional path to write the temperatures to as JSON"
+        )
+
+        subparser.set_defaults(func=temp_scale_from_args)
+
+        return subparser
+
+
+def temp_scale_from_args(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    cache = PredictionCache(args.prediction_cache) if args.prediction_cache else None
+    report = fit_temperatures(
+        args.sources,
+        input_file=args.input_file,
+        cache=cache,
+        overrides=args.overrides,
+        batch_size=args.batch_size,
+        lr=args.lr,
+        max_iter=args.max_iter,
+    )
+    if args.output_file:
+        with open(args.output_file, "w") as fh:
+            json.dump(report, fh, indent=2)
+    return report
@@ -0,0 +1 @@
+from my_package.data.data_collators import counterfactual_collator
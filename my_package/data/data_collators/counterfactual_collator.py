@@ -0,0 +1,173 @@
+from typing import Dict, List, Tuple
+
+import torch
+from overrides import overrides
+
+from allennlp.common import cached_transformers
+from allennlp.data.data_loaders.data_collator import DataCollator, allennlp_collate
+from allennlp.data.data_loaders.data_loader import TensorDict
+from allennlp.data.instance import Instance
+
+
+COUNTERFACTUAL_STRATEGIES = ("full_mask", "overlap_mask", "hypothesis_only")
+
+
+def content_mask(
+    token_ids: torch.Tensor, mask: torch.Tensor, special_ids: List[int]
+) -> torch.Tensor:
+    """
+    Returns a boolean tensor that is `True` for every real (non-padding, non-special) token.
+    """
+    content = mask.bool()
+    for special_id in special_ids:
+        content = content & (token_ids != special_id)
+    return content
+
+
+def split_segments(
+    token_ids: torch.Tensor, content: torch.Tensor, sep_token_id: int
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Splits the content positions of a combined `premise [SEP] hypothesis` sequence into a
+    premise mask and a hypothesis mask. Everything before the first separator belongs to the
+    premise, so this also works for tokenizers that do not produce `type_ids`.
+    """
+    is_sep = token_ids == sep_token_id
+    segment = is_sep.long().cumsum(dim=-1) - is_sep.long()
+    premise = content & (segment == 0)
+    hypothesis = content & (segment > 0)
+    return premise, hypothesis
+
+
+def counterfactual_positions(
+    strategy: str,
+    premise_ids: torch.Tensor,
+    premise_content: torch.Tensor,
+    hypothesis_ids: torch.Tensor,
+    hypothesis_content: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Computes which premise and hypothesis positions have to be replaced by the mask token.
+
+    The premise and hypothesis tensors may be the same combined sequence (with disjoint content
+    masks) or two separate sequences of different lengths.
+
+    # Parameters
+
+    strategy : `str`
+        One of `"full_mask"` (mask every token of both sentences), `"overlap_mask"` (mask the
+        tokens that also occur in the other sentence) or `"hypothesis_only"` (mask the whole
+        premise and keep the hypothesis).
+
+    # Returns
+
+    A `(premise_positions, hypothesis_positions)` pair of boolean tensors shaped like
+    `premise_ids` and `hypothesis_ids`.
+    """
+    if strategy == "full_mask":
+        return premise_content, hypothesis_content
+    if strategy == "hypothesis_only":
+        return premise_content, torch.zeros_like(hypothesis_content)
+    if strategy == "overlap_mask":
+        # (batch_size, premise_length, hypothesis_length)
+        matches = premise_ids.unsqueeze(-1) == hypothesis_ids.unsqueeze(-2)
+        matches = matches & premise_content.unsqueeze(-1) & hypothesis_content.unsqueeze(-2)
+        return matches.any(dim=-1), matches.any(dim=-2)
+    raise ValueError(
+        f"Unknown counterfactual strategy {strategy}, expected one of {COUNTERFACTUAL_STRATEGIES}"
+    )
+
+
+@DataCollator.register("counterfactual")
+class CounterfactualDataCollator(DataCollator):
+    """
+    Collates instances like the default collator and then derives the counterfactual input
+    from the factual token ids of the batch, so that dataset readers only have to emit the
+    factual text fields.
+
+    For a combined `tokens` field the result is written to `cf_tokens`; for separate `premise`
+    and `hypothesis` fields it is written to `cf_premise` and `cf_hypothesis`. Special tokens,
+    padding and sequence lengths are kept as they are.
+
+    Registered as a `DataCollator` with name "counterfactual".
+
+    # Parameters
+
+    model_name : `str`
+        The pretrained transformer whose tokenizer was used by the dataset reader. It provides
+        the mask, separator and other special token ids.
+    strategy : `str`, optional (default = `"full_mask"`)
+        One of `"full_mask"`, `"overlap_mask"` or `"hypothesis_only"`.
+    namespace : `str`, optional (default = `"tokens"`)
+        The token indexer namespace of the text fields.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        strategy: str = "full_mask",
+        namespace: str = "tokens",
+    ) -> None:
+        if strategy not in COUNTERFACTUAL_STRATEGIES:
+            raise ValueError(
+                f"Unknown counterfactual strategy {strategy}, "
+                f"expected one of {COUNTERFACTUAL_STRATEGIES}"
+            )
+        tokenizer = cached_transformers.get_tokenizer(model_name)
+        self._strategy = strategy
+        self._namespace = namespace
+        self._mask_token_id = tokenizer.mask_token_id
+        self._sep_token_id = tokenizer.sep_token_id
+        self._special_ids = [
+            token_id
+            for token_id in (tokenizer.cls_token_id, tokenizer.sep_token_id, tokenizer.pad_token_id)
+            if token_id is not None
+        ]
+
+    @overrides
+    def __call__(self, instances: List[Instance]) -> TensorDict:
+        tensor_dict = allennlp_collate(instances)
+        return self.add_counterfactuals(tensor_dict)
+
+    def add_counterfactuals(self, tensor_dict: TensorDict) -> TensorDict:
+        if "tokens" in tensor_dict:
+            tensors = tensor_dict["tokens"][self._namespace]
+            token_ids = tensors["token_ids"]
+            content = content_mask(token_ids, tensors["mask"], self._special_ids)
+            premise, hypothesis = split_segments(token_ids, content, self._sep_token_id)
+            premise_positions, hypothesis_positions = counterfactual_positions(
+                self._strategy, token_ids, premise, token_ids, hypothesis
+            )
+            tensor_dict["cf_tokens"] = self._masked_copy(
+                tensor_dict["tokens"], premise_positions | hypothesis_positions
+            )
+        else:
+            premise_tensors = tensor_dict["premise"][self._namespace]
+            hypothesis_tensors = tensor_dict["hypothesis"][self._namespace]
+            premise_ids = premise_tensors["token_ids"]
+            hypothesis_ids = hypothesis_tensors["token_ids"]
+            premise_positions, hypothesis_positions = counterfactual_positions(
+                self._strategy,
+                premise_ids,
+                content_mask(premise_ids, premise_tensors["mask"], self._special_ids),
+                hypothesis_ids,
+                content_mask(hypothesis_ids, hypothesis_tensors["mask"], self._special_ids),
+            )
+            tensor_dict["cf_premise"] = self._masked_copy(
+                tensor_dict["premise"], premise_positions
+            )
+            tensor_dict["cf_hypothesis"] = self._masked_copy(
+                tensor_dict["hypothesis"], hypothesis_positions
+            )
+        return tensor_dict
+
+    def _masked_copy(
+        self, text_field_tensors: Dict[str, Dict[str, torch.Tensor]], positions: torch.Tensor
+    ) -> Dict[str, Dict[str, torch.Tensor]]:
+        # Only the token ids change; masks, type ids and offsets are shared with the factual field.
+        tensors = dict(text_field_tensors[self._namespace])
+        tensors["token_ids"] = tensors["token_ids"].masked_fill(positions, self._mask_token_id)
+        cf_tensors = dict(text_field_tensors)
+        cf_tensors[self._namespace] = tensors
+        return cf_tensors
+
@@ -0,0 +1,130 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import torch
+from transformers import BertTokenizer
+
+from allennlp.data import Vocabulary
+from allennlp.data.token_indexers import PretrainedTransformerIndexer
+from allennlp.data.tokenizers import PretrainedTransformerTokenizer
+
+from my_package.data.data_collators.counterfactual_collator import (
+    CounterfactualDataCollator,
+    content_mask,
+    counterfactual_positions,
+    split_segments,
+)
+from my_package.data.dataset_readers.counterfactual_reader import CounterfactualSnliReader
+
+
+CLS, SEP, MASK, PAD = 101, 102, 103, 0
+
+
+class TestCounterfactualPositions(TestCase):
+    def setUp(self):
+        # [CLS] 5 6 7 [SEP] 6 8 [SEP] [PAD]
+        self.token_ids = torch.tensor([[CLS, 5, 6, 7, SEP, 6, 8, SEP, PAD]])
+        content = content_mask(self.token_ids, self.token_ids != PAD, [CLS, SEP, PAD])
+        self.premise, self.hypothesis = split_segments(self.token_ids, content, SEP)
+
+    def _counterfactual(self, strategy):
+        premise_positions, hypothesis_positions = counterfactual_positions(
+            strategy, self.token_ids, self.premise, self.token_ids, self.hypothesis
+        )
+        return self.token_ids.masked_fill(premise_positions | hypothesis_positions, MASK).tolist()
+
+    def test_full_mask(self):
+        self.assertEqual(
+            self._counterfactual("full_mask"),
+            [[CLS, MASK, MASK, MASK, SEP, MASK, MASK, SEP, PAD]],
+        )
+
+    def test_overlap_mask(self):
+        self.assertEqual(
+            self._counterfactual("overlap_mask"),
+            [[CLS, 5, MASK, 7, SEP, MASK, 8, SEP, PAD]],
+        )
+
+    def test_hypothesis_only(self):
+        self.assertEqual(
+            self._counterfactual("hypothesis_only"),
+            [[CLS, MASK, MASK, MASK, SEP, 6, 8, SEP, PAD]],
+        )
+
+    def test_separate_fields_overlap_mask(self):
+        premise_ids = torch.tensor([[CLS, 5, 6, SEP]])
+        hypothesis_ids = torch.tensor([[CLS, 6, 9, 5, SEP, PAD]])
+        premise_positions, hypothesis_positions = counterfactual_positions(
+            "overlap_mask",
+            premise_ids,
+            content_mask(premise_ids, premise_ids != PAD, [CLS, SEP, PAD]),
+            hypothesis_ids,
+            content_mask(hypothesis_ids, hypothesis_ids != PAD, [CLS, SEP, PAD]),
+        )
+        self.assertEqual(premise_positions.tolist(), [[False, True, True, False]])
+        self.assertEqual(
+            hypothesis_positions.tolist(), [[False, True, False, True, False, False]]
+        )
+
+
+class TestCounterfactualDataCollator(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # [PAD] 0, [CLS] 2, [SEP] 3, [MASK] 4, a 5, b 6, c 7, d 8
+        vocab_file = os.path.join(self.tmp_dir.name, "vocab.txt")
+        with open(vocab_file, "w") as f:
+            f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "a", "b", "c", "d"]))
+        BertTokenizer(vocab_file).save_pretrained(self.tmp_dir.name)
+        self.path = os.path.join(self.tmp_dir.name, "dev.jsonl")
+        with open(self.path, "w") as f:
+            for premise, hypothesis in [("a b c", "b d"), ("d", "a")]:
+                doc = {"gold_label": "neutral", "sentence1": premise, "sentence2": hypothesis}
+                f.write(json.dumps(dict(doc, sample_weight=1.0)) + "\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _collate(self, strategy, combine_input_fields):
+        reader = CounterfactualSnliReader(
+            tokenizer=PretrainedTransformerTokenizer(self.tmp_dir.name, add_special_tokens=False),
+            token_indexers={"tokens": PretrainedTransformerIndexer(self.tmp_dir.name)},
+            combine_input_fields=combine_input_fields,
+        )
+        instances = list(reader.read(self.path))
+        vocab = Vocabulary.from_instances(instances)
+        for instance in instances:
+            instance.index_fields(vocab)
+        collator = CounterfactualDataCollator(self.tmp_dir.name, strategy=strategy)
+        return collator(instances)
+
+    def test_combined_fields(self):
+        batch = self._collate("full_mask", combine_input_fields=True)
+        tokens, cf_tokens = batch["tokens"]["tokens"], batch["cf_tokens"]["tokens"]
+        self.assertEqual(
+            tokens["token_ids"].tolist(), [[2, 5, 6, 7, 3, 6, 8, 3], [2, 8, 3, 5, 3, 0, 0, 0]]
+        )
+        self.assertEqual(
+            cf_tokens["token_ids"].tolist(), [[2, 4, 4, 4, 3, 4, 4, 3], [2, 4, 3, 4, 3, 0, 0, 0]]
+        )
+        self.assertEqual(cf_tokens["mask"].tolist(), [[True] * 8, [True] * 5 + [False] * 3])
+        self.assertIs(cf_tokens["mask"], tokens["mask"])
+        self.assertIs(cf_tokens["type_ids"], tokens["type_ids"])
+
+        batch = self._collate("overlap_mask", combine_input_fields=True)
+        self.assertEqual(
+            batch["cf_tokens"]["tokens"]["token_ids"].tolist(),
+            [[2, 5, 4, 7, 3, 4, 8, 3], [2, 8, 3, 5, 3, 0, 0, 0]],
+        )
+
+    def test_separate_fields(self):
+        batch = self._collate("overlap_mask", combine_input_fields=False)
+        cf_premise, cf_hypothesis = batch["cf_premise"]["tokens"], batch["cf_hypothesis"]["tokens"]
+        self.assertEqual(cf_premise["token_ids"].tolist(), [[2, 5, 4, 7, 3], [2, 8, 3, 0, 0]])
+        self.assertEqual(cf_hypothesis["token_ids"].tolist(), [[2, 4, 8, 3], [2, 5, 3, 0]])
+        self.assertEqual(cf_premise["mask"].tolist(), [[True] * 5, [True] * 3 + [False] * 2])
+        self.assertEqual(cf_hypothesis["mask"].tolist(), [[True] * 4, [True, True, True, False]])
+        self.assertEqual(
+            batch["premise"]["tokens"]["token_ids"].tolist(), [[2, 5, 6, 7, 3], [2, 8, 3, 0, 0]]
+        )
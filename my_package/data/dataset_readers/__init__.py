@@ -16,3 +16,5 @@ from my_package.data.dataset_readers.qqp import reader as qqp_reader
 from my_package.data.dataset_readers.qqp import weighted_reader as weighted_qqp_reader
 from my_package.data.dataset_readers.qqp import poe_reader as poe_qqp_reader
 from my_package.data.dataset_readers.qqp import distill_reader as distill_qqp_reader
+
+from my_package.data.dataset_readers import pooled_embedding_cache_reader
@@ -0,0 +1,32 @@
+from typing import Any, Dict, Optional, Tuple
+
+from overrides import overrides
+
+from my_package.data.dataset_readers.sentence_pair_reader import (
+    SentencePairReader,
+    maybe_collapse_label,
+)
+
+
+class NliReader(SentencePairReader):
+    """
+    Reads a file from the Stanford Natural Language Inference (SNLI) or MultiNLI dataset.  This
+    data is formatted as jsonl, one json-formatted instance per line.  The keys in the data are
+    "gold_label", "sentence1", and "sentence2".  We convert these keys into fields named "label",
+    "premise" and "hypothesis", along with a metadata field containing the tokenized strings of the
+    premise and hypothesis.  Examples without a gold label ("-") are skipped.
+
+    The base of the NLI readers of this package; see `SentencePairReader` for the parameters.
+    """
+
+    @overrides
+    def _keep_example(self, example: Dict[str, Any]) -> bool:
+        return example.get("gold_label") != "-"
+
+    @overrides
+    def _example_to_texts(self, example: Dict[str, Any]) -> Tuple[str, str, Optional[str]]:
+        return example["sentence1"], example["sentence2"], example.get("gold_label")
+
+    @overrides
+    def _normalize_label(self, label: str) -> str:
+        return maybe_collapse_label(label, self.collapse_labels)
@@ -0,0 +1,51 @@
+from typing import Dict
+
+from overrides import overrides
+
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.data.fields import Field, LabelField
+from allennlp.data.instance import Instance
+
+from my_package.data.fields.pooled_embedding_field import PooledEmbeddingField
+from my_package.data.fields.side_feature_fields import SideFeatureTables
+from my_package.modules.pooled_embedding_cache import load_pooled_embedding_cache
+
+
+@DatasetReader.register("pooled_embedding_cache")
+class PooledEmbeddingCacheReader(DatasetReader):
+    """
+    Reads a pooled embedding cache directory written by the `cache_embeddings` subcommand
+    (the "file path" is the directory). Every row becomes an instance with the cached
+    embedding as `tokens` (a `PooledEmbeddingField`), its `label` and one side feature field
+    per cached column, so that any classifier of `my_package.models` can be trained or
+    evaluated from the cache with a `"pooled_embedding"` token embedder and a `"cls_pooler"`.
+
+    Registered as a `DatasetReader` with name "pooled_embedding_cache".
+
+    # Parameters
+
+    indexer_name : `str`, optional (default = `"pooled"`)
+        Key of the token embedder in the model's `text_field_embedder`.
+    """
+
+    def __init__(self, indexer_name: str = "pooled", **kwargs) -> None:
+        super().__init__(
+            manual_distributed_sharding=True, manual_multiprocess_sharding=True, **kwargs
+        )
+        self._indexer_name = indexer_name
+        self._side_features = SideFeatureTables()
+
+    @overrides
+    def _read(self, file_path: str):
+        embeddings, columns, _ = load_pooled_embedding_cache(file_path)
+        labels = columns.pop("label", None)
+        with self._side_features.reading():
+            for row in self.shard_iterable(range(len(embeddings))):
+                fields: Dict[str, Field] = {
+                    "tokens": PooledEmbeddingField(embeddings[row], row, self._indexer_name)
+                }
+                if labels is not None:
+                    fields["label"] = LabelField(str(labels[row]))
+                for name, values in columns.items():
+                    fields[name] = self._side_features.field(name, values[row])
+                yield Instance(fields)
@@ -0,0 +1,213 @@
+from dataclasses import dataclass
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from overrides import overrides
+
+from allennlp.common.file_utils import cached_path
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.data.fields import Field, TextField, LabelField
+from allennlp.data.instance import Instance
+from allennlp.data.token_indexers import SingleIdTokenIndexer, TokenIndexer
+from allennlp.data.tokenizers import Token, Tokenizer, SpacyTokenizer, PretrainedTransformerTokenizer
+
+from my_package.data.fields.side_feature_fields import SideFeatureTables
+from my_package.data.fields.metadata_fields import tokens_metadata_field
+from my_package.data.score_tables import ScoreTable, join_scores
+from my_package.data.tokenization_memo import TokenizationMemo
+from my_package.utils.compressed_io import open_text
+
+logger = logging.getLogger(__name__)
+
+
+def maybe_collapse_label(label: str, collapse: bool):
+    """
+    Helper function that optionally collapses the "contradiction" and "neutral" labels
+    into "non-entailment".
+    """
+    assert label in ["contradiction", "neutral", "entailment"]
+    if collapse and label in ["contradiction", "neutral"]:
+        return "non-entailment"
+    return label
+
+
+@dataclass(frozen=True)
+class SideFeatureColumn:
+    """
+    Declares an extra per-example column that a `SentencePairReader` turns into a
+    `SideFeatureField` of the same name.
+
+    # Parameters
+
+    name : `str`
+        Name of the field in the instance and of the keyword argument of `text_to_instance`.
+    key : `str`, optional (default = `None`)
+        Key of the column in the example, `name` if not given.
+    convert : `Callable[[Any], Any]`, optional (default = `None`)
+        Applied to the raw value (which is `None` when the example has no such key). The field
+        is left out of the instance when the resulting value is `None`.
+    """
+
+    name: str
+    key: Optional[str] = None
+    convert: Optional[Callable[[Any], Any]] = None
+
+    def value(self, example: Dict[str, Any]) -> Any:
+        value = example.get(self.key or self.name)
+        return self.convert(value) if self.convert is not None else value
+
+
+class SentencePairReader(DatasetReader):
+    """
+    The reading engine shared by the NLI, FEVER and QQP readers. It opens the (possibly
+    compressed) jsonl file, joins the score table, filters and shards the examples and builds
+    the premise/hypothesis fields, the label and one side feature field per declared column.
+
+    A dataset format subclass implements `_parse_line`, `_example_to_texts` and optionally
+    `_keep_example` and `_normalize_label`; a registered reader then only declares its
+    extra columns in `columns`.
+
+    # Parameters
+
+    tokenizer : `Tokenizer`, optional (default=`SpacyTokenizer()`)
+        We use this `Tokenizer` for both the premise and the hypothesis.  See :class:`Tokenizer`.
+    token_indexers : `Dict[str, TokenIndexer]`, optional (default=`{"tokens": SingleIdTokenIndexer()}`)
+        We similarly use this for both the premise and the hypothesis.  See :class:`TokenIndexer`.
+    combine_input_fields : `bool`, optional
+            (default=`isinstance(tokenizer, PretrainedTransformerTokenizer)`)
+        If False, represent the premise and the hypothesis as separate fields in the instance.
+        If True, tokenize them together using `tokenizer.tokenize_sentence_pair()`
+        and provide a single `tokens` field in the instance.
+    collapse_labels : `bool`, optional (default=`False`)
+        If `True`, the "neutral" and "contradiction" labels will be collapsed into "non-entailment";
+        "entailment" will be left unchanged.
+    score_table : `str`, optional (default=`None`)
+        Path to an id-keyed score table (see `my_package.data.score_tables`). Its columns are
+        joined onto every example while reading and take precedence over the same keys in the
+        data file.
+    metadata_mode : `str`, optional (default=`"eager"`)
+        How the token strings are kept when `combine_input_fields` is False: `"eager"` stores them
+        in a `MetadataField`, `"lazy"` rebuilds them from the tokens when the metadata is accessed
+        and `"none"` drops the metadata field.
+    tokenization_memo_size : `int`, optional (default=`10000`)
+        Number of raw strings whose tokens are kept in an LRU memo, so that premises, evidence
+        and questions repeated across examples are tokenized once (`0` disables it). The hit
+        rate is logged after every read and available from `tokenization_memo.stats()`.
+    """
+
+    columns: Tuple[SideFeatureColumn, ...] = ()
+
+    def __init__(
+        self,
+        tokenizer: Optional[Tokenizer] = None,
+        token_indexers: Dict[str, TokenIndexer] = None,
+        combine_input_fields: Optional[bool] = None,
+        collapse_labels: Optional[bool] = False,
+        score_table: Optional[str] = None,
+        metadata_mode: str = "eager",
+        tokenization_memo_size: int = 10000,
+        **kwargs,
+    ) -> None:
+        super().__init__(
+            manual_distributed_sharding=True, manual_multiprocess_sharding=True, **kwargs
+        )
+        self._tokenizer = tokenizer or SpacyTokenizer()
+        if isinstance(self._tokenizer, PretrainedTransformerTokenizer):
+            assert not self._tokenizer._add_special_tokens
+        self._token_indexers = token_indexers or {"tokens": SingleIdTokenIndexer()}
+        if combine_input_fields is not None:
+            self._combine_input_fields = combine_input_fields
+        else:
+            self._combine_input_fields = isinstance(self._tokenizer, PretrainedTransformerTokenizer)
+        self.collapse_labels = collapse_labels
+        self._side_features = SideFeatureTables()
+        self._score_table = ScoreTable(score_table) if score_table else None
+        self._metadata_mode = metadata_mode
+        self.tokenization_memo = TokenizationMemo(self._tokenizer, tokenization_memo_size)
+
+    def _parse_line(self, line: str) -> Dict[str, Any]:
+        return json.loads(line)
+
+    def _keep_example(self, example: Dict[str, Any]) -> bool:
+        return True
+
+    def _example_to_texts(self, example: Dict[str, Any]) -> Tuple[str, str, Optional[str]]:
+        """
+        Returns the premise, the hypothesis and the (raw) label of an example.
+        """
+        raise NotImplementedError
+
+    def _normalize_label(self, label: str) -> str:
+        return label
+
+    def _read_examples(self, file_path: str) -> Iterable[Dict[str, Any]]:
+        # if `file_path` is a URL, redirect to the cache
+        with open_text(cached_path(file_path)) as data_file:
+            examples = join_scores(
+                (self._parse_line(line) for line in data_file), self._score_table
+            )
+            yield from self.shard_iterable(
+                example for example in examples if self._keep_example(example)
+            )
+
+    @overrides
+    def _read(self, file_path: str):
+        with self._side_features.reading():
+            for example in self._read_examples(file_path):
+                premise, hypothesis, label = self._example_to_texts(example)
+                columns = {column.name: column.value(example) for column in self.columns}
+                yield self.text_to_instance(premise, hypothesis, label, **columns)
+        logger.info("Tokenization memo of %s: %s", file_path, self.tokenization_memo.stats())
+
+    def _text_fields(
+        self, premise: Iterable[Token], hypothesis: Iterable[Token]
+    ) -> Dict[str, Field]:
+        fields: Dict[str, Field] = {}
+        if self._combine_input_fields:
+            tokens = self._tokenizer.add_special_tokens(premise, hypothesis)
+            fields["tokens"] = TextField(tokens)
+        else:
+            premise_tokens = self._tokenizer.add_special_tokens(premise)
+            hypothesis_tokens = self._tokenizer.add_special_tokens(hypothesis)
+            fields["premise"] = TextField(premise_tokens)
+            fields["hypothesis"] = TextField(hypothesis_tokens)
+
+            metadata = tokens_metadata_field(
+                self._metadata_mode,
+                premise_tokens=premise_tokens,
+                hypothesis_tokens=hypothesis_tokens,
+            )
+            if metadata is not None:
+                fields["metadata"] = metadata
+        return fields
+
+    @overrides
+    def text_to_instance(
+        self,  # type: ignore
+        premise: str,
+        hypothesis: str,
+        label: str = None,
+        **columns: Any,
+    ) -> Instance:
+        fields = self._text_fields(
+            self.tokenization_memo.tokenize(premise), self.tokenization_memo.tokenize(hypothesis)
+        )
+
+        if label is not None:
+            fields["label"] = LabelField(self._normalize_label(label))
+
+        for column in self.columns:
+            value = columns.get(column.name)
+            if value is not None:
+                fields[column.name] = self._side_features.field(column.name, value)
+
+        return Instance(fields)
+
+    @overrides
+    def apply_token_indexers(self, instance: Instance) -> Instance:
+        if "tokens" in instance.fields:
+            instance.fields["tokens"]._token_indexers = self._token_indexers
+        else:
+            instance.fields["premise"]._token_indexers = self._token_indexers
+            instance.fields["hypothesis"]._token_indexers = self._token_indexers
@@ -0,0 +1,62 @@
+import tempfile
+from unittest import TestCase
+
+import numpy
+import torch
+
+from allennlp.data import Batch, Vocabulary
+from allennlp.modules.seq2vec_encoders import ClsPooler
+from allennlp.modules.text_field_embedders import BasicTextFieldEmbedder
+
+from my_package.data.dataset_readers.pooled_embedding_cache_reader import (
+    PooledEmbeddingCacheReader,
+)
+from my_package.models.product_of_expert_classifier import ProductofExpertBasicClassifier
+from my_package.modules.pooled_embedding_cache import (
+    PooledEmbedding,
+    PooledEmbeddingCacheWriter,
+    pooled_encode,
+)
+
+
+class TestPooledEmbeddingCacheReader(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.embeddings = numpy.random.RandomState(0).randn(5, 4).astype(numpy.float32)
+        self.bias_probs = numpy.full((5, 3), 1 / 3, dtype=numpy.float32)
+        labels = numpy.array(["entailment", "neutral", "contradiction", "neutral", "entailment"])
+        with PooledEmbeddingCacheWriter(self.tmp_dir.name, {"input_file": "dev.jsonl"}) as writer:
+            writer.append(
+                self.embeddings[:3], {"label": labels[:3], "bias_probs": self.bias_probs[:3]}
+            )
+            writer.append(
+                self.embeddings[3:], {"label": labels[3:], "bias_probs": self.bias_probs[3:]}
+            )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_read_and_train_a_head_from_the_cache(self):
+        instances = list(PooledEmbeddingCacheReader().read(self.tmp_dir.name))
+        self.assertEqual(len(instances), 5)
+        self.assertEqual(instances[2]["label"].label, "contradiction")
+
+        vocab = Vocabulary.from_instances(instances)
+        batch = Batch(instances)
+        batch.index_instances(vocab)
+        tensors = batch.as_tensor_dict()
+        self.assertEqual(tuple(tensors["tokens"]["pooled"]["embedding"].shape), (5, 1, 4))
+        self.assertEqual(tuple(tensors["bias_probs"].shape), (5, 3))
+
+        model = ProductofExpertBasicClassifier(
+            vocab,
+            text_field_embedder=BasicTextFieldEmbedder({"pooled": PooledEmbedding(4)}),
+            seq2vec_encoder=ClsPooler(4),
+        )
+        torch.testing.assert_close(
+            pooled_encode(model, tensors["tokens"]), torch.from_numpy(self.embeddings)
+        )
+        output = model(**tensors)
+        output["loss"].backward()
+        self.assertEqual(output["token_ids"].view(-1).tolist(), [0, 1, 2, 3, 4])
+        self.assertIsNotNone(model._classification_layer.weight.grad)
@@ -0,0 +1,114 @@
+import gzip
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy
+
+from allennlp.data.tokenizers import WhitespaceTokenizer
+
+from my_package.data.dataset_readers.distill_reader import DistillSnliReader
+from my_package.data.dataset_readers.fever.poe_reader import PoEFeverReader
+from my_package.data.dataset_readers.overlap_score_reader import AugOverlapSnliReader
+from my_package.data.dataset_readers.qqp.weighted_reader import WeightedQQPReader
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "fever", "tests")
+
+
+class TestSentencePairReader(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write_jsonl(self, name, docs, opener=open):
+        path = os.path.join(self.tmp_dir.name, name)
+        with opener(path, "wt") as f:
+            for doc in docs:
+                f.write(json.dumps(doc) + "\n")
+        return path
+
+    def test_nli_columns_and_filtering(self):
+        path = self._write_jsonl(
+            "train.jsonl.gz",
+            [
+                {"gold_label": "neutral", "sentence1": "a b", "sentence2": "c",
+                 "distill_probs": [0.1, 0.2, 0.7], "bias_prob": 0.4},
+                {"gold_label": "-", "sentence1": "a", "sentence2": "b"},
+                {"gold_label": "entailment", "sentence1": "a", "sentence2": "b c d"},
+            ],
+            gzip.open,
+        )
+        reader = DistillSnliReader(tokenizer=WhitespaceTokenizer(), collapse_labels=True)
+        instances = list(reader.read(path))
+        self.assertEqual(len(instances), 2)
+
+        first, second = instances
+        self.assertEqual(first["label"].label, "non-entailment")
+        self.assertEqual([t.text for t in first["premise"].tokens], ["a", "b"])
+        self.assertEqual(first["metadata"]["hypothesis_tokens"], ["c"])
+        numpy.testing.assert_allclose(first["distill_probs"].array, [0.1, 0.2, 0.7])
+        self.assertAlmostEqual(first["bias_prob"].human_readable_repr(), 0.4)
+        self.assertNotIn("distill_probs", second.fields)
+        # The side feature tables do not outlive the read.
+        self.assertEqual(len(reader._side_features), 0)
+
+    def test_column_conversion(self):
+        path = self._write_jsonl(
+            "aug.jsonl",
+            [
+                {"gold_label": "contradiction", "sentence1": "a", "sentence2": "b",
+                 "overlap": "overlap_nonentail"},
+                {"gold_label": "entailment", "sentence1": "a", "sentence2": "b"},
+            ],
+        )
+        reader = AugOverlapSnliReader(tokenizer=WhitespaceTokenizer())
+        weights = [i["sample_weight"].human_readable_repr() for i in reader.read(path)]
+        self.assertEqual(weights, [200.0, 1.0])
+
+    def test_fever_labels(self):
+        reader = PoEFeverReader(tokenizer=WhitespaceTokenizer())
+        instances = list(reader.read(os.path.join(FIXTURES, "test-duplicate.jsonl")))
+        self.assertTrue(instances)
+        self.assertEqual(instances[0]["label"].label, "entailment")
+        self.assertEqual(instances[0]["hypothesis"].tokens[0].text, "Fox")
+        self.assertNotIn("bias_probs", instances[0].fields)
+        self.assertEqual(
+            reader.text_to_instance("a", "b", "REFUTES", bias_probs=[0.5, 0.25, 0.25])[
+                "label"
+            ].label,
+            "contradiction",
+        )
+
+    def test_qqp(self):
+        path = self._write_jsonl(
+            "qqp.jsonl",
+            [{"is_duplicate": 1, "sentence1": "a", "sentence2": "b", "sample_weight": 0.5}],
+        )
+        reader = WeightedQQPReader(tokenizer=WhitespaceTokenizer())
+        (instance,) = reader.read(path)
+        self.assertEqual(instance["label"].label, "paraphrase")
+        self.assertAlmostEqual(instance["sample_weight"].human_readable_repr(), 0.5)
+
+    def test_tokenization_memo(self):
+        docs = [
+            {"gold_label": label, "sentence1": "the same premise", "sentence2": "hypothesis %d" % i}
+            for i, label in enumerate(["neutral", "entailment", "contradiction"])
+        ]
+        path = self._write_jsonl("mnli.jsonl", docs)
+        memo_reader = DistillSnliReader(tokenizer=WhitespaceTokenizer(), tokenization_memo_size=2)
+        plain_reader = DistillSnliReader(tokenizer=WhitespaceTokenizer(), tokenization_memo_size=0)
+
+        memo_instances = list(memo_reader.read(path))
+        plain_instances = list(plain_reader.read(path))
+        for memo_instance, plain_instance in zip(memo_instances, plain_instances):
+            self.assertEqual(
+                memo_instance["metadata"].metadata, plain_instance["metadata"].metadata
+            )
+        stats = memo_reader.tokenization_memo.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (2, 4, 2))
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 6)
+        self.assertEqual(plain_reader.tokenization_memo.stats()["hits"], 0)
@@ -0,0 +1,59 @@
+from typing import Dict, List, Optional
+
+from allennlp.common.checks import ConfigurationError
+from allennlp.data.fields import MetadataField
+from allennlp.data.tokenizers import Token
+
+
+METADATA_MODES = ("eager", "lazy", "none")
+
+
+class LazyTokensMetadataField(MetadataField):
+    """
+    A `MetadataField` with the same content as `{"premise_tokens": [...], ...}`, but the
+    lists of token strings are only rebuilt from the tokens when the metadata is accessed,
+    instead of being kept alive for every instance of the dataset.
+    """
+
+    __slots__ = ["token_lists"]
+
+    def __init__(self, token_lists: Dict[str, List[Token]]) -> None:
+        self.token_lists = token_lists
+
+    @property
+    def metadata(self) -> Dict[str, List[str]]:  # type: ignore
+        return {
+            name: [token.text for token in tokens] for name, tokens in self.token_lists.items()
+        }
+
+    # The default pickling of slotted objects would restore the read-only `metadata` slot of
+    # `MetadataField`, so only the tokens are (de)serialized, e.g. for data loader workers.
+    def __getstate__(self) -> Dict[str, Dict[str, List[Token]]]:
+        return {"token_lists": self.token_lists}
+
+    def __setstate__(self, state: Dict[str, Dict[str, List[Token]]]) -> None:
+        self.token_lists = state["token_lists"]
+
+
+def tokens_metadata_field(mode: str, **token_lists: List[Token]) -> Optional[MetadataField]:
+    """
+    Builds the metadata field of the token strings that the readers attach when
+    `combine_input_fields` is False.
+
+    # Parameters
+
+    mode : `str`
+        `"eager"` stores the token strings in a `MetadataField`, `"lazy"` rebuilds them from the
+        tokens on access and `"none"` drops the metadata (returns `None`).
+    token_lists : `List[Token]`
+        The tokens of each metadata entry, e.g. `premise_tokens=..., hypothesis_tokens=...`.
+    """
+    if mode == "eager":
+        return MetadataField(
+            {name: [token.text for token in tokens] for name, tokens in token_lists.items()}
+        )
+    if mode == "lazy":
+        return LazyTokensMetadataField(token_lists)
+    if mode == "none":
+        return None
+    raise ConfigurationError(f"Unknown metadata mode {mode}, expected one of {METADATA_MODES}")
@@ -0,0 +1,60 @@
+from typing import Dict, List
+
+import numpy
+import torch
+from overrides import overrides
+
+from allennlp.data.fields.field import Field
+
+
+class PooledEmbeddingField(Field[Dict[str, torch.Tensor]]):
+    """
+    A precomputed pooled encoder output (one row of a pooled embedding cache, see
+    `my_package.modules.pooled_embedding_cache`) standing in for a `TextField`. It batches to
+    the same nested `TextFieldTensors` shape, `{indexer_name: {"tokens", "embedding", "mask"}}`,
+    as a one token sequence whose id is the cache row, so that the classifiers can keep their
+    `tokens` argument and embed it with a `"pooled_embedding"` token embedder.
+    """
+
+    __slots__ = ["embedding", "row", "indexer_name"]
+
+    def __init__(self, embedding: numpy.ndarray, row: int, indexer_name: str = "pooled") -> None:
+        self.embedding = embedding
+        self.row = row
+        self.indexer_name = indexer_name
+
+    @overrides
+    def get_padding_lengths(self) -> Dict[str, int]:
+        return {}
+
+    @overrides
+    def as_tensor(self, padding_lengths: Dict[str, int]) -> Dict[str, torch.Tensor]:
+        return {
+            "tokens": torch.tensor([self.row]),
+            "embedding": torch.from_numpy(numpy.array(self.embedding, dtype=numpy.float32))[None],
+            "mask": torch.tensor([True]),
+        }
+
+    @overrides
+    def batch_tensors(  # type: ignore
+        self, tensor_list: List[Dict[str, torch.Tensor]]
+    ) -> Dict[str, Dict[str, torch.Tensor]]:
+        return {
+            self.indexer_name: {
+                key: torch.stack([tensors[key] for tensors in tensor_list])
+                for key in tensor_list[0]
+            }
+        }
+
+    @overrides
+    def empty_field(self):
+        return PooledEmbeddingField(numpy.zeros_like(self.embedding), -1, self.indexer_name)
+
+    def human_readable_repr(self):
+        return self.row
+
+    def __str__(self) -> str:
+        return f"PooledEmbeddingField of row {self.row} with dimension {len(self)}."
+
+    def __len__(self):
+        return self.embedding.shape[-1]
@@ -0,0 +1,138 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Union
+
+import numpy
+import torch
+from overrides import overrides
+
+from allennlp.common.checks import ConfigurationError
+from allennlp.data.fields.field import Field
+
+
+class SideFeatureTable:
+    """
+    A preallocated float32 store for one per-example side feature (`sample_weight`,
+    `bias_probs`, `distill_probs`, `bias_prob`, ...). Rows are written into fixed-size blocks
+    that are never reallocated, so every `SideFeatureField` can keep a cheap view of its row
+    instead of owning a tensor or a NumPy array of its own.
+    """
+
+    def __init__(self, block_size: int = 4096) -> None:
+        self._block_size = block_size
+        self._width = None
+        self._blocks: List[numpy.ndarray] = []
+        self._used = block_size
+
+    def add(self, values: Union[float, Sequence[float]]) -> numpy.ndarray:
+        row = numpy.asarray(values, dtype=numpy.float32).reshape(-1)
+        if self._width is None:
+            self._width = row.shape[0]
+        elif row.shape[0] != self._width:
+            raise ConfigurationError(
+                f"Side feature has width {row.shape[0]}, expected {self._width}"
+            )
+        if self._used == self._block_size:
+            self._blocks.append(
+                numpy.empty((self._block_size, self._width), dtype=numpy.float32)
+            )
+            self._used = 0
+        view = self._blocks[-1][self._used]
+        view[:] = row
+        self._used += 1
+        return view
+
+    def __len__(self) -> int:
+        return max(len(self._blocks) - 1, 0) * self._block_size + (
+            self._used if self._blocks else 0
+        )
+
+
+class SideFeatureTables:
+    """
+    One `SideFeatureTable` per field name, owned by a dataset reader. The tables only live
+    while a `reading()` block is open: they are dropped when the outermost one is entered and
+    left, so re-reading a file does not keep the blocks of the previous reads alive (they are
+    freed with the last instance viewing them). Outside of a read (e.g. `text_to_instance` in
+    a predictor), every field owns its own row.
+    """
+
+    def __init__(self, block_size: int = 4096) -> None:
+        self._block_size = block_size
+        self._tables: Dict[str, SideFeatureTable] = {}
+        self._open_reads = 0
+
+    @contextmanager
+    def reading(self) -> Iterator[None]:
+        if self._open_reads == 0:
+            self._tables = {}
+        self._open_reads += 1
+        try:
+            yield
+        finally:
+            self._open_reads -= 1
+            if self._open_reads == 0:
+                self._tables = {}
+
+    def field(self, name: str, values: Union[float, Sequence[float]]) -> "SideFeatureField":
+        scalar = numpy.ndim(values) == 0
+        if self._open_reads == 0:
+            return SideFeatureField(
+                numpy.asarray(values, dtype=numpy.float32).reshape(-1), scalar=scalar
+            )
+        if name not in self._tables:
+            self._tables[name] = SideFeatureTable(self._block_size)
+        return SideFeatureField(self._tables[name].add(values), scalar=scalar)
+
+    def __len__(self) -> int:
+        return sum(len(table) for table in self._tables.values())
+
+
+class SideFeatureField(Field[numpy.ndarray]):
+    """
+    A float vector (or scalar, when `scalar` is `True`) backed by a row of a
+    `SideFeatureTable`. Instances hand their row view to the batch and the whole batch is
+    converted to a single tensor at once, instead of creating one small tensor per instance.
+    Scalars are batched to shape `(batch_size,)` like `FloatField`, vectors to
+    `(batch_size, width)` like `ArrayField`.
+    """
+
+    __slots__ = ["array", "scalar"]
+
+    def __init__(self, array: numpy.ndarray, scalar: bool = False) -> None:
+        self.array = array
+        self.scalar = scalar
+
+    @overrides
+    def get_padding_lengths(self) -> Dict[str, int]:
+        return {}
+
+    @overrides
+    def as_tensor(self, padding_lengths: Dict[str, int]) -> numpy.ndarray:  # type: ignore
+        return self.array
+
+    @overrides
+    def batch_tensors(self, tensor_list: List[numpy.ndarray]) -> torch.Tensor:  # type: ignore
+        batch = torch.from_numpy(numpy.stack(tensor_list))
+        if self.scalar:
+            batch = batch.squeeze(-1)
+        return batch
+
+    @overrides
+    def empty_field(self):
+        if self.scalar:
+            return SideFeatureField(numpy.full(1, -1.0, dtype=numpy.float32), scalar=True)
+        return SideFeatureField(numpy.zeros_like(self.array))
+
+    def human_readable_repr(self):
+        return float(self.array[0]) if self.scalar else self.array.tolist()
+
+    def __str__(self) -> str:
+        return f"SideFeatureField with value: {self.array.tolist()} "
+
+    def __len__(self):
+        return self.array.shape[0]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, SideFeatureField):
+            return self.scalar == other.scalar and numpy.array_equal(self.array, other.array)
+        return NotImplemented
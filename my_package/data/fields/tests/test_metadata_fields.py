@@ -0,0 +1,32 @@
+import copy
+import pickle
+from unittest import TestCase
+
+from allennlp.data.tokenizers import Token
+
+from my_package.data.fields.metadata_fields import LazyTokensMetadataField, tokens_metadata_field
+
+
+class TestLazyTokensMetadataField(TestCase):
+    def setUp(self):
+        self.field = tokens_metadata_field(
+            "lazy",
+            premise_tokens=[Token("a"), Token("b")],
+            hypothesis_tokens=[Token("c")],
+        )
+        self.expected = {"premise_tokens": ["a", "b"], "hypothesis_tokens": ["c"]}
+
+    def test_metadata_is_built_on_access(self):
+        self.assertIsInstance(self.field, LazyTokensMetadataField)
+        self.assertEqual(self.field.metadata, self.expected)
+        self.assertEqual(self.field["hypothesis_tokens"], ["c"])
+
+    def test_pickle_round_trip(self):
+        restored = pickle.loads(pickle.dumps(self.field))
+        self.assertIsInstance(restored, LazyTokensMetadataField)
+        self.assertEqual(restored.metadata, self.expected)
+
+    def test_deepcopy_round_trip(self):
+        copied = copy.deepcopy(self.field)
+        self.assertEqual(copied.metadata, self.expected)
+        self.assertIsNot(copied.token_lists, self.field.token_lists)
@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+import numpy
+
+from my_package.data.fields.side_feature_fields import SideFeatureField, SideFeatureTables
+
+
+class TestSideFeatureFields(TestCase):
+    def test_batch_tensors_shapes(self):
+        tables = SideFeatureTables(block_size=2)
+        with tables.reading():
+            scalars = [tables.field("sample_weight", value) for value in [0.5, 1.0, 2.0]]
+            vectors = [tables.field("bias_probs", [value, 1 - value]) for value in [0.25, 0.5]]
+
+        batch = scalars[0].batch_tensors([field.as_tensor({}) for field in scalars])
+        self.assertEqual(tuple(batch.shape), (3,))
+        self.assertEqual(batch.tolist(), [0.5, 1.0, 2.0])
+        batch = vectors[0].batch_tensors([field.as_tensor({}) for field in vectors])
+        self.assertEqual(tuple(batch.shape), (2, 2))
+        self.assertEqual(batch.tolist(), [[0.25, 0.75], [0.5, 0.5]])
+
+    def test_empty_field(self):
+        scalar = SideFeatureField(numpy.full(1, 0.5, dtype=numpy.float32), scalar=True)
+        empty = scalar.empty_field()
+        self.assertTrue(empty.scalar)
+        self.assertEqual(empty.human_readable_repr(), -1.0)
+        batch = scalar.batch_tensors([scalar.as_tensor({}), empty.as_tensor({})])
+        self.assertEqual(batch.tolist(), [0.5, -1.0])
+
+        vector = SideFeatureField(numpy.array([0.2, 0.8], dtype=numpy.float32))
+        empty = vector.empty_field()
+        self.assertFalse(empty.scalar)
+        self.assertEqual(empty.array.tolist(), [0.0, 0.0])
+        self.assertEqual(len(empty), 2)
+
+    def test_tables_are_scoped_to_a_read(self):
+        tables = SideFeatureTables(block_size=2)
+        with tables.reading():
+            kept = [tables.field("sample_weight", value) for value in [1.0, 2.0, 3.0]]
+            self.assertEqual(len(tables), 3)
+        self.assertEqual(len(tables), 0)
+        self.assertEqual([field.human_readable_repr() for field in kept], [1.0, 2.0, 3.0])
+
+        with tables.reading():
+            tables.field("sample_weight", 4.0)
+            self.assertEqual(len(tables), 1)
+
+        field = tables.field("sample_weight", 5.0)
+        self.assertEqual(len(tables), 0)
+        self.assertEqual(field.human_readable_repr(), 5.0)
@@ -0,0 +1 @@
+from my_package.data.samplers import token_budget_sampler
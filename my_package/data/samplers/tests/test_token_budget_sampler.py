@@ -0,0 +1,106 @@
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+
+import numpy
+
+from allennlp.data import Instance
+from allennlp.data.fields import TextField
+from allennlp.data.tokenizers import Token
+
+from my_package.data.samplers.token_budget_sampler import TokenBudgetBatchSampler, padding_efficiency
+from my_package.training.callbacks import PaddingEfficiencyCallback
+
+
+def _instance(length):
+    return Instance({"tokens": TextField([Token("a")] * length)})
+
+
+class TestTokenBudgetBatchSampler(TestCase):
+    def setUp(self):
+        self.lengths = [3, 30, 4, 28, 5, 2, 31, 6]
+        self.instances = [_instance(length) for length in self.lengths]
+
+    def test_batches_respect_the_budget(self):
+        sampler = TokenBudgetBatchSampler(max_tokens=64, padding_noise=0.0)
+        batches = list(sampler.get_batch_indices(self.instances))
+        self.assertCountEqual([i for batch in batches for i in batch], range(len(self.lengths)))
+        for batch in batches:
+            self.assertLessEqual(max(self.lengths[i] for i in batch) * len(batch), 64)
+        # short instances are batched together, long ones are not
+        self.assertIn([0, 2, 4, 5, 7], [sorted(batch) for batch in batches])
+        self.assertEqual(sampler.get_num_batches(self.instances), len(batches))
+        self.assertAlmostEqual(
+            sampler.last_padding_efficiency,
+            padding_efficiency(numpy.array(self.lengths), batches),
+        )
+
+    def test_max_batch_size(self):
+        sampler = TokenBudgetBatchSampler(max_tokens=1000, max_batch_size=3, padding_noise=0.0)
+        batches = list(sampler.get_batch_indices(self.instances))
+        self.assertTrue(all(len(batch) <= 3 for batch in batches))
+
+    def test_lengths_sidecar(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            lengths_file = os.path.join(tmp_dir, "train.lengths.npy")
+            TokenBudgetBatchSampler(max_tokens=64, lengths_file=lengths_file).get_num_batches(
+                self.instances
+            )
+            numpy.testing.assert_array_equal(numpy.load(lengths_file), self.lengths)
+
+            # the sidecar is used instead of counting the tokens again
+            numpy.save(lengths_file, numpy.full(len(self.lengths), 64, dtype=numpy.int32))
+            sampler = TokenBudgetBatchSampler(max_tokens=64, lengths_file=lengths_file)
+            self.assertEqual(sampler.get_num_batches(self.instances), len(self.lengths))
+
+    def test_num_batches_match_the_next_epoch(self):
+        sampler = TokenBudgetBatchSampler(max_tokens=40, padding_noise=0.5)
+        for _ in range(20):
+            num_batches = sampler.get_num_batches(self.instances)
+            self.assertEqual(len(list(sampler.get_batch_indices(self.instances))), num_batches)
+
+    def test_lengths_sidecar_fingerprint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            lengths_file = os.path.join(tmp_dir, "train.lengths.npy")
+            data_path = os.path.join(tmp_dir, "train.jsonl")
+            with open(data_path, "w") as f:
+                f.write("first version\n")
+            TokenBudgetBatchSampler(
+                max_tokens=64, lengths_file=lengths_file, data_path=data_path
+            ).get_num_batches(self.instances)
+            numpy.save(lengths_file, numpy.full(len(self.lengths), 64, dtype=numpy.int32))
+
+            # same data file: the sidecar is used
+            sampler = TokenBudgetBatchSampler(
+                max_tokens=64, lengths_file=lengths_file, data_path=data_path
+            )
+            self.assertEqual(sampler.get_num_batches(self.instances), len(self.lengths))
+
+            # the data file changed: the lengths are counted again
+            with open(data_path, "w") as f:
+                f.write("second version\n")
+            sampler = TokenBudgetBatchSampler(
+                max_tokens=64, lengths_file=lengths_file, data_path=data_path
+            )
+            self.assertLess(sampler.get_num_batches(self.instances), len(self.lengths))
+            numpy.testing.assert_array_equal(numpy.load(lengths_file), self.lengths)
+
+    def test_padding_efficiency_callback(self):
+        sampler = TokenBudgetBatchSampler(max_tokens=64, padding_noise=0.0)
+        list(sampler.get_batch_indices(self.instances))
+        trainer = SimpleNamespace(
+            data_loader=SimpleNamespace(batch_sampler=sampler),
+            _validation_data_loader=SimpleNamespace(batch_sampler=None),
+        )
+        callback = PaddingEfficiencyCallback(tempfile.gettempdir())
+        batch_metrics = {}
+        callback.on_batch(trainer, [], [], batch_metrics, 0, 1, is_training=True)
+        metrics = {}
+        callback.on_epoch(trainer, metrics, 0)
+        self.assertEqual(batch_metrics["padding_efficiency"], sampler.last_padding_efficiency)
+        self.assertEqual(metrics, {"training_padding_efficiency": sampler.last_padding_efficiency})
+
+    def test_padding_efficiency(self):
+        lengths = numpy.array([2, 4, 4])
+        self.assertAlmostEqual(padding_efficiency(lengths, [[0, 1], [2]]), 10 / 12)
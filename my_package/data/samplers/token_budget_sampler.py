@@ -0,0 +1,234 @@
+import hashlib
+import json
+import logging
+import os
+import random
+from typing import Iterable, List, Optional, Sequence
+
+import numpy
+
+from allennlp.data.dataset_readers import DatasetReader
+from allennlp.data.fields import TextField
+from allennlp.data.instance import Instance
+from allennlp.data.samplers import BatchSampler
+
+from my_package.utils.hashing import path_digest
+
+
+logger = logging.getLogger(__name__)
+
+
+def instance_num_tokens(instance: Instance) -> int:
+    """
+    Number of tokens of all the `TextField`s of an instance, counted before indexing.
+    """
+    return sum(
+        len(field.tokens) for field in instance.fields.values() if isinstance(field, TextField)
+    )
+
+
+def lengths_fingerprint(
+    reader: Optional[DatasetReader] = None, data_path: Optional[str] = None
+) -> Optional[str]:
+    """
+    A digest of what the token counts depend on: the content of the data file and the
+    tokenizer (its class, pretrained model and `max_length`) of the reader. `None` when
+    neither is known.
+    """
+    if reader is None and data_path is None:
+        return None
+    description = {}
+    if data_path is not None:
+        description["data"] = path_digest(data_path) if os.path.exists(data_path) else data_path
+    if reader is not None:
+        tokenizer = getattr(reader, "_tokenizer", None)
+        description["reader"] = type(reader).__name__
+        description["tokenizer"] = type(tokenizer).__name__
+        description["model_name"] = getattr(
+            getattr(tokenizer, "tokenizer", None), "name_or_path", None
+        )
+        description["max_length"] = getattr(tokenizer, "_max_length", None)
+        description["combine_input_fields"] = getattr(reader, "_combine_input_fields", None)
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+def _fingerprint_file(lengths_file: str) -> str:
+    return lengths_file + ".fingerprint"
+
+
+def load_lengths(
+    lengths_file: str, num_instances: int, fingerprint: Optional[str] = None
+) -> Optional[numpy.ndarray]:
+    """
+    Returns the lengths stored in `lengths_file`, or `None` if the file does not exist, was
+    built from another data file or tokenizer (when `fingerprint` is given) or does not have
+    one length per instance (e.g. it was built for another shard of the data).
+    """
+    if not os.path.exists(lengths_file):
+        return None
+    if fingerprint is not None:
+        stored = None
+        if os.path.exists(_fingerprint_file(lengths_file)):
+            with open(_fingerprint_file(lengths_file)) as fh:
+                stored = fh.read().strip()
+        if stored != fingerprint:
+            logger.warning(
+                "Ignoring %s: it was built from another data file or tokenizer", lengths_file
+            )
+            return None
+    lengths = numpy.load(lengths_file)
+    if len(lengths) != num_instances:
+        logger.warning(
+            "Ignoring %s: it has %d lengths for %d instances", lengths_file, len(lengths), num_instances
+        )
+        return None
+    return lengths
+
+
+def save_lengths(
+    lengths_file: str, lengths: Sequence[int], fingerprint: Optional[str] = None
+) -> None:
+    numpy.save(lengths_file, numpy.asarray(lengths, dtype=numpy.int32))
+    if fingerprint is not None:
+        with open(_fingerprint_file(lengths_file), "w") as fh:
+            fh.write(fingerprint)
+    elif os.path.exists(_fingerprint_file(lengths_file)):
+        os.remove(_fingerprint_file(lengths_file))
+
+
+def padding_efficiency(lengths: numpy.ndarray, batches: Iterable[List[int]]) -> float:
+    """
+    Fraction of the padded batch tensors that holds real tokens.
+    """
+    real = padded = 0
+    for batch in batches:
+        batch_lengths = lengths[batch]
+        real += int(batch_lengths.sum())
+        padded += int(batch_lengths.max()) * len(batch)
+    return real / padded if padded else 1.0
+
+
+@BatchSampler.register("token_budget")
+class TokenBudgetBatchSampler(BatchSampler):
+    """
+    Groups instances of similar length into batches of at most `max_tokens` padded tokens, so
+    that batches of short pairs (QQP) are large and batches of long evidence (FEVER) are small.
+
+    Unlike the `bucket` and `max_tokens_sampler` samplers, the lengths are not computed from the
+    indexed instances: they are read from a `.npy` sidecar with one token count per instance in
+    reading order, or counted from the unindexed `TextField`s and written to the sidecar for the
+    next run. The sidecar is stored with a fingerprint of the data file and of the tokenizer of
+    the reader (`<lengths_file>.fingerprint`) and is recomputed when either changes. The padding
+    efficiency (real tokens / padded tokens) of every epoch is logged and kept in
+    `last_padding_efficiency`, which the "padding_efficiency" trainer callback reports in the
+    metrics.
+
+    Registered as a `BatchSampler` with name "token_budget".
+
+    # Parameters
+
+    max_tokens : `int`
+        The maximum of `batch_size * longest_instance` for a batch.
+    lengths_file : `str`, optional (default = `None`)
+        Path of the lengths sidecar, e.g. `data/nli/multinli_1.0_train.lengths.npy`.
+    max_batch_size : `int`, optional (default = `None`)
+        An upper bound on the number of instances in a batch.
+    padding_noise : `float`, optional (default = `0.1`)
+        Relative noise added to the lengths before sorting, so that the batches differ from
+        one epoch to the next.
+    reader : `DatasetReader`, optional (default = `None`)
+        The reader of the data loader, passed by the data loader's constructor; its tokenizer
+        goes into the fingerprint of the sidecar.
+    data_path : `str`, optional (default = `None`)
+        The data file of the data loader, passed by the data loader's constructor; its content
+        goes into the fingerprint of the sidecar.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        lengths_file: Optional[str] = None,
+        max_batch_size: Optional[int] = None,
+        padding_noise: float = 0.1,
+        reader: Optional[DatasetReader] = None,
+        data_path: Optional[str] = None,
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.lengths_file = lengths_file
+        self.max_batch_size = max_batch_size
+        self.padding_noise = padding_noise
+        self.last_padding_efficiency: Optional[float] = None
+        self._reader = reader
+        self._data_path = data_path
+        self._lengths: Optional[numpy.ndarray] = None
+        self._next_batches: Optional[List[List[int]]] = None
+
+    def _instance_lengths(self, instances: Sequence[Instance]) -> numpy.ndarray:
+        if self._lengths is not None and len(self._lengths) == len(instances):
+            return self._lengths
+        lengths = None
+        fingerprint = None
+        if self.lengths_file:
+            fingerprint = lengths_fingerprint(self._reader, self._data_path)
+            lengths = load_lengths(self.lengths_file, len(instances), fingerprint)
+        if lengths is None:
+            lengths = numpy.fromiter(
+                (instance_num_tokens(instance) for instance in instances),
+                dtype=numpy.int32,
+                count=len(instances),
+            )
+            if self.lengths_file:
+                save_lengths(self.lengths_file, lengths, fingerprint)
+        self._lengths = lengths
+        self._next_batches = None
+        return lengths
+
+    def _batches(self, lengths: numpy.ndarray) -> List[List[int]]:
+        noisy = lengths * (
+            1.0 + numpy.random.uniform(-self.padding_noise, self.padding_noise, len(lengths))
+        )
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        longest = 0
+        for index in numpy.argsort(noisy, kind="stable").tolist():
+            length = int(lengths[index])
+            if length > self.max_tokens:
+                logger.warning(
+                    "Found instance of size %d, which is bigger than the max_tokens of a batch (%d)",
+                    length,
+                    self.max_tokens,
+                )
+            too_many = self.max_batch_size is not None and len(batch) >= self.max_batch_size
+            if batch and (too_many or max(longest, length) * (len(batch) + 1) > self.max_tokens):
+                batches.append(batch)
+                batch, longest = [], 0
+            batch.append(index)
+            longest = max(longest, length)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _draw_next_batches(self, instances: Sequence[Instance]) -> List[List[int]]:
+        lengths = self._instance_lengths(instances)
+        if self._next_batches is None:
+            self._next_batches = self._batches(lengths)
+        return self._next_batches
+
+    def get_batch_indices(self, instances: Sequence[Instance]) -> Iterable[List[int]]:
+        lengths = self._instance_lengths(instances)
+        # The batches counted by `get_num_batches` are the ones of this epoch.
+        batches = self._draw_next_batches(instances)
+        self._next_batches = None
+        self.last_padding_efficiency = padding_efficiency(lengths, batches)
+        logger.info(
+            "%d batches of %d instances, padding efficiency %.3f",
+            len(batches),
+            len(instances),
+            self.last_padding_efficiency,
+        )
+        random.shuffle(batches)
+        yield from batches
+
+    def get_num_batches(self, instances: Sequence[Instance]) -> int:
+        # The noise is drawn here for the next epoch, so that the count is exact.
+        return len(self._draw_next_batches(instances))
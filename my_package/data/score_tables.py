@@ -0,0 +1,128 @@
+"""
+Id-keyed per-example score tables (sample weights, bias probabilities, teacher probabilities)
+that dataset readers join onto the raw examples while reading, instead of reading a copy of
+the training file with the extra columns merged in.
+
+A score table is a directory written by `utils/build_score_table.py`:
+
+    meta.json       {"id_key": "pairID", "size": N, "columns": ["bias_probs", ...]}
+    ids.npy         sorted example ids as a unicode array (absent for positional tables)
+    <column>.npy    float32 array of shape (N,) or (N, width), in the order of ids.npy
+
+All arrays are opened memory-mapped. When `id_key` is null the table is positional: row `i`
+belongs to the `i`-th line of the data file.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy
+
+from allennlp.common.file_utils import cached_path
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreTable:
+    """
+    A memory-mapped score table, see the module docstring for the format.
+
+    # Parameters
+
+    path : `str`
+        The table directory.
+    columns : `List[str]`, optional (default = all columns of the table)
+        Only join these columns.
+    """
+
+    def __init__(self, path: str, columns: Optional[Iterable[str]] = None) -> None:
+        path = cached_path(path)
+        with open(os.path.join(path, "meta.json"), "r") as fh:
+            meta = json.load(fh)
+        self.path = path
+        self.id_key: Optional[str] = meta.get("id_key")
+        self.size: int = meta["size"]
+        names = list(columns) if columns is not None else meta["columns"]
+        self.columns: Dict[str, numpy.ndarray] = {
+            name: numpy.load(os.path.join(path, "%s.npy" % name), mmap_mode="r") for name in names
+        }
+        self._ids = (
+            numpy.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+            if self.id_key is not None
+            else None
+        )
+        self.num_missing = 0
+
+    def row_of(self, example: Dict[str, Any], position: int) -> Optional[int]:
+        if self._ids is None:
+            return position if position < self.size else None
+        key = str(example.get(self.id_key))
+        row = int(numpy.searchsorted(self._ids, key))
+        if row < self.size and self._ids[row] == key:
+            return row
+        return None
+
+    def join(self, example: Dict[str, Any], position: int) -> Dict[str, Any]:
+        """
+        Adds (or replaces) the table columns of `example`, which is the `position`-th example
+        of the data file. Examples that are not in the table are returned unchanged.
+        """
+        row = self.row_of(example, position)
+        if row is None:
+            self.num_missing += 1
+            return example
+        for name, column in self.columns.items():
+            example[name] = column[row]
+        return example
+
+
+def join_scores(
+    examples: Iterable[Dict[str, Any]], score_table: Optional[ScoreTable]
+) -> Iterator[Dict[str, Any]]:
+    """
+    Joins `score_table` onto a stream of raw examples. A `None` table passes the examples
+    through untouched, so readers can call this unconditionally.
+    """
+    if score_table is None:
+        yield from examples
+        return
+    score_table.num_missing = 0
+    for position, example in enumerate(examples):
+        yield score_table.join(example, position)
+    if score_table.num_missing:
+        logger.warning(
+            "%d examples were not found in score table %s", score_table.num_missing, score_table.path
+        )
+
+
+def write_score_table(
+    output_dir: str,
+    columns: Dict[str, numpy.ndarray],
+    ids: Optional[List[str]] = None,
+    id_key: Optional[str] = None,
+) -> None:
+    """
+    Writes `columns` (rows in the order of `ids`) as a score table, keyed by `id_key` when
+    `ids` are given and positional otherwise. The same format as `utils/build_score_table.py`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    size = len(next(iter(columns.values())))
+    if ids is not None:
+        ids_array = numpy.array(ids)
+        order = numpy.argsort(ids_array, kind="stable")
+        if len(numpy.unique(ids_array)) != len(ids_array):
+            logger.warning("Duplicated ids in %s, only the first occurrence is joined", output_dir)
+        numpy.save(os.path.join(output_dir, "ids.npy"), ids_array[order])
+        columns = {name: column[order] for name, column in columns.items()}
+    for name, column in columns.items():
+        numpy.save(os.path.join(output_dir, "%s.npy" % name), column.astype(numpy.float32))
+    with open(os.path.join(output_dir, "meta.json"), "w") as fh:
+        json.dump(
+            {
+                "id_key": id_key if ids is not None else None,
+                "size": size,
+                "columns": list(columns),
+            },
+            fh,
+        )
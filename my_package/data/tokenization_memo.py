@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from typing import Dict, List, Union
+
+from allennlp.data.tokenizers import Token, Tokenizer
+
+
+class TokenizationMemo:
+    """
+    A bounded LRU memo of `tokenizer.tokenize`, keyed by the raw string. MNLI reuses every
+    premise for three hypotheses, FEVER repeats evidence across claims and QQP repeats
+    questions across pairs, so most of their texts only need to be tokenized once.
+
+    The cached token lists are shared between instances and must not be modified; the readers
+    only build new lists from them (`add_special_tokens`).
+
+    # Parameters
+
+    tokenizer : `Tokenizer`
+        The tokenizer to memoize.
+    max_size : `int`, optional (default = `10000`)
+        Maximum number of memoized strings; `0` disables the memo.
+    """
+
+    def __init__(self, tokenizer: Tokenizer, max_size: int = 10000) -> None:
+        self._tokenizer = tokenizer
+        self._max_size = max_size
+        self._memo: "OrderedDict[str, List[Token]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def tokenize(self, text: str) -> List[Token]:
+        if self._max_size <= 0:
+            return self._tokenizer.tokenize(text)
+        tokens = self._memo.get(text)
+        if tokens is not None:
+            self._memo.move_to_end(text)
+            self.hits += 1
+            return tokens
+        self.misses += 1
+        tokens = self._tokenizer.tokenize(text)
+        self._memo[text] = tokens
+        if len(self._memo) > self._max_size:
+            self._memo.popitem(last=False)
+        return tokens
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "size": len(self._memo),
+        }
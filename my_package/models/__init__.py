@@ -1 +1 @@
-from my_package.models import counterfactual_weight_classifier, utama_weight_classifier, utama_distill_classifier, distill_classifier, product_of_expert_classifier, custom_baseline
+from my_package.models import counterfactual_weight_classifier, utama_weight_classifier, utama_distill_classifier, distill_classifier, product_of_expert_classifier, custom_baseline, multi_head_classifier, early_exit_classifier
@@ -18,6 +18,11 @@ from torch.autograd import Function
 from torch.nn import Module
 from torch import tensor
 
+from my_package.modules.counterfactual_cache import CounterfactualLogitsCache, counterfactual_keys
+from my_package.modules.packing import pack_text_field_tensors, select_text_field_rows
+from my_package.models.output_decoder import OutputDecoder
+from my_package.training.metrics import FusedF1Measure
+
 class GradientReversalFunction(Function):
     """
     original code: https://github.com/jvanvugt/pytorch-domain-adaptation/blob/master/utils.py
@@ -52,6 +57,26 @@ class GradientReversal(torch.nn.Module):
             
 @Model.register("counterfacutal_weight_basic_classifier")
 class CounterfactualWeightBasicClassifier(BasicClassifier):
+    """
+    A `BasicClassifier` with a per-example `sample_weight` on the loss. When the batch also
+    holds the counterfactual input `cf_tokens` (see the "counterfactual" `DataCollator`), the
+    factual and counterfactual sequences are packed into one batch, encoded in a single pass
+    and split again; the counterfactual logits are returned as `cf_logits` / `cf_probs`.
+
+    # Parameters
+
+    counterfactual_loss_weight : `float`, optional (default = `0.0`)
+        Weight of the cross entropy of the counterfactual logits added to the loss.
+    counterfactual_cache_size : `int`, optional (default = `4096`)
+        In eval mode, the counterfactual logits are cached per distinct counterfactual input
+        (for all-mask counterfactuals, per `(len_p, len_h)` pair), so that only unseen inputs
+        are encoded. The cache is cleared whenever the model goes back to training. `0`
+        disables it.
+    decode_tokens : `bool`, optional (default = `False`)
+        If `True`, `make_output_human_readable` also converts the `token_ids` to `tokens`
+        strings; by default only the predicted `label` is decoded.
+    """
+
     def __init__(
         self,
         vocab: Vocabulary,
@@ -63,6 +88,9 @@ class CounterfactualWeightBasicClassifier(BasicClassifier):
         num_labels: int = None,
         label_namespace: str = "labels",
         namespace: str = "tokens",
+        decode_tokens: bool = False,
+        counterfactual_loss_weight: float = 0.0,
+        counterfactual_cache_size: int = 4096,
         initializer: InitializerApplicator = InitializerApplicator(),
         **kwargs,
     ) -> None:
@@ -83,6 +111,8 @@ class CounterfactualWeightBasicClassifier(BasicClassifier):
             self._dropout = None
         self._label_namespace = label_namespace
         self._namespace = namespace
+        self._decode_tokens = decode_tokens
+        self._output_decoder = OutputDecoder(vocab, label_namespace, namespace)
 
         if num_labels:
             self._num_labels = num_labels
@@ -92,14 +122,22 @@ class CounterfactualWeightBasicClassifier(BasicClassifier):
         #Output layer
         self._classification_layer = torch.nn.Linear(self._classifier_input_dim, self._num_labels)
         self._accuracy = CategoricalAccuracy()
+        self._f1 = FusedF1Measure.from_vocab(vocab, self._label_namespace, self._num_labels)
         self._loss = torch.nn.CrossEntropyLoss(reduction='none')
+        self._counterfactual_loss_weight = counterfactual_loss_weight
+        self._counterfactual_cache = (
+            CounterfactualLogitsCache(counterfactual_cache_size) if counterfactual_cache_size else None
+        )
         initializer(self)    
-        
-        
-    def forward(  # type: ignore
-        self, tokens: TextFieldTensors, label: torch.IntTensor = None, sample_weight: torch.FloatTensor = None
-    ) -> Dict[str, torch.Tensor]:
 
+    @overrides
+    def train(self, mode: bool = True):
+        # Cached counterfactual logits go stale as soon as the weights are updated.
+        if mode and self._counterfactual_cache is not None:
+            self._counterfactual_cache.clear()
+        return super().train(mode)
+        
+    def _logits(self, tokens: TextFieldTensors) -> torch.Tensor:
         embedded_text = self._text_field_embedder(tokens)
         mask = get_text_field_mask(tokens)
 
@@ -114,17 +152,90 @@ class CounterfactualWeightBasicClassifier(BasicClassifier):
         if self._feedforward is not None:
             embedded_text = self._feedforward(embedded_text)
         
-        logits = self._classification_layer(embedded_text)
+        return self._classification_layer(embedded_text)
+
+    def _logits_with_cached_counterfactuals(
+        self, tokens: TextFieldTensors, cf_tokens: TextFieldTensors
+    ):
+        cache = self._counterfactual_cache
+        keys = counterfactual_keys(cf_tokens)
+        # The hits are read before any new key is cached, so no eviction can remove them. The
+        # first row of every distinct counterfactual input that is not cached yet is encoded.
+        row_cf_logits: Dict[int, torch.Tensor] = {}
+        missing: Dict = {}
+        for row, key in enumerate(keys):
+            if key in cache:
+                row_cf_logits[row] = cache.get(key)
+            elif key not in missing:
+                missing[key] = row
+        new_cf_logits: Dict = {}
+        if missing:
+            rows = torch.tensor(
+                list(missing.values()),
+                device=util.get_token_ids_from_text_field_tensors(cf_tokens).device,
+            )
+            packed, sizes = pack_text_field_tensors(
+                [tokens, select_text_field_rows(cf_tokens, rows)]
+            )
+            logits, encoded = self._logits(packed).split(sizes)
+            batch_keys = set(keys)
+            for key, cf_row_logits in zip(missing, encoded):
+                cache.put(key, cf_row_logits, pinned=batch_keys)
+                new_cf_logits[key] = cf_row_logits
+        else:
+            logits = self._logits(tokens)
+        for row, key in enumerate(keys):
+            if row not in row_cf_logits:
+                row_cf_logits[row] = new_cf_logits[key]
+                if missing[key] != row:
+                    # A repeat of an input encoded for this batch is a hit as well.
+                    cache.hits += 1
+        cf_logits = torch.stack([row_cf_logits[row] for row in range(len(keys))])
+        return logits, cf_logits
+
+    def forward(  # type: ignore
+        self,
+        tokens: TextFieldTensors,
+        label: torch.IntTensor = None,
+        sample_weight: torch.FloatTensor = None,
+        cf_tokens: TextFieldTensors = None,
+    ) -> Dict[str, torch.Tensor]:
+
+        if cf_tokens is not None and self._counterfactual_cache is not None and not self.training:
+            logits, cf_logits = self._logits_with_cached_counterfactuals(tokens, cf_tokens)
+        elif cf_tokens is not None:
+            packed, sizes = pack_text_field_tensors([tokens, cf_tokens])
+            logits, cf_logits = self._logits(packed).split(sizes)
+        else:
+            logits, cf_logits = self._logits(tokens), None
         probs = torch.nn.functional.softmax(logits, dim=-1)
 
         output_dict = {"logits": logits, "probs": probs}
+        if cf_logits is not None:
+            output_dict["cf_logits"] = cf_logits
+            output_dict["cf_probs"] = torch.nn.functional.softmax(cf_logits, dim=-1)
         output_dict["token_ids"] = util.get_token_ids_from_text_field_tensors(tokens)
         if label is not None:
             loss = self._loss(logits, label.long().view(-1))
             if sample_weight is not None:
                 loss = loss * sample_weight
+            if cf_logits is not None and self._counterfactual_loss_weight:
+                loss = loss + self._counterfactual_loss_weight * self._loss(
+                    cf_logits, label.long().view(-1)
+                )
             output_dict["loss"] = loss.mean()
             self._accuracy(logits, label)
+            self._f1(logits, label)
 
         return output_dict
 
+    @overrides
+    def make_output_human_readable(
+        self, output_dict: Dict[str, torch.Tensor]
+    ) -> Dict[str, torch.Tensor]:
+        return self._output_decoder.make_output_human_readable(output_dict, self._decode_tokens)
+
+    def get_metrics(self, reset: bool = False) -> Dict[str, float]:
+        metrics = {"accuracy": self._accuracy.get_metric(reset)}
+        metrics.update(self._f1.get_metric(reset))
+        return metrics
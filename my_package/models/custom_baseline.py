@@ -8,7 +8,10 @@ from allennlp.models.model import Model
 from allennlp.modules import FeedForward, Seq2SeqEncoder, Seq2VecEncoder, TextFieldEmbedder
 from allennlp.nn import InitializerApplicator, util
 from allennlp.nn.util import get_text_field_mask
-from allennlp.training.metrics import CategoricalAccuracy, F1Measure
+from allennlp.training.metrics import CategoricalAccuracy
+
+from my_package.models.output_decoder import OutputDecoder
+from my_package.training.metrics import FusedF1Measure
 
 
 @Model.register("custom_basic_classifier")
@@ -43,6 +46,9 @@ class BasicClassifier(Model):
         project to the size of the vocabulary namespace corresponding to labels.
     label_namespace : `str`, optional (default = `"labels"`)
         Vocabulary namespace corresponding to labels. By default, we use the "labels" namespace.
+    decode_tokens : `bool`, optional (default = `False`)
+        If `True`, `make_output_human_readable` also converts the `token_ids` to `tokens`
+        strings; by default only the predicted `label` is decoded.
     initializer : `InitializerApplicator`, optional (default=`InitializerApplicator()`)
         If provided, will be used to initialize the model parameters.
     """
@@ -58,6 +64,7 @@ class BasicClassifier(Model):
         num_labels: int = None,
         label_namespace: str = "labels",
         namespace: str = "tokens",
+        decode_tokens: bool = False,
         initializer: InitializerApplicator = InitializerApplicator(),
         **kwargs,
     ) -> None:
@@ -78,6 +85,8 @@ class BasicClassifier(Model):
             self._dropout = None
         self._label_namespace = label_namespace
         self._namespace = namespace
+        self._decode_tokens = decode_tokens
+        self._output_decoder = OutputDecoder(vocab, label_namespace, namespace)
 
         if num_labels:
             self._num_labels = num_labels
@@ -85,7 +94,7 @@ class BasicClassifier(Model):
             self._num_labels = vocab.get_vocab_size(namespace=self._label_namespace)
         self._classification_layer = torch.nn.Linear(self._classifier_input_dim, self._num_labels)
         self._accuracy = CategoricalAccuracy()
-        self._f1_metrics = [F1Measure(positive_label=i) for i in range(self._num_labels)]
+        self._f1 = FusedF1Measure.from_vocab(vocab, self._label_namespace, self._num_labels)
         self._loss = torch.nn.CrossEntropyLoss()
         initializer(self)
 
@@ -139,8 +148,7 @@ class BasicClassifier(Model):
             loss = self._loss(logits, label.long().view(-1))
             output_dict["loss"] = loss
             self._accuracy(logits, label)
-            for label_i in range(self._num_labels):
-                self._f1_metrics[label_i](probs, label)
+            self._f1(probs, label)
 
         return output_dict
 
@@ -148,41 +156,13 @@ class BasicClassifier(Model):
     def make_output_human_readable(
         self, output_dict: Dict[str, torch.Tensor]
     ) -> Dict[str, torch.Tensor]:
-        """
-        Does a simple argmax over the probabilities, converts index to string label, and
-        add `"label"` key to the dictionary with the result.
-        """
-        predictions = output_dict["probs"]
-        if predictions.dim() == 2:
-            predictions_list = [predictions[i] for i in range(predictions.shape[0])]
-        else:
-            predictions_list = [predictions]
-        classes = []
-        for prediction in predictions_list:
-            label_idx = prediction.argmax(dim=-1).item()
-            label_str = self.vocab.get_index_to_token_vocabulary(self._label_namespace).get(
-                label_idx, str(label_idx)
-            )
-            classes.append(label_str)
-        output_dict["label"] = classes
-        tokens = []
-        for instance_tokens in output_dict["token_ids"]:
-            tokens.append(
-                [
-                    self.vocab.get_token_from_index(token_id.item(), namespace=self._namespace)
-                    for token_id in instance_tokens
-                ]
-            )
-        output_dict["tokens"] = tokens
-        return output_dict
+        return self._output_decoder.make_output_human_readable(output_dict, self._decode_tokens)
 
     def get_metrics(self, reset: bool = False) -> Dict[str, float]:
         metrics = {
             "accuracy": self._accuracy.get_metric(reset),
         }
-        for label_i, label_str in self.vocab.get_index_to_token_vocabulary(namespace=self._label_namespace).items():
-            for metric, value in self._f1_metrics[label_i].get_metric(reset).items():
-                metrics["%s_%s"%(label_str, metric)] = value
+        metrics.update(self._f1.get_metric(reset))
         return metrics
 
     default_predictor = "text_classifier"
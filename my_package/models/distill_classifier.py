@@ -19,6 +19,9 @@ from torch.nn import Module
 from torch import tensor
 import numpy as np
 
+from my_package.models.output_decoder import OutputDecoder
+from my_package.training.metrics import FusedF1Measure
+
             
 @Model.register("distill_basic_classifier")
 class DistillBasicClassifier(BasicClassifier):
@@ -33,6 +36,7 @@ class DistillBasicClassifier(BasicClassifier):
         num_labels: int = None,
         label_namespace: str = "labels",
         namespace: str = "tokens",
+        decode_tokens: bool = False,
         initializer: InitializerApplicator = InitializerApplicator(),
         **kwargs,
     ) -> None:
@@ -53,6 +57,8 @@ class DistillBasicClassifier(BasicClassifier):
             self._dropout = None
         self._label_namespace = label_namespace
         self._namespace = namespace
+        self._decode_tokens = decode_tokens
+        self._output_decoder = OutputDecoder(vocab, label_namespace, namespace)
 
         if num_labels:
             self._num_labels = num_labels
@@ -62,6 +68,7 @@ class DistillBasicClassifier(BasicClassifier):
         #Output layer
         self._classification_layer = torch.nn.Linear(self._classifier_input_dim, self._num_labels)
         self._accuracy = CategoricalAccuracy()
+        self._f1 = FusedF1Measure.from_vocab(vocab, self._label_namespace, self._num_labels)
         self._loss = torch.nn.CrossEntropyLoss(reduction='none')
         self._distill_loss = torch.nn.KLDivLoss(reduction='batchmean')
         initializer(self)    
@@ -100,6 +107,17 @@ class DistillBasicClassifier(BasicClassifier):
                 loss = self._loss(logits, label.long().view(-1))
             output_dict["loss"] = loss.mean()
             self._accuracy(logits, label)
+            self._f1(logits, label)
 
         return output_dict
 
+    @overrides
+    def make_output_human_readable(
+        self, output_dict: Dict[str, torch.Tensor]
+    ) -> Dict[str, torch.Tensor]:
+        return self._output_decoder.make_output_human_readable(output_dict, self._decode_tokens)
+
+    def get_metrics(self, reset: bool = False) -> Dict[str, float]:
+        metrics = {"accuracy": self._accuracy.get_metric(reset)}
+        metrics.update(self._f1.get_metric(reset))
+        return metrics
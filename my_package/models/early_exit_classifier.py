@@ -0,0 +1,251 @@
+from typing import Dict, List, Optional
+
+from overrides import overrides
+import torch
+import torch.nn.functional as F
+
+from allennlp.common.checks import ConfigurationError
+from allennlp.data import TextFieldTensors, Vocabulary
+from allennlp.models.model import Model
+from allennlp.modules.token_embedders import PretrainedTransformerEmbedder
+from allennlp.nn import util
+from allennlp.training.metrics import CategoricalAccuracy
+
+from my_package.training.metrics import ExampleAverage
+
+
+@Model.register("early_exit_classifier")
+class EarlyExitClassifier(Model):
+    """
+    Confidence-based early exit for a trained BERT classifier of `my_package.models` (usually
+    loaded with `{"type": "from_archive", "archive_file": ...}`). Light classifiers on the
+    `[CLS]` state are attached after some of the transformer layers and trained by
+    distillation from the final head, with the classifier itself frozen. At inference the
+    layers are run one at a time and an example stops at the first exit whose highest
+    probability reaches `threshold`; the examples that never do get the prediction of the
+    original head. Only the examples still running go through the next layers.
+
+    Besides `accuracy`, the metrics report `average_layers` (the mean number of transformer
+    layers run per example) and, for every exit, the fraction of examples leaving there
+    (`exit_<layer>_fraction`). With `threshold_sweep`, every exit is computed for every
+    example instead and the accuracy and average layers of each threshold are reported as
+    `threshold_<t>_accuracy` and `threshold_<t>_average_layers`, next to the accuracy of
+    every exit (`exit_<layer>_accuracy`) and of the full model (`full_accuracy`).
+
+    Sequences have to fit in the transformer's `max_length`, long sequence folding is not
+    supported.
+
+    Registered as a `Model` with name "early_exit_classifier".
+
+    # Parameters
+
+    vocab : `Vocabulary`
+    classifier : `Model`
+        The trained classifier, with a `PretrainedTransformerEmbedder` of a BERT-like model.
+    exit_layers : `List[int]`
+        The number of layers after which an exit is attached, e.g. `[2, 4, 6, 8, 10]`.
+    threshold : `float`, optional (default = `0.9`)
+        Confidence an exit needs to stop an example.
+    temperature : `float`, optional (default = `1.0`)
+        Temperature of the distillation from the final head.
+    dropout : `float`, optional (default = `0.1`)
+        Dropout of the exit classifiers.
+    threshold_sweep : `List[float]`, optional (default = `None`)
+        If given, evaluation runs all the layers and reports the tradeoff of every threshold.
+    """
+
+    def __init__(
+        self,
+        vocab: Vocabulary,
+        classifier: Model,
+        exit_layers: List[int],
+        threshold: float = 0.9,
+        temperature: float = 1.0,
+        dropout: float = 0.1,
+        threshold_sweep: Optional[List[float]] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(vocab, **kwargs)
+        self._classifier = classifier
+        token_embedders = classifier._text_field_embedder._token_embedders
+        self._indexer_name, embedder = next(iter(token_embedders.items()))
+        if len(token_embedders) != 1 or not isinstance(embedder, PretrainedTransformerEmbedder):
+            raise ConfigurationError("Early exit needs a single pretrained transformer embedder")
+        self._transformer = embedder.transformer_model
+        self._num_layers = len(self._transformer.encoder.layer)
+        if any(not 0 < layer < self._num_layers for layer in exit_layers):
+            raise ConfigurationError(
+                "Exit layers must be between 1 and %d" % (self._num_layers - 1)
+            )
+        for parameter in self._classifier.parameters():
+            parameter.requires_grad_(False)
+
+        hidden_size = self._transformer.config.hidden_size
+        num_labels = classifier._num_labels
+        self._exit_layers = sorted(exit_layers)
+        self._exits = torch.nn.ModuleDict(
+            {
+                str(layer): torch.nn.Sequential(
+                    torch.nn.Linear(hidden_size, hidden_size),
+                    torch.nn.Tanh(),
+                    torch.nn.Dropout(dropout),
+                    torch.nn.Linear(hidden_size, num_labels),
+                )
+                for layer in self._exit_layers
+            }
+        )
+        self._threshold = threshold
+        self._temperature = temperature
+        self._threshold_sweep = threshold_sweep
+
+        self._accuracy = CategoricalAccuracy()
+        self._average_layers = ExampleAverage()
+        self._exit_fractions = {layer: ExampleAverage() for layer in self._exit_layers}
+        self._exit_accuracies = {layer: CategoricalAccuracy() for layer in self._exit_layers}
+        self._full_accuracy = CategoricalAccuracy()
+        self._sweep_accuracies = {t: ExampleAverage() for t in threshold_sweep or []}
+        self._sweep_layers = {t: ExampleAverage() for t in threshold_sweep or []}
+
+    @overrides
+    def train(self, mode: bool = True):
+        super().train(mode)
+        # The frozen classifier is the distillation teacher: no dropout.
+        self._classifier.eval()
+        return self
+
+    def _final_logits(self, hidden: torch.Tensor, mask: torch.BoolTensor) -> torch.Tensor:
+        classifier = self._classifier
+        if classifier._seq2seq_encoder:
+            hidden = classifier._seq2seq_encoder(hidden, mask=mask)
+        pooled = classifier._seq2vec_encoder(hidden, mask=mask)
+        if classifier._dropout:
+            pooled = classifier._dropout(pooled)
+        if classifier._feedforward is not None:
+            pooled = classifier._feedforward(pooled)
+        return classifier._classification_layer(pooled)
+
+    def _all_exit_logits(self, hidden, attention_mask, mask) -> Dict[int, torch.Tensor]:
+        # Logits of every exit and of the final head (under key `num_layers`) for all rows.
+        logits: Dict[int, torch.Tensor] = {}
+        for index, layer in enumerate(self._transformer.encoder.layer):
+            hidden = layer(hidden, attention_mask=attention_mask)[0]
+            if str(index + 1) in self._exits:
+                logits[index + 1] = self._exits[str(index + 1)](hidden[:, 0])
+        with torch.no_grad():
+            logits[self._num_layers] = self._final_logits(hidden, mask)
+        return logits
+
+    def _early_exit_logits(self, hidden, attention_mask, mask):
+        batch_size = hidden.size(0)
+        logits = hidden.new_zeros((batch_size, self._classifier._num_labels))
+        layers_used = torch.full((batch_size,), self._num_layers, device=hidden.device)
+        active = torch.arange(batch_size, device=hidden.device)
+        for index, layer in enumerate(self._transformer.encoder.layer):
+            hidden = layer(hidden, attention_mask=attention_mask)[0]
+            exit_head = self._exits[str(index + 1)] if str(index + 1) in self._exits else None
+            if exit_head is None:
+                continue
+            exit_logits = exit_head(hidden[:, 0])
+            done = F.softmax(exit_logits, dim=-1).max(dim=-1)[0] >= self._threshold
+            logits[active[done]] = exit_logits[done]
+            layers_used[active[done]] = index + 1
+            keep = ~done
+            active, hidden = active[keep], hidden[keep]
+            attention_mask, mask = attention_mask[keep], mask[keep]
+            if active.numel() == 0:
+                return logits, layers_used
+        logits[active] = self._final_logits(hidden, mask)
+        return logits, layers_used
+
+    def forward(  # type: ignore
+        self, tokens: TextFieldTensors, label: torch.IntTensor = None, **kwargs
+    ) -> Dict[str, torch.Tensor]:
+        tensors = tokens[self._indexer_name]
+        token_ids, mask = tensors["token_ids"], tensors["mask"]
+        hidden = self._transformer.embeddings(
+            input_ids=token_ids, token_type_ids=tensors.get("type_ids")
+        )
+        attention_mask = self._transformer.get_extended_attention_mask(
+            mask, token_ids.size(), token_ids.device
+        )
+        output_dict: Dict[str, torch.Tensor] = {
+            "token_ids": util.get_token_ids_from_text_field_tensors(tokens)
+        }
+
+        if self.training or self._threshold_sweep:
+            all_logits = self._all_exit_logits(hidden, attention_mask, mask)
+            final_logits = all_logits[self._num_layers]
+            if self.training:
+                teacher = F.softmax(final_logits / self._temperature, dim=-1)
+                output_dict["loss"] = sum(
+                    F.kl_div(
+                        F.log_softmax(all_logits[layer] / self._temperature, dim=-1),
+                        teacher,
+                        reduction="batchmean",
+                    )
+                    for layer in self._exit_layers
+                ) * self._temperature ** 2
+                logits, layers_used = final_logits, torch.full_like(
+                    token_ids[:, 0], self._num_layers
+                )
+            else:
+                logits, layers_used = self._sweep(all_logits, label)
+        else:
+            with torch.no_grad():
+                logits, layers_used = self._early_exit_logits(hidden, attention_mask, mask)
+
+        output_dict["logits"] = logits
+        output_dict["probs"] = F.softmax(logits, dim=-1)
+        output_dict["exit_layer"] = layers_used
+        self._average_layers(layers_used)
+        for layer in self._exit_layers:
+            self._exit_fractions[layer](layers_used == layer)
+        if label is not None:
+            self._accuracy(logits, label)
+        return output_dict
+
+    def _sweep(self, all_logits: Dict[int, torch.Tensor], label: Optional[torch.Tensor]):
+        # Simulates every threshold of the sweep from the logits of all exits, and returns the
+        # early exit predictions at `threshold`.
+        layers = self._exit_layers + [self._num_layers]
+        stacked = torch.stack([all_logits[layer] for layer in layers], dim=1)
+        confidence = F.softmax(stacked, dim=-1).max(dim=-1)[0]
+        # The final head takes every example no exit stopped, whatever the threshold.
+        confidence[:, -1] = float("inf")
+        layer_tensor = torch.tensor(layers, device=stacked.device)
+        rows = torch.arange(stacked.size(0), device=stacked.device)
+
+        def exits_at(threshold: float):
+            first = (confidence >= threshold).float().argmax(dim=1)
+            return stacked[rows, first], layer_tensor[first]
+
+        if label is not None:
+            self._full_accuracy(all_logits[self._num_layers], label)
+            for layer in self._exit_layers:
+                self._exit_accuracies[layer](all_logits[layer], label)
+            for threshold in self._threshold_sweep:
+                logits, layers_used = exits_at(threshold)
+                self._sweep_accuracies[threshold](logits.argmax(dim=-1) == label.view(-1))
+                self._sweep_layers[threshold](layers_used)
+        return exits_at(self._threshold)
+
+    @overrides
+    def get_metrics(self, reset: bool = False) -> Dict[str, float]:
+        metrics = {
+            "accuracy": self._accuracy.get_metric(reset),
+            "average_layers": self._average_layers.get_metric(reset),
+        }
+        for layer in self._exit_layers:
+            metrics["exit_%d_fraction" % layer] = self._exit_fractions[layer].get_metric(reset)
+        if self._threshold_sweep:
+            metrics["full_accuracy"] = self._full_accuracy.get_metric(reset)
+            for layer in self._exit_layers:
+                metrics["exit_%d_accuracy" % layer] = self._exit_accuracies[layer].get_metric(reset)
+            for threshold in self._threshold_sweep:
+                metrics["threshold_%g_accuracy" % threshold] = self._sweep_accuracies[
+                    threshold
+                ].get_metric(reset)
+                metrics["threshold_%g_average_layers" % threshold] = self._sweep_layers[
+                    threshold
+                ].get_metric(reset)
+        return metrics
@@ -0,0 +1,159 @@
+from copy import deepcopy
+import inspect
+from typing import Any, Dict, Optional
+
+from overrides import overrides
+import torch
+
+from allennlp.common import Lazy
+from allennlp.data import TextFieldTensors, Vocabulary
+from allennlp.models.model import Model
+from allennlp.modules import Seq2SeqEncoder, Seq2VecEncoder, TextFieldEmbedder
+from allennlp.modules.seq2vec_encoders import ClsPooler
+from allennlp.modules.text_field_embedders import BasicTextFieldEmbedder
+from allennlp.nn import InitializerApplicator, util
+
+from my_package.modules.pooled_embedding_cache import PooledEmbedding, pooled_encode
+
+
+SHARED_MODULES = ("text_field_embedder", "seq2seq_encoder", "seq2vec_encoder")
+
+
+@Model.register("multi_head_classifier")
+class MultiHeadClassifier(Model):
+    """
+    Trains several debiasing strategies at once on one shared encoder. The text is embedded
+    and pooled once per batch, and every head, one of the classifiers of `my_package.models`
+    (`custom_basic_classifier`, `product_of_expert_basic_classifier`,
+    `utama_weight_basic_classifier`, `distill_basic_classifier`, ...) with its own loss, is
+    run on the pooled embeddings through a `"pooled_embedding"` token embedder and a
+    `"cls_pooler"`, which are filled in for it. Each head receives the side features of the
+    batch its `forward` accepts, so the reader has to provide all the columns the heads need.
+
+    The loss is the weighted sum of the head losses. The outputs and metrics of every head
+    are prefixed with its name, e.g. `poe_probs` and `poe_accuracy`. A head can be exported
+    as a standalone archive of its own classifier with the `archive_head` subcommand.
+
+    Registered as a `Model` with name "multi_head_classifier".
+
+    # Parameters
+
+    vocab : `Vocabulary`
+    text_field_embedder : `TextFieldEmbedder`
+        The shared embedder.
+    seq2vec_encoder : `Seq2VecEncoder`
+        The shared pooler, e.g. a `"bert_pooler"`.
+    heads : `Dict[str, Lazy[Model]]`
+        The head classifiers, without their `text_field_embedder` and `seq2vec_encoder`.
+    seq2seq_encoder : `Seq2SeqEncoder`, optional (default = `None`)
+        An optional shared encoder between the embedder and the pooler.
+    loss_weights : `Dict[str, float]`, optional (default = `None`)
+        Weight of the loss of every head, `1.0` for the heads that are not listed.
+    """
+
+    def __init__(
+        self,
+        vocab: Vocabulary,
+        text_field_embedder: TextFieldEmbedder,
+        seq2vec_encoder: Seq2VecEncoder,
+        heads: Dict[str, Lazy[Model]],
+        seq2seq_encoder: Seq2SeqEncoder = None,
+        loss_weights: Optional[Dict[str, float]] = None,
+        initializer: InitializerApplicator = InitializerApplicator(),
+        **kwargs,
+    ) -> None:
+        super().__init__(vocab, **kwargs)
+        self._text_field_embedder = text_field_embedder
+        self._seq2seq_encoder = seq2seq_encoder
+        self._seq2vec_encoder = seq2vec_encoder
+
+        pooled_dim = seq2vec_encoder.get_output_dim()
+        self._heads = torch.nn.ModuleDict(
+            {
+                name: head.construct(
+                    vocab=vocab,
+                    text_field_embedder=BasicTextFieldEmbedder(
+                        {"pooled": PooledEmbedding(pooled_dim)}
+                    ),
+                    seq2vec_encoder=ClsPooler(pooled_dim),
+                )
+                for name, head in heads.items()
+            }
+        )
+        self._loss_weights = {name: 1.0 for name in self._heads}
+        self._loss_weights.update(loss_weights or {})
+        self._head_arguments = {
+            name: set(inspect.signature(head.forward).parameters) - {"tokens"}
+            for name, head in self._heads.items()
+        }
+        initializer(self)
+
+    def forward(  # type: ignore
+        self, tokens: TextFieldTensors, **kwargs: torch.Tensor
+    ) -> Dict[str, torch.Tensor]:
+        pooled = pooled_encode(self, tokens)
+        batch_size = pooled.size(0)
+        pooled_tokens = {
+            "pooled": {
+                "tokens": pooled.new_zeros((batch_size, 1), dtype=torch.long),
+                "embedding": pooled.unsqueeze(1),
+                "mask": pooled.new_ones((batch_size, 1), dtype=torch.bool),
+            }
+        }
+
+        output_dict: Dict[str, torch.Tensor] = {
+            "token_ids": util.get_token_ids_from_text_field_tensors(tokens)
+        }
+        loss = None
+        for name, head in self._heads.items():
+            head_kwargs = {
+                key: value for key, value in kwargs.items() if key in self._head_arguments[name]
+            }
+            head_output = head(tokens=pooled_tokens, **head_kwargs)
+            for key, value in head_output.items():
+                if key not in ("token_ids", "loss"):
+                    output_dict["%s_%s" % (name, key)] = value
+            if "loss" in head_output:
+                head_loss = self._loss_weights[name] * head_output["loss"]
+                output_dict["%s_loss" % name] = head_output["loss"].detach()
+                loss = head_loss if loss is None else loss + head_loss
+        if loss is not None:
+            output_dict["loss"] = loss
+        return output_dict
+
+    @overrides
+    def get_metrics(self, reset: bool = False) -> Dict[str, float]:
+        metrics: Dict[str, float] = {}
+        for name, head in self._heads.items():
+            for metric, value in head.get_metrics(reset).items():
+                metrics["%s_%s" % (name, metric)] = value
+        return metrics
+
+    def head_state_dict(self, head: str) -> Dict[str, torch.Tensor]:
+        """
+        The weights of `head` as a standalone classifier: the shared modules and the
+        parameters of the head.
+        """
+        prefix = "_heads.%s." % head
+        shared = tuple("_%s." % module for module in SHARED_MODULES)
+        state_dict = self.state_dict()
+        head_state = {key: value for key, value in state_dict.items() if key.startswith(shared)}
+        head_state.update(
+            {key[len(prefix):]: value for key, value in state_dict.items() if key.startswith(prefix)}
+        )
+        return head_state
+
+    @staticmethod
+    def head_config(config: Dict[str, Any], head: str) -> Dict[str, Any]:
+        """
+        The experiment configuration of `head` as a standalone classifier: its model is the
+        head's classifier with the shared modules.
+        """
+        model_config = config["model"]
+        head_model = deepcopy(model_config["heads"][head])
+        for module in SHARED_MODULES:
+            if model_config.get(module) is not None:
+                head_model[module] = deepcopy(model_config[module])
+        config = deepcopy(config)
+        config["model"] = head_model
+        return config
@@ -0,0 +1,63 @@
+from typing import Dict, List, Tuple
+
+import numpy
+import torch
+
+from allennlp.data import Vocabulary
+
+
+class OutputDecoder:
+    """
+    Batched `make_output_human_readable` for the classifiers. The labels of a whole batch are
+    decoded with one argmax and one lookup in an array of label strings, and the token strings,
+    only built when `decode_tokens` is set, with one lookup in an array of the namespace's
+    tokens. The arrays are built once and rebuilt only when the vocabulary grows.
+
+    # Parameters
+
+    vocab : `Vocabulary`
+    label_namespace : `str`, optional (default = `"labels"`)
+    namespace : `str`, optional (default = `"tokens"`)
+        Namespace of the token ids.
+    """
+
+    def __init__(
+        self, vocab: Vocabulary, label_namespace: str = "labels", namespace: str = "tokens"
+    ) -> None:
+        self._vocab = vocab
+        self._label_namespace = label_namespace
+        self._namespace = namespace
+        self._arrays: Dict[str, Tuple[Tuple[int, int], numpy.ndarray]] = {}
+
+    def _array(self, namespace: str, min_size: int = 0) -> numpy.ndarray:
+        index_to_token = self._vocab.get_index_to_token_vocabulary(namespace)
+        key = (len(index_to_token), max(len(index_to_token), min_size))
+        cached = self._arrays.get(namespace)
+        if cached is None or cached[0] != key:
+            array = numpy.array(
+                [index_to_token.get(index, str(index)) for index in range(key[1])], dtype=object
+            )
+            cached = self._arrays[namespace] = (key, array)
+        return cached[1]
+
+    def labels(self, probs: torch.Tensor) -> List[str]:
+        if probs.dim() == 1:
+            probs = probs.unsqueeze(0)
+        label_indices = probs.argmax(dim=-1).cpu().numpy()
+        return self._array(self._label_namespace, probs.size(-1))[label_indices].tolist()
+
+    def tokens(self, token_ids: torch.Tensor) -> List[List[str]]:
+        token_ids = token_ids.cpu().numpy()
+        return self._array(self._namespace, int(token_ids.max(initial=-1)) + 1)[token_ids].tolist()
+
+    def make_output_human_readable(
+        self, output_dict: Dict[str, torch.Tensor], decode_tokens: bool = False
+    ) -> Dict[str, torch.Tensor]:
+        """
+        Adds the `"label"` of every prediction and, with `decode_tokens`, the `"tokens"`
+        strings of the `"token_ids"`.
+        """
+        output_dict["label"] = self.labels(output_dict["probs"])
+        if decode_tokens and "token_ids" in output_dict:
+            output_dict["tokens"] = self.tokens(output_dict["token_ids"])
+        return output_dict
@@ -10,7 +10,10 @@ from allennlp.models.model import Model
 from allennlp.modules import FeedForward, Seq2SeqEncoder, Seq2VecEncoder, TextFieldEmbedder
 from allennlp.nn import InitializerApplicator, util
 from allennlp.nn.util import get_text_field_mask
-from allennlp.training.metrics import CategoricalAccuracy, F1Measure
+from allennlp.training.metrics import CategoricalAccuracy
+
+from my_package.models.output_decoder import OutputDecoder
+from my_package.training.metrics import FusedF1Measure
 
 
 from torch.autograd import Function
@@ -33,6 +36,7 @@ class ProductofExpertBasicClassifier(BasicClassifier):
         num_labels: int = None,
         label_namespace: str = "labels",
         namespace: str = "tokens",
+        decode_tokens: bool = False,
         initializer: InitializerApplicator = InitializerApplicator(),
         **kwargs,
     ) -> None:
@@ -54,6 +58,8 @@ class ProductofExpertBasicClassifier(BasicClassifier):
             self._dropout = None
         self._label_namespace = label_namespace
         self._namespace = namespace
+        self._decode_tokens = decode_tokens
+        self._output_decoder = OutputDecoder(vocab, label_namespace, namespace)
 
         if num_labels:
             self._num_labels = num_labels
@@ -65,8 +71,7 @@ class ProductofExpertBasicClassifier(BasicClassifier):
         self._classification_layer = torch.nn.Linear(
             self._classifier_input_dim, self._num_labels)
         self._accuracy = CategoricalAccuracy()
-        self._f1_metrics = [F1Measure(positive_label=i)
-                            for i in range(self._num_labels)]
+        self._f1 = FusedF1Measure.from_vocab(vocab, self._label_namespace, self._num_labels)
 
         self._loss = torch.nn.CrossEntropyLoss(reduction='none')
         initializer(self)
@@ -115,16 +120,19 @@ class ProductofExpertBasicClassifier(BasicClassifier):
                 loss = self._loss(logits, label.long().view(-1))
             output_dict["loss"] = loss.mean()
             self._accuracy(logits, label)
-            for label_i in range(self._num_labels):
-                self._f1_metrics[label_i](probs, label)
+            self._f1(probs, label)
 
         return output_dict
 
+    @overrides
+    def make_output_human_readable(
+        self, output_dict: Dict[str, torch.Tensor]
+    ) -> Dict[str, torch.Tensor]:
+        return self._output_decoder.make_output_human_readable(output_dict, self._decode_tokens)
+
     def get_metrics(self, reset: bool = False) -> Dict[str, float]:
         metrics = {
             "accuracy": self._accuracy.get_metric(reset),
         }
-        for label_i, label_str in self.vocab.get_index_to_token_vocabulary(namespace=self._label_namespace).items():
-            for metric, value in self._f1_metrics[label_i].get_metric(reset).items():
-                metrics["%s_%s" % (label_str, metric)] = value
+        metrics.update(self._f1.get_metric(reset))
         return metrics
@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy
+import torch
+
+from allennlp.data import Vocabulary
+from allennlp.data.tokenizers import WhitespaceTokenizer
+from allennlp.modules.seq2vec_encoders import BagOfEmbeddingsEncoder
+from allennlp.modules.text_field_embedders import BasicTextFieldEmbedder
+from allennlp.modules.token_embedders import Embedding
+
+from my_package.data.dataset_readers.distill_reader import DistillSnliReader
+from my_package.data.score_tables import write_score_table
+from my_package.models.custom_baseline import BasicClassifier
+from my_package.modules.bulk_inference import (
+    BulkPredictions,
+    bulk_predict,
+    challenge_accuracy,
+    example_ids,
+)
+
+
+class TestBulkInference(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "train.jsonl")
+        docs = [
+            {"pairID": "p%d" % i, "gold_label": label, "sentence1": "a b %d" % i, "sentence2": "c"}
+            for i, label in enumerate(["neutral", "-", "entailment", "contradiction", "neutral"])
+        ]
+        with open(self.path, "w") as f:
+            for doc in docs:
+                f.write(json.dumps(doc) + "\n")
+        self.reader = DistillSnliReader(tokenizer=WhitespaceTokenizer(), combine_input_fields=True)
+
+        vocab = Vocabulary.from_instances(self.reader.read(self.path))
+        self.model = BasicClassifier(
+            vocab,
+            text_field_embedder=BasicTextFieldEmbedder(
+                {"tokens": Embedding(embedding_dim=8, vocab_namespace="tokens", vocab=vocab)}
+            ),
+            seq2vec_encoder=BagOfEmbeddingsEncoder(8),
+        ).eval()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_bulk_predict_matches_the_model(self):
+        predictions = bulk_predict(self.model, self.reader, self.path, id_key="pairID", batch_size=3)
+        self.assertEqual(predictions.ids, ["p0", "p2", "p3", "p4"])
+        self.assertEqual(predictions.gold_labels, ["neutral", "entailment", "contradiction", "neutral"])
+        self.assertEqual(len(predictions.batch_seconds), 2)
+
+        instances = list(self.reader.read(self.path))
+        expected = numpy.stack(
+            [output["probs"] for output in self.model.forward_on_instances(instances)]
+        )
+        numpy.testing.assert_allclose(predictions.probs, expected, rtol=1e-5)
+
+    def test_example_ids_follow_the_kept_examples(self):
+        self.assertEqual(example_ids(self.reader, self.path), [0, 2, 3, 4])
+        self.assertEqual(example_ids(self.reader, self.path, "pairID"), ["p0", "p2", "p3", "p4"])
+        self.reader.max_instances = 2
+        self.assertEqual(example_ids(self.reader, self.path), [0, 2])
+
+    def test_teacher_score_table_is_joined_by_the_distill_reader(self):
+        predictions = bulk_predict(self.model, self.reader, self.path, id_key="pairID")
+        table_dir = os.path.join(self.tmp_dir.name, "teacher")
+        write_score_table(
+            table_dir, {"distill_probs": predictions.probs}, ids=predictions.ids, id_key="pairID"
+        )
+        reader = DistillSnliReader(tokenizer=WhitespaceTokenizer(), score_table=table_dir)
+        distill_probs = numpy.stack(
+            [instance["distill_probs"].array for instance in reader.read(self.path)]
+        )
+        numpy.testing.assert_allclose(distill_probs, predictions.probs)
+
+    def test_challenge_accuracy_collapses_binary_labels(self):
+        labels = ["entailment", "neutral", "contradiction"]
+        probs = numpy.eye(3, dtype=numpy.float32)[[0, 1, 2, 0]]
+        hans = BulkPredictions(
+            probs, [None] * 4, ["entailment", "non-entailment", "non-entailment", "non-entailment"], []
+        )
+        self.assertEqual(challenge_accuracy(hans, labels, self.reader), 0.75)
+        nli = BulkPredictions(probs, [None] * 4, ["entailment", "neutral", "neutral", "entailment"], [])
+        self.assertEqual(challenge_accuracy(nli, labels, self.reader), 0.75)
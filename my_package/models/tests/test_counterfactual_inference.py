@@ -0,0 +1,90 @@
+import os
+import sys
+from unittest import TestCase
+
+import numpy
+
+from allennlp.data.tokenizers import WhitespaceTokenizer
+
+from my_package.data.dataset_readers.distill_reader import DistillSnliReader
+from my_package.modules.counterfactual_inference import (
+    counterfactual_scores,
+    fit_correction,
+    fit_corrections,
+    score_metrics,
+    sum_fuse,
+)
+
+COUNTERFACTUAL_DIR = os.path.join(
+    os.path.dirname(__file__), os.pardir, os.pardir, os.pardir, "counterfactual"
+)
+
+
+def kl_to_fused(bias_probs, model_scores, c):
+    fused = numpy.exp(sum_fuse(c, model_scores))
+    probs = fused / fused.sum(axis=-1, keepdims=True)
+    return numpy.mean(bias_probs * numpy.log(bias_probs / probs))
+
+
+class TestCounterfactualInference(TestCase):
+    def setUp(self):
+        rng = numpy.random.default_rng(0)
+        self.bias_probs = rng.dirichlet(numpy.ones(3), 200)
+        self.probs = rng.dirichlet(numpy.ones(3), 200)
+
+    def test_fit_correction_decreases_the_divergence(self):
+        c = fit_correction(self.bias_probs, self.probs, epochs=8, learning_rate=1e-2)
+        self.assertEqual(c.shape, (3,))
+        self.assertTrue(numpy.all(c == c[0]))
+        self.assertLess(
+            kl_to_fused(self.bias_probs, self.probs, c),
+            kl_to_fused(self.bias_probs, self.probs, numpy.full(3, 1.0 / 3)),
+        )
+        numpy.testing.assert_array_equal(
+            c, fit_correction(self.bias_probs, self.probs, epochs=8, learning_rate=1e-2)
+        )
+
+    def test_corrections_match_sharpness_correction(self):
+        sys.path.insert(0, COUNTERFACTUAL_DIR)
+        try:
+            import kl_general
+        finally:
+            sys.path.remove(COUNTERFACTUAL_DIR)
+        # One batch of the whole set, so that both fits see the same batches whatever the
+        # shuffling.
+        fit = {"EPOCHS": 4, "BATCH_SIZE": 200, "LEARNING_RATE": 1e-2}
+        config = dict(kl_general.DEFAULT_CONFIG, **fit)
+        te_config = dict(kl_general.TE_CONFIG, **fit)
+
+        c, c_te = fit_corrections(
+            self.probs, self.bias_probs, epochs=4, batch_size=200, learning_rate=1e-2
+        )
+        expected_c = kl_general.sharpness_correction(
+            self.bias_probs, sum_fuse(self.probs, self.bias_probs), config=config
+        )
+        expected_c_te = kl_general.sharpness_correction(
+            self.bias_probs, self.probs, config=te_config
+        )
+        numpy.testing.assert_allclose(c, expected_c * numpy.ones(3), rtol=1e-5)
+        numpy.testing.assert_allclose(c_te, expected_c_te * numpy.ones(3), rtol=1e-5)
+
+    def test_counterfactual_scores(self):
+        c, c_te = fit_corrections(self.probs, self.bias_probs, epochs=2)
+        scores = counterfactual_scores(self.probs, self.bias_probs, c, c_te)
+        numpy.testing.assert_array_equal(scores["factual"], self.probs)
+        numpy.testing.assert_allclose(
+            scores["tie"],
+            numpy.log(1 / (1 + numpy.exp(-(self.probs + self.bias_probs))))
+            - numpy.log(1 / (1 + numpy.exp(-(c + self.bias_probs)))),
+        )
+        numpy.testing.assert_allclose(scores["te_model"], self.probs - c_te * self.bias_probs)
+
+    def test_score_metrics_collapse_binary_labels(self):
+        reader = DistillSnliReader(tokenizer=WhitespaceTokenizer())
+        labels = ["entailment", "neutral", "contradiction"]
+        scores = numpy.eye(3)[[0, 1, 2, 0]]
+        metrics = score_metrics(
+            scores, labels, ["entailment", "non-entailment", "non-entailment", "non-entailment"], reader
+        )
+        self.assertEqual(metrics["accuracy"], 0.75)
+        self.assertAlmostEqual(metrics["macro_f1"], (2 / 3 + 0.8) / 2)
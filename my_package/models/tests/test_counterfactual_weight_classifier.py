@@ -0,0 +1,108 @@
+from unittest import TestCase
+
+import torch
+
+from allennlp.data import Vocabulary
+from allennlp.modules.seq2vec_encoders import BagOfEmbeddingsEncoder
+from allennlp.modules.text_field_embedders import BasicTextFieldEmbedder
+from allennlp.modules.token_embedders import Embedding
+
+from my_package.models.counterfactual_weight_classifier import CounterfactualWeightBasicClassifier
+from my_package.modules.packing import pack_text_field_tensors
+
+
+def _text_field(token_ids):
+    return {"tokens": {"tokens": torch.tensor(token_ids)}}
+
+
+class TestCounterfactualWeightBasicClassifier(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        vocab = Vocabulary()
+        vocab.add_tokens_to_namespace(["a", "b", "c", "[MASK]"], "tokens")
+        vocab.add_tokens_to_namespace(["entailment", "neutral", "contradiction"], "labels")
+        embedder = BasicTextFieldEmbedder(
+            {"tokens": Embedding(embedding_dim=4, num_embeddings=vocab.get_vocab_size())}
+        )
+        self.model = CounterfactualWeightBasicClassifier(
+            vocab,
+            text_field_embedder=embedder,
+            seq2vec_encoder=BagOfEmbeddingsEncoder(4, averaged=True),
+            counterfactual_loss_weight=0.5,
+        ).eval()
+        self.tokens = _text_field([[2, 3, 4, 0], [2, 3, 4, 5]])
+        self.cf_tokens = _text_field([[5, 5, 0], [5, 5, 5]])
+        self.label = torch.tensor([0, 2])
+
+    def test_pack_text_field_tensors(self):
+        packed, sizes = pack_text_field_tensors([self.tokens, self.cf_tokens])
+        self.assertEqual(sizes, [2, 2])
+        self.assertEqual(packed["tokens"]["tokens"].tolist()[2:], [[5, 5, 0, 0], [5, 5, 5, 0]])
+
+    def test_packed_forward_matches_separate_forwards(self):
+        packed = self.model(tokens=self.tokens, label=self.label, cf_tokens=self.cf_tokens)
+        factual = self.model(tokens=self.tokens, label=self.label)
+        counterfactual = self.model(tokens=self.cf_tokens, label=self.label)
+
+        torch.testing.assert_close(packed["logits"], factual["logits"])
+        torch.testing.assert_close(packed["cf_logits"], counterfactual["logits"])
+        torch.testing.assert_close(
+            packed["loss"], factual["loss"] + 0.5 * counterfactual["loss"]
+        )
+
+    def test_cached_counterfactual_logits_match_uncached(self):
+        uncached = CounterfactualWeightBasicClassifier(
+            self.model.vocab,
+            text_field_embedder=self.model._text_field_embedder,
+            seq2vec_encoder=self.model._seq2vec_encoder,
+            counterfactual_cache_size=0,
+        ).eval()
+        uncached._classification_layer = self.model._classification_layer
+        cf_tokens = _text_field([[5, 5, 0], [5, 5, 5], [5, 5, 0]])
+        tokens = _text_field([[2, 3, 4, 0], [2, 3, 4, 5], [4, 4, 0, 0]])
+
+        cached = self.model(tokens=tokens, cf_tokens=cf_tokens)
+        expected = uncached(tokens=tokens, cf_tokens=cf_tokens)
+        torch.testing.assert_close(cached["logits"], expected["logits"])
+        torch.testing.assert_close(cached["cf_logits"], expected["cf_logits"])
+        cache = self.model._counterfactual_cache
+        self.assertEqual(cache.stats()["misses"], 2)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+        again = self.model(tokens=tokens, cf_tokens=cf_tokens)
+        torch.testing.assert_close(again["cf_logits"], expected["cf_logits"])
+        self.assertEqual(cache.stats()["misses"], 2)
+        self.assertEqual(cache.stats()["hits"], 4)
+
+    def test_cache_smaller_than_the_shapes_of_a_batch(self):
+        uncached = CounterfactualWeightBasicClassifier(
+            self.model.vocab,
+            text_field_embedder=self.model._text_field_embedder,
+            seq2vec_encoder=self.model._seq2vec_encoder,
+            counterfactual_cache_size=0,
+        ).eval()
+        model = CounterfactualWeightBasicClassifier(
+            self.model.vocab,
+            text_field_embedder=self.model._text_field_embedder,
+            seq2vec_encoder=self.model._seq2vec_encoder,
+            counterfactual_cache_size=2,
+        ).eval()
+        model._classification_layer = uncached._classification_layer
+        batches = [
+            (_text_field([[2, 0], [3, 4]]), _text_field([[5, 0, 0], [5, 5, 0]])),
+            (
+                _text_field([[2, 0], [3, 4], [4, 4]]),
+                _text_field([[5, 0, 0], [5, 5, 5], [2, 5, 5]]),
+            ),
+        ]
+        for tokens, cf_tokens in batches:
+            output = model(tokens=tokens, cf_tokens=cf_tokens)
+            expected = uncached(tokens=tokens, cf_tokens=cf_tokens)
+            torch.testing.assert_close(output["cf_logits"], expected["cf_logits"])
+            self.assertLessEqual(model._counterfactual_cache.stats()["size"], 2)
+
+    def test_counterfactual_cache_is_cleared_for_training(self):
+        self.model(tokens=self.tokens, cf_tokens=self.cf_tokens)
+        self.assertEqual(self.model._counterfactual_cache.stats()["size"], 2)
+        self.model.train()
+        self.assertEqual(self.model._counterfactual_cache.stats()["size"], 0)
@@ -0,0 +1,104 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import torch
+from transformers import BertConfig, BertTokenizer
+
+from allennlp.data import Vocabulary
+from allennlp.modules.seq2vec_encoders import BertPooler
+from allennlp.modules.text_field_embedders import BasicTextFieldEmbedder
+from allennlp.modules.token_embedders import PretrainedTransformerEmbedder
+
+from my_package.models.custom_baseline import BasicClassifier
+from my_package.models.early_exit_classifier import EarlyExitClassifier
+
+
+class TestEarlyExitClassifier(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        bert_dir = self.tmp_dir.name
+        words = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [str(i) for i in range(45)]
+        vocab_file = os.path.join(bert_dir, "vocab.txt")
+        with open(vocab_file, "w") as f:
+            f.write("\n".join(words) + "\n")
+        BertTokenizer(vocab_file).save_pretrained(bert_dir)
+        BertConfig(
+            vocab_size=50,
+            hidden_size=16,
+            num_hidden_layers=4,
+            num_attention_heads=2,
+            intermediate_size=32,
+        ).save_pretrained(bert_dir)
+
+        vocab = Vocabulary()
+        vocab.add_tokens_to_namespace(["entailment", "neutral", "contradiction"], "labels")
+        self.classifier = BasicClassifier(
+            vocab,
+            text_field_embedder=BasicTextFieldEmbedder(
+                {"tokens": PretrainedTransformerEmbedder(bert_dir, load_weights=False)}
+            ),
+            seq2vec_encoder=BertPooler(bert_dir, load_weights=False),
+        )
+        self.vocab = vocab
+        token_ids = torch.randint(5, 50, (4, 8))
+        mask = torch.ones_like(token_ids, dtype=torch.bool)
+        mask[3, 5:] = False
+        token_ids[3, 5:] = 0
+        self.tokens = {"tokens": {"token_ids": token_ids, "mask": mask}}
+        self.label = torch.tensor([0, 1, 2, 1])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _model(self, **kwargs):
+        return EarlyExitClassifier(
+            self.vocab, classifier=self.classifier, exit_layers=[1, 2, 3], **kwargs
+        )
+
+    def test_no_exit_matches_the_classifier(self):
+        model = self._model(threshold=1.01).eval()
+        with torch.no_grad():
+            output = model(tokens=self.tokens, label=self.label)
+            expected = self.classifier.eval()(tokens=self.tokens)
+        torch.testing.assert_close(output["probs"], expected["probs"])
+        self.assertEqual(model.get_metrics()["average_layers"], 4.0)
+
+    def test_every_example_exits_at_the_first_exit(self):
+        model = self._model(threshold=0.0).eval()
+        with torch.no_grad():
+            output = model(tokens=self.tokens, label=self.label)
+        self.assertEqual(output["exit_layer"].tolist(), [1, 1, 1, 1])
+        metrics = model.get_metrics()
+        self.assertEqual(metrics["average_layers"], 1.0)
+        self.assertEqual(metrics["exit_1_fraction"], 1.0)
+
+    def test_metrics_weigh_batches_by_their_size(self):
+        model = self._model(threshold=0.0).eval()
+        first = {"tokens": {key: value[:3] for key, value in self.tokens["tokens"].items()}}
+        last = {"tokens": {key: value[3:] for key, value in self.tokens["tokens"].items()}}
+        with torch.no_grad():
+            model(tokens=first, label=self.label[:3])
+            model._threshold = 1.01
+            model(tokens=last, label=self.label[3:])
+        metrics = model.get_metrics()
+        self.assertEqual(metrics["average_layers"], (3 * 1 + 4) / 4)
+        self.assertEqual(metrics["exit_1_fraction"], 0.75)
+
+    def test_distillation_only_trains_the_exits(self):
+        model = self._model().train()
+        model(tokens=self.tokens, label=self.label)["loss"].backward()
+        self.assertTrue(all(p.grad is not None for p in model._exits.parameters()))
+        self.assertTrue(all(p.grad is None for p in self.classifier.parameters()))
+        self.assertFalse(self.classifier.training)
+
+    def test_threshold_sweep(self):
+        model = self._model(threshold=1.01, threshold_sweep=[0.0, 1.01]).eval()
+        with torch.no_grad():
+            model(tokens=self.tokens, label=self.label)
+        metrics = model.get_metrics()
+        self.assertEqual(metrics["threshold_0_average_layers"], 1.0)
+        self.assertEqual(metrics["threshold_1.01_average_layers"], 4.0)
+        self.assertEqual(metrics["threshold_1.01_accuracy"], metrics["full_accuracy"])
+        self.assertEqual(metrics["threshold_0_accuracy"], metrics["exit_1_accuracy"])
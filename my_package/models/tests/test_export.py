@@ -0,0 +1,100 @@
+import importlib.util
+import os
+import tempfile
+from unittest import TestCase
+
+import torch
+from transformers import BertConfig, BertTokenizer
+
+from allennlp.data import Vocabulary
+from allennlp.modules.seq2vec_encoders import BertPooler
+from allennlp.modules.text_field_embedders import BasicTextFieldEmbedder
+from allennlp.modules.token_embedders import PretrainedTransformerEmbedder
+
+from my_package.models.custom_baseline import BasicClassifier
+from my_package.models.product_of_expert_classifier import ProductofExpertBasicClassifier
+from my_package.modules.export import export_classifier
+
+RUNTIME = os.path.join(os.path.dirname(__file__), "..", "..", "..", "utils", "exported_classifier.py")
+
+
+def _load_runtime():
+    spec = importlib.util.spec_from_file_location("exported_classifier", RUNTIME)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.bert_dir = os.path.join(self.tmp_dir.name, "bert")
+        os.makedirs(self.bert_dir)
+        words = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [str(i) for i in range(45)]
+        vocab_file = os.path.join(self.bert_dir, "vocab.txt")
+        with open(vocab_file, "w") as f:
+            f.write("\n".join(words) + "\n")
+        BertTokenizer(vocab_file).save_pretrained(self.bert_dir)
+        BertConfig(
+            vocab_size=50,
+            hidden_size=16,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=32,
+        ).save_pretrained(self.bert_dir)
+        self.vocab = Vocabulary()
+        self.vocab.add_tokens_to_namespace(["entailment", "neutral", "contradiction"], "labels")
+
+        token_ids = torch.randint(5, 50, (3, 10))
+        mask = torch.ones_like(token_ids)
+        mask[2, 7:] = 0
+        token_ids[2, 7:] = 0
+        type_ids = torch.zeros_like(token_ids)
+        type_ids[:, 5:] = 1
+        type_ids[2, 7:] = 0
+        self.inputs = (token_ids, mask, type_ids)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _model(self, model_class):
+        embedder = PretrainedTransformerEmbedder(self.bert_dir, max_length=512, load_weights=False)
+        return model_class(
+            self.vocab,
+            text_field_embedder=BasicTextFieldEmbedder({"tokens": embedder}),
+            seq2vec_encoder=BertPooler(self.bert_dir, load_weights=False),
+        ).eval()
+
+    def _expected_probs(self, model):
+        token_ids, mask, type_ids = self.inputs
+        tokens = {
+            "tokens": {
+                "token_ids": token_ids,
+                "mask": mask.bool(),
+                "type_ids": type_ids,
+                "segment_concat_mask": mask.bool(),
+            }
+        }
+        with torch.no_grad():
+            return model(tokens=tokens)["probs"]
+
+    def test_traced_classifiers_match_the_original_probs(self):
+        for model_class in [BasicClassifier, ProductofExpertBasicClassifier]:
+            model = self._model(model_class)
+            export_dir = os.path.join(self.tmp_dir.name, model_class.__name__)
+            path = export_classifier(model, export_dir, runtime_config={"max_length": 512})
+
+            traced = torch.jit.load(path)
+            with torch.no_grad():
+                _, probs = traced(*self.inputs)
+            torch.testing.assert_close(probs, self._expected_probs(model))
+
+    def test_runtime_wrapper(self):
+        model = self._model(BasicClassifier)
+        export_classifier(model, self.tmp_dir.name)
+
+        classifier = _load_runtime().ExportedClassifier(self.tmp_dir.name)
+        self.assertEqual(classifier.labels, ["entailment", "neutral", "contradiction"])
+        _, probs = classifier.predict_ids(*[array.numpy() for array in self.inputs])
+        torch.testing.assert_close(torch.from_numpy(probs), self._expected_probs(model))
@@ -0,0 +1,74 @@
+from unittest import TestCase
+
+import torch
+
+from allennlp.common import Params
+from allennlp.data import Vocabulary
+from allennlp.models import Model
+
+from my_package.models.multi_head_classifier import MultiHeadClassifier
+
+
+def _config():
+    return {
+        "model": {
+            "type": "multi_head_classifier",
+            "text_field_embedder": {
+                "token_embedders": {"tokens": {"type": "embedding", "embedding_dim": 4}}
+            },
+            "seq2vec_encoder": {"type": "boe", "embedding_dim": 4, "averaged": True},
+            "heads": {
+                "baseline": {"type": "custom_basic_classifier"},
+                "poe": {"type": "product_of_expert_basic_classifier", "dropout": 0.1},
+                "weighted": {
+                    "type": "utama_weight_basic_classifier",
+                    "feedforward": {
+                        "input_dim": 4,
+                        "num_layers": 1,
+                        "hidden_dims": 4,
+                        "activations": "tanh",
+                    },
+                },
+            },
+            "loss_weights": {"poe": 2.0},
+        }
+    }
+
+
+class TestMultiHeadClassifier(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.vocab = Vocabulary()
+        self.vocab.add_tokens_to_namespace(["a", "b", "c"], "tokens")
+        self.vocab.add_tokens_to_namespace(["entailment", "neutral", "contradiction"], "labels")
+        self.model = Model.from_params(
+            vocab=self.vocab, params=Params(_config()["model"])
+        ).eval()
+        self.batch = {
+            "tokens": {"tokens": {"tokens": torch.tensor([[2, 3, 4], [2, 2, 0]])}},
+            "label": torch.tensor([0, 2]),
+            "bias_probs": torch.tensor([[0.5, 0.25, 0.25], [0.2, 0.2, 0.6]]),
+            "sample_weight": torch.tensor([1.0, 0.5]),
+        }
+
+    def test_heads_share_the_encoder_and_sum_their_losses(self):
+        output = self.model(**self.batch)
+        for head in ["baseline", "poe", "weighted"]:
+            self.assertEqual(tuple(output["%s_probs" % head].shape), (2, 3))
+        torch.testing.assert_close(
+            output["loss"],
+            output["baseline_loss"] + 2.0 * output["poe_loss"] + output["weighted_loss"],
+        )
+        metrics = self.model.get_metrics()
+        self.assertIn("baseline_accuracy", metrics)
+        self.assertIn("poe_accuracy", metrics)
+
+    def test_a_head_loads_as_a_standalone_classifier(self):
+        config = MultiHeadClassifier.head_config(_config(), "poe")
+        self.assertEqual(config["model"]["type"], "product_of_expert_basic_classifier")
+        head = Model.from_params(vocab=self.vocab, params=Params(config["model"])).eval()
+        head.load_state_dict(self.model.head_state_dict("poe"))
+
+        batch = dict(self.batch)
+        del batch["sample_weight"]
+        torch.testing.assert_close(head(**batch)["probs"], self.model(**self.batch)["poe_probs"])
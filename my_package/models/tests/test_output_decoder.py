@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+import torch
+
+from allennlp.data import Vocabulary
+
+from my_package.models.output_decoder import OutputDecoder
+
+
+class TestOutputDecoder(TestCase):
+    def setUp(self):
+        self.vocab = Vocabulary()
+        self.vocab.add_tokens_to_namespace(["a", "b"], "tokens")
+        self.vocab.add_tokens_to_namespace(["entailment", "neutral", "contradiction"], "labels")
+        self.decoder = OutputDecoder(self.vocab)
+        self.output_dict = {
+            "probs": torch.tensor([[0.1, 0.2, 0.7], [0.8, 0.1, 0.1]]),
+            "token_ids": torch.tensor([[2, 3], [3, 0]]),
+        }
+
+    def test_labels_only_by_default(self):
+        output = self.decoder.make_output_human_readable(dict(self.output_dict))
+        self.assertEqual(output["label"], ["contradiction", "entailment"])
+        self.assertNotIn("tokens", output)
+
+    def test_tokens_are_decoded_on_request(self):
+        output = self.decoder.make_output_human_readable(
+            dict(self.output_dict), decode_tokens=True
+        )
+        expected = [
+            [self.vocab.get_token_from_index(i.item()) for i in row]
+            for row in self.output_dict["token_ids"]
+        ]
+        self.assertEqual(output["tokens"], expected)
+
+    def test_single_prediction_and_unknown_label_index(self):
+        self.assertEqual(self.decoder.labels(torch.tensor([0.0, 1.0, 0.0])), ["neutral"])
+        self.assertEqual(self.decoder.labels(torch.tensor([[0.0, 0.0, 0.0, 1.0]])), ["3"])
+        self.vocab.add_token_to_namespace("non-entailment", "labels")
+        self.assertEqual(self.decoder.labels(torch.tensor([[0.0, 0.0, 0.0, 1.0]])), ["non-entailment"])
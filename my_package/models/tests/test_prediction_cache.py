@@ -0,0 +1,150 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy
+import torch
+
+from allennlp.common.checks import ConfigurationError
+from allennlp.data import Vocabulary
+from allennlp.data.data_loaders import SimpleDataLoader
+from allennlp.data.tokenizers import WhitespaceTokenizer
+from allennlp.modules.seq2vec_encoders import BagOfEmbeddingsEncoder
+from allennlp.modules.text_field_embedders import BasicTextFieldEmbedder
+from allennlp.modules.token_embedders import Embedding
+from allennlp.training.util import evaluate
+
+from my_package.data.dataset_readers.distill_reader import DistillSnliReader
+from my_package.models.custom_baseline import BasicClassifier
+from my_package.modules.prediction_cache import (
+    PredictionCache,
+    PredictionRecorder,
+    evaluation_cache_keys,
+    prediction_cache_key,
+    write_binary_predictions,
+)
+
+
+class TestPredictionCache(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "dev.jsonl")
+        labels = ["neutral", "entailment", "contradiction", "neutral", "entailment"]
+        with open(self.path, "w") as f:
+            for i, label in enumerate(labels):
+                doc = {"gold_label": label, "sentence1": "a b %d" % i, "sentence2": "c %d" % (i % 2)}
+                f.write(json.dumps(doc) + "\n")
+        reader = DistillSnliReader(tokenizer=WhitespaceTokenizer(), combine_input_fields=True)
+        self.instances = list(reader.read(self.path))
+        vocab = Vocabulary.from_instances(self.instances)
+        self.model = BasicClassifier(
+            vocab,
+            text_field_embedder=BasicTextFieldEmbedder(
+                {"tokens": Embedding(embedding_dim=8, vocab_namespace="tokens", vocab=vocab)}
+            ),
+            seq2vec_encoder=BagOfEmbeddingsEncoder(8),
+        ).eval()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key_depends_on_data_and_reader(self):
+        reader_config = {"type": "distill_snli", "combine_input_fields": True}
+        key = prediction_cache_key("model", self.path, reader_config)
+        self.assertEqual(key, prediction_cache_key("model", self.path, dict(reader_config)))
+        self.assertNotEqual(key, prediction_cache_key("other", self.path, reader_config))
+        self.assertNotEqual(
+            key, prediction_cache_key("model", self.path, dict(reader_config, collapse_labels=True))
+        )
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"gold_label": "neutral", "sentence1": "a", "sentence2": "b"}) + "\n")
+        self.assertNotEqual(key, prediction_cache_key("model", self.path, reader_config))
+
+    def test_key_depends_on_the_files_of_the_reader(self):
+        table = os.path.join(self.tmp_dir.name, "table")
+        os.makedirs(table)
+        numpy.save(os.path.join(table, "bias_probs.npy"), numpy.zeros((5, 3)))
+        reader_config = {"type": "distill_snli", "score_table": table}
+        key = prediction_cache_key("model", self.path, reader_config)
+        self.assertEqual(key, prediction_cache_key("model", self.path, reader_config))
+        numpy.save(os.path.join(table, "bias_probs.npy"), numpy.ones((5, 3)))
+        self.assertNotEqual(key, prediction_cache_key("model", self.path, reader_config))
+
+    def test_keys_of_an_extracted_archive(self):
+        archive_dir = os.path.join(self.tmp_dir.name, "model")
+        os.makedirs(archive_dir)
+        with open(os.path.join(archive_dir, "config.json"), "w") as f:
+            json.dump({"dataset_reader": {"type": "distill_snli"}}, f)
+        weights_dir = os.path.join(archive_dir, "weights")
+        os.makedirs(weights_dir)
+        torch.save({}, os.path.join(weights_dir, "best.th"))
+
+        (key,) = evaluation_cache_keys(archive_dir, [self.path], weights_file=weights_dir)
+        self.assertEqual(
+            key, evaluation_cache_keys(archive_dir, [self.path], weights_file=weights_dir)[0]
+        )
+        self.assertNotEqual(
+            key,
+            evaluation_cache_keys(
+                archive_dir, [self.path], weights_file=weights_dir, batch_weight_key="batch_size"
+            )[0],
+        )
+        torch.save({"w": torch.zeros(1)}, os.path.join(weights_dir, "best.th"))
+        self.assertNotEqual(
+            key, evaluation_cache_keys(archive_dir, [self.path], weights_file=weights_dir)[0]
+        )
+
+    def test_recorded_outputs_round_trip(self):
+        data_loader = SimpleDataLoader(self.instances, 2, vocab=self.model.vocab)
+        with PredictionRecorder(self.model) as recorder:
+            metrics = evaluate(self.model, data_loader, cuda_device=-1)
+        logits, probs, gold = recorder.arrays()
+
+        expected = self.model.forward_on_instances(self.instances)
+        numpy.testing.assert_allclose(probs, [output["probs"] for output in expected], rtol=1e-5)
+        label_vocab = self.model.vocab.get_token_to_index_vocabulary("labels")
+        self.assertEqual(gold.tolist(), [label_vocab[i["label"].label] for i in self.instances])
+
+        cache = PredictionCache(os.path.join(self.tmp_dir.name, "cache"))
+        self.assertNotIn("key", cache)
+        labels = ["entailment", "neutral", "contradiction"]
+        cache.save("key", logits, probs, gold, {"labels": labels, "batch_size": 2, "metrics": metrics})
+        self.assertIn("key", cache)
+        cached = cache.load("key")
+        numpy.testing.assert_array_equal(cached.logits, logits)
+        self.assertEqual(cached.meta["metrics"], metrics)
+
+        self.assertFalse(cache.has_predictions("key"))
+
+        # An entry saved with the predictions `evaluate` wrote replaces one without them, and
+        # serves them as they were written.
+        predictions_file = os.path.join(self.tmp_dir.name, "predictions.jsonl")
+        evaluate(self.model, data_loader, cuda_device=-1, predictions_output_file=predictions_file)
+        cache.save("key", logits, probs, gold, cached.meta, predictions_file=predictions_file)
+        self.assertTrue(cache.has_predictions("key"))
+        copied_file = os.path.join(self.tmp_dir.name, "copied.jsonl")
+        cache.copy_predictions("key", copied_file)
+        with open(predictions_file) as f, open(copied_file) as g:
+            self.assertEqual(f.read(), g.read())
+
+    def test_binary_predictions_round_trip(self):
+        logits = numpy.random.randn(3, 2)
+        probs = numpy.exp(logits) / numpy.exp(logits).sum(axis=-1, keepdims=True)
+        path = os.path.join(self.tmp_dir.name, "predictions.npz")
+        write_binary_predictions(path, logits, probs, ["a", "b", "c"], ["x", "y"], id_key="pairID")
+        with numpy.load(path) as predictions:
+            self.assertEqual(predictions["probs"].dtype, numpy.float32)
+            numpy.testing.assert_allclose(predictions["logits"], logits, rtol=1e-6)
+            self.assertEqual(predictions["id"].tolist(), ["a", "b", "c"])
+            self.assertEqual(predictions["labels"].tolist(), ["x", "y"])
+            self.assertEqual(str(predictions["id_key"]), "pairID")
+
+        write_binary_predictions(path, logits, probs, [0, 2, 5], ["x", "y"], gold=[1, -1, 0])
+        with numpy.load(path) as predictions:
+            self.assertEqual(predictions["id"].tolist(), [0, 2, 5])
+            self.assertEqual(str(predictions["id_key"]), "")
+            self.assertEqual(predictions["gold"].tolist(), [1, -1, 0])
+        with self.assertRaises(ConfigurationError):
+            write_binary_predictions(path, logits, probs, [0, 1], ["x", "y"])
@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+import torch
+
+from allennlp.data import Vocabulary
+from allennlp.modules import FeedForward
+from allennlp.modules.seq2seq_encoders import FeedForwardEncoder
+from allennlp.modules.seq2vec_encoders import BagOfEmbeddingsEncoder
+from allennlp.modules.text_field_embedders import BasicTextFieldEmbedder
+from allennlp.modules.token_embedders import Embedding
+
+from my_package.models.custom_baseline import BasicClassifier
+from my_package.modules.quantization import quantize_dynamic_int8
+
+
+class TestQuantization(TestCase):
+    def test_encoder_linear_layers_are_quantized(self):
+        torch.manual_seed(0)
+        vocab = Vocabulary()
+        vocab.add_tokens_to_namespace(["a", "b", "c"], "tokens")
+        vocab.add_tokens_to_namespace(["entailment", "neutral", "contradiction"], "labels")
+        model = BasicClassifier(
+            vocab,
+            text_field_embedder=BasicTextFieldEmbedder(
+                {"tokens": Embedding(embedding_dim=16, num_embeddings=vocab.get_vocab_size())}
+            ),
+            seq2seq_encoder=FeedForwardEncoder(FeedForward(16, 2, 16, torch.nn.Tanh())),
+            seq2vec_encoder=BagOfEmbeddingsEncoder(16, averaged=True),
+        ).eval()
+        tokens = {"tokens": {"tokens": torch.tensor([[2, 3, 4], [3, 4, 0]])}}
+
+        quantized = quantize_dynamic_int8(model)
+
+        self.assertIsInstance(
+            quantized._seq2seq_encoder._feedforward._linear_layers[0],
+            torch.nn.quantized.dynamic.Linear,
+        )
+        self.assertIsInstance(quantized._classification_layer, torch.nn.Linear)
+        self.assertIsInstance(model._seq2seq_encoder._feedforward._linear_layers[0], torch.nn.Linear)
+        torch.testing.assert_close(
+            quantized(tokens)["probs"], model(tokens)["probs"], atol=0.05, rtol=0.0
+        )
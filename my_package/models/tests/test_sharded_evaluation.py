@@ -0,0 +1,144 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy
+import torch
+from transformers import BertConfig, BertTokenizer
+
+from allennlp.common.checks import ConfigurationError
+from allennlp.data import Vocabulary
+from allennlp.data.data_loaders import SimpleDataLoader
+from allennlp.data.tokenizers import WhitespaceTokenizer
+from allennlp.modules.seq2vec_encoders import BagOfEmbeddingsEncoder, BertPooler
+from allennlp.modules.text_field_embedders import BasicTextFieldEmbedder
+from allennlp.modules.token_embedders import Embedding, PretrainedTransformerEmbedder
+from allennlp.training.metrics import Auc
+from allennlp.training.util import evaluate
+
+from my_package.data.dataset_readers.distill_reader import DistillSnliReader
+from my_package.models.custom_baseline import BasicClassifier
+from my_package.models.early_exit_classifier import EarlyExitClassifier
+from my_package.modules.sharded_evaluation import (
+    evaluate_shard,
+    merge_metric_states,
+    merge_shards,
+    metric_states,
+    shard_bounds,
+)
+
+
+class TestShardedEvaluation(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp_dir.name, "dev.jsonl")
+        labels = ["neutral", "entailment", "contradiction"]
+        with open(path, "w") as f:
+            for i in range(11):
+                doc = {"gold_label": labels[i % 3], "sentence1": "a b %d" % i, "sentence2": "c %d" % (i % 4)}
+                f.write(json.dumps(doc) + "\n")
+        reader = DistillSnliReader(tokenizer=WhitespaceTokenizer(), combine_input_fields=True)
+        self.instances = list(reader.read(path))
+        vocab = Vocabulary.from_instances(self.instances)
+        self.model = BasicClassifier(
+            vocab,
+            text_field_embedder=BasicTextFieldEmbedder(
+                {"tokens": Embedding(embedding_dim=8, vocab_namespace="tokens", vocab=vocab)}
+            ),
+            seq2vec_encoder=BagOfEmbeddingsEncoder(8),
+        ).eval()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_shards_hold_whole_batches(self):
+        self.assertEqual(shard_bounds(11, 2, 3), [(0, 4), (4, 8), (8, 11)])
+        self.assertEqual(shard_bounds(3, 4, 3), [(0, 3)])
+        self.assertEqual(shard_bounds(0, 4, 3), [])
+
+    def test_merged_shards_match_a_single_evaluation(self):
+        predictions_file = os.path.join(self.tmp_dir.name, "predictions.jsonl")
+        expected = evaluate(
+            self.model,
+            SimpleDataLoader(self.instances, 2, vocab=self.model.vocab),
+            predictions_output_file=predictions_file,
+        )
+        shards = [
+            evaluate_shard(self.model, self.instances[start:end], 2, human_readable=True)
+            for start, end in shard_bounds(len(self.instances), 2, 3)
+        ]
+        merged = merge_shards(self.model, shards)
+
+        self.assertEqual(merged.metrics.keys(), expected.keys())
+        for name, value in expected.items():
+            self.assertAlmostEqual(merged.metrics[name], value, places=6)
+        with open(predictions_file) as f:
+            self.assertEqual(merged.predictions, f.read().splitlines())
+        outputs = self.model.forward_on_instances(self.instances)
+        numpy.testing.assert_allclose(
+            merged.probs, [output["probs"] for output in outputs], rtol=1e-5
+        )
+        self.assertEqual(len(merged.gold), len(self.instances))
+
+    def test_unmergeable_metrics_raise(self):
+        self.model._extra_metrics = {"auc": Auc()}
+        with self.assertRaises(ConfigurationError):
+            metric_states(self.model)
+
+    def test_metrics_in_containers_are_merged(self):
+        bert_dir = self.tmp_dir.name
+        words = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [str(i) for i in range(45)]
+        vocab_file = os.path.join(bert_dir, "vocab.txt")
+        with open(vocab_file, "w") as f:
+            f.write("\n".join(words) + "\n")
+        BertTokenizer(vocab_file).save_pretrained(bert_dir)
+        BertConfig(
+            vocab_size=50,
+            hidden_size=16,
+            num_hidden_layers=4,
+            num_attention_heads=2,
+            intermediate_size=32,
+        ).save_pretrained(bert_dir)
+        vocab = Vocabulary()
+        vocab.add_tokens_to_namespace(["entailment", "neutral", "contradiction"], "labels")
+        classifier = BasicClassifier(
+            vocab,
+            text_field_embedder=BasicTextFieldEmbedder(
+                {"tokens": PretrainedTransformerEmbedder(bert_dir, load_weights=False)}
+            ),
+            seq2vec_encoder=BertPooler(bert_dir, load_weights=False),
+        )
+        model = EarlyExitClassifier(
+            vocab,
+            classifier=classifier,
+            exit_layers=[1, 2, 3],
+            threshold=0.0,
+            threshold_sweep=[0.0, 0.5, 1.01],
+        ).eval()
+        token_ids = torch.randint(5, 50, (5, 8))
+        label = torch.tensor([0, 1, 2, 1, 0])
+
+        def run(rows):
+            tokens = {"tokens": {"token_ids": token_ids[rows], "mask": token_ids[rows] > 0}}
+            with torch.no_grad():
+                model(tokens=tokens, label=label[rows])
+
+        run(slice(0, 5))
+        expected = model.get_metrics(reset=True)
+        states = []
+        for rows in [slice(0, 3), slice(3, 5)]:
+            run(rows)
+            states.append(metric_states(model))
+            model.get_metrics(reset=True)
+        self.assertIn("_exit_fractions[1]", states[0])
+        self.assertIn("_sweep_layers[0.5]", states[0])
+
+        merge_metric_states(model, states[:1])
+        self.assertEqual(model.get_metrics(reset=True)["exit_1_fraction"], 1.0)
+        merge_metric_states(model, states)
+        merged = model.get_metrics(reset=True)
+        self.assertEqual(merged.keys(), expected.keys())
+        for name, value in expected.items():
+            self.assertAlmostEqual(merged[name], value, places=6)
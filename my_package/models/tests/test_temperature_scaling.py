@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, mock
+
+import torch
+
+from allennlp.common import Params
+from allennlp.data import DatasetReader, Vocabulary
+from allennlp.models import Model
+from allennlp.models.archival import archive_model
+
+from my_package.data.dataset_readers.distill_reader import DistillSnliReader  # noqa: F401
+from my_package.models.custom_baseline import BasicClassifier  # noqa: F401
+from my_package.modules.prediction_cache import (
+    PredictionCache,
+    evaluation_cache_keys,
+    write_binary_predictions,
+)
+from my_package.modules.temperature_scaling import fit_temperature, fit_temperatures
+
+
+class TestTemperatureScaling(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        logits = torch.randn(400, 3) * 2
+        self.gold = torch.multinomial(torch.softmax(logits, dim=-1), 1).view(-1)
+        self.logits = logits * 3
+        # Examples without a gold label, with logits that would change the fit.
+        self.gold[::10] = -1
+        self.logits[::10] = torch.tensor([100.0, -100.0, 0.0])
+        labelled = self.gold >= 0
+        self.expected = fit_temperature(self.logits[labelled], self.gold[labelled], max_iter=500)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_fit_recovers_the_temperature_on_cpu(self):
+        torch.manual_seed(0)
+        logits = torch.randn(4000, 3) * 2
+        labels = torch.multinomial(torch.softmax(logits, dim=-1), 1).view(-1)
+        fit = fit_temperature(logits * 3, labels, max_iter=500)
+        self.assertAlmostEqual(fit.temperature, 3.0, delta=0.3)
+        self.assertLess(fit.nll_after, fit.nll_before)
+        self.assertLess(fit.ece_after, fit.ece_before)
+
+    def test_npz_source(self):
+        path = os.path.join(self.tmp_dir.name, "dev.npz")
+        probs = torch.softmax(self.logits, dim=-1).numpy()
+        write_binary_predictions(
+            path, self.logits.numpy(), probs, list(range(400)), ["a", "b", "c"], gold=self.gold
+        )
+        report = fit_temperatures([path])
+        self.assertEqual(report[path]["num_examples"], 360)
+        self.assertAlmostEqual(report[path]["temperature"], self.expected.temperature, places=5)
+
+    def test_cache_entry_source(self):
+        cache = PredictionCache(os.path.join(self.tmp_dir.name, "cache"))
+        probs = torch.softmax(self.logits, dim=-1).numpy()
+        cache.save("entry", self.logits.numpy(), probs, self.gold.numpy(), meta={})
+        report = fit_temperatures([cache.path("entry")])
+        self.assertEqual(report[cache.path("entry")]["num_examples"], 360)
+        self.assertAlmostEqual(
+            report[cache.path("entry")]["temperature"], self.expected.temperature, places=5
+        )
+
+    def test_archive_source_is_cached(self):
+        data_path = os.path.join(self.tmp_dir.name, "dev.jsonl")
+        labels = ["neutral", "entailment", "contradiction"]
+        with open(data_path, "w") as f:
+            for i in range(13):
+                doc = {"gold_label": labels[i % 3], "sentence1": "a b %d" % i, "sentence2": "c %d" % (i % 4)}
+                f.write(json.dumps(doc) + "\n")
+        config = {
+            "dataset_reader": {
+                "type": "distill_snli",
+                "tokenizer": {"type": "whitespace"},
+                "combine_input_fields": True,
+            },
+            "train_data_path": data_path,
+            "model": {
+                "type": "custom_basic_classifier",
+                "text_field_embedder": {
+                    "token_embedders": {"tokens": {"type": "embedding", "embedding_dim": 8}}
+                },
+                "seq2vec_encoder": {"type": "boe", "embedding_dim": 8},
+            },
+            "data_loader": {"batch_size": 4},
+            "trainer": {"num_epochs": 1, "optimizer": "adam"},
+        }
+        reader = DatasetReader.from_params(Params(json.loads(json.dumps(config["dataset_reader"]))))
+        vocab = Vocabulary.from_instances(reader.read(data_path))
+        model = Model.from_params(vocab=vocab, params=Params(json.loads(json.dumps(config["model"]))))
+        serialization_dir = os.path.join(self.tmp_dir.name, "model")
+        os.makedirs(serialization_dir)
+        with open(os.path.join(serialization_dir, "config.json"), "w") as f:
+            json.dump(config, f)
+        vocab.save_to_files(os.path.join(serialization_dir, "vocabulary"))
+        torch.save(model.state_dict(), os.path.join(serialization_dir, "best.th"))
+        archive_model(serialization_dir)
+        archive_file = os.path.join(serialization_dir, "model.tar.gz")
+
+        cache = PredictionCache(os.path.join(self.tmp_dir.name, "cache"))
+        report = fit_temperatures([archive_file], input_file=data_path, cache=cache)
+        self.assertEqual(report[archive_file]["num_examples"], 13)
+        (key,) = evaluation_cache_keys(archive_file, [data_path])
+        self.assertIn(key, cache)
+        self.assertIn("accuracy", cache.load(key).meta["metrics"])
+
+        # The second fit reads the cache instead of the model.
+        with mock.patch(
+            "my_package.modules.temperature_scaling.load_archive", side_effect=AssertionError
+        ):
+            cached_report = fit_temperatures([archive_file], input_file=data_path, cache=cache)
+        self.assertEqual(cached_report, report)
+        self.assertEqual(fit_temperatures([cache.path(key)])[cache.path(key)], report[archive_file])
@@ -1 +1,3 @@
 from my_package.modules import temperature_scaling
+from my_package.modules import pooled_embedding_cache
+from my_package.modules import quantization
@@ -0,0 +1,178 @@
+"""
+Batched inference of an archived classifier over the examples of a data file, without the
+`Predictor` round trip through JSON: the probabilities of all the examples are returned as one
+array, next to their ids and gold labels. Used to generate teacher probabilities for
+distillation and to compare the robustness and the latency of models.
+"""
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy
+import torch
+
+from allennlp.common.checks import ConfigurationError
+from allennlp.common.file_utils import cached_path
+from allennlp.data import Batch, Instance
+from allennlp.models import Model
+from allennlp.nn import util
+
+from my_package.data.dataset_readers.sentence_pair_reader import SentencePairReader
+from my_package.data.score_tables import join_scores
+from my_package.utils.compressed_io import open_text
+
+# Gold label of the binary NLI challenge sets (HANS), against which the neutral and
+# contradiction predictions of a three-way model are collapsed.
+COLLAPSED_LABEL = "non-entailment"
+
+
+class BulkPredictions(NamedTuple):
+    probs: numpy.ndarray
+    ids: List[Optional[str]]
+    gold_labels: List[Optional[str]]
+    batch_seconds: List[float]
+
+
+def _check_reader(reader: SentencePairReader) -> None:
+    if not isinstance(reader, SentencePairReader):
+        raise ConfigurationError(
+            "Bulk inference needs one of the sentence pair readers of my_package, got %s"
+            % type(reader).__name__
+        )
+
+
+def read_unlabeled_instances(
+    reader: SentencePairReader, file_path: str, id_key: Optional[str] = None
+) -> Iterable[Dict[str, Any]]:
+    """
+    Yields `{"id", "label", "instance"}` for every example the reader keeps from `file_path`,
+    the instance holding the text fields only. The raw gold label is kept as is, so that
+    evaluation sets with other labels than the training data (e.g. HANS) can be read.
+    """
+    _check_reader(reader)
+    for example in reader._read_examples(file_path):
+        premise, hypothesis, label = reader._example_to_texts(example)
+        instance = reader.text_to_instance(premise, hypothesis)
+        reader.apply_token_indexers(instance)
+        yield {
+            "id": str(example[id_key]) if id_key is not None else None,
+            "label": label,
+            "instance": instance,
+        }
+
+
+def example_ids(
+    reader: SentencePairReader, file_path: str, id_key: Optional[str] = None
+) -> Union[List[str], List[int]]:
+    """
+    The id of every instance `reader.read(file_path)` yields, in order: the `id_key` field of
+    its example, or the line number of the example in the file when `id_key` is None.
+    """
+    _check_reader(reader)
+    with open_text(cached_path(file_path)) as data_file:
+        examples = join_scores((reader._parse_line(line) for line in data_file), reader._score_table)
+        ids = [
+            str(example[id_key]) if id_key is not None else position
+            for position, example in enumerate(examples)
+            if reader._keep_example(example)
+        ]
+    return ids[: reader.max_instances]
+
+
+def predict_probs(
+    model: Model,
+    instances: Iterable[Instance],
+    batch_size: int = 64,
+    cuda_device: int = -1,
+    batch_seconds: Optional[List[float]] = None,
+) -> numpy.ndarray:
+    """
+    Returns the `(num_instances, num_labels)` probabilities of `model` (in eval mode) over
+    `instances`. The wall time of every batch, from tensorization to the probabilities on the
+    host, is appended to `batch_seconds` when given.
+    """
+    model.eval()
+    instances = iter(instances)
+    probs: List[numpy.ndarray] = []
+    with torch.no_grad():
+        while True:
+            batch_instances = list(islice(instances, batch_size))
+            if not batch_instances:
+                break
+            start = time.perf_counter()
+            batch = Batch(batch_instances)
+            batch.index_instances(model.vocab)
+            tensors = util.move_to_device(batch.as_tensor_dict(), cuda_device)
+            probs.append(model(**tensors)["probs"].cpu().numpy())
+            if batch_seconds is not None:
+                batch_seconds.append(time.perf_counter() - start)
+    if not probs:
+        num_labels = model.vocab.get_vocab_size(getattr(model, "_label_namespace", "labels"))
+        return numpy.zeros((0, num_labels), dtype=numpy.float32)
+    return numpy.concatenate(probs).astype(numpy.float32)
+
+
+def bulk_predict(
+    model: Model,
+    reader: SentencePairReader,
+    file_path: str,
+    id_key: Optional[str] = None,
+    batch_size: int = 64,
+    cuda_device: int = -1,
+    max_instances: Optional[int] = None,
+) -> BulkPredictions:
+    """
+    Predicts the probabilities of every example of `file_path`, in file order.
+    """
+    examples = list(islice(read_unlabeled_instances(reader, file_path, id_key), max_instances))
+    batch_seconds: List[float] = []
+    probs = predict_probs(
+        model,
+        (example["instance"] for example in examples),
+        batch_size=batch_size,
+        cuda_device=cuda_device,
+        batch_seconds=batch_seconds,
+    )
+    return BulkPredictions(
+        probs=probs,
+        ids=[example["id"] for example in examples],
+        gold_labels=[example["label"] for example in examples],
+        batch_seconds=batch_seconds,
+    )
+
+
+def predicted_and_gold_labels(
+    scores: numpy.ndarray,
+    labels: List[str],
+    gold_labels: List[Optional[str]],
+    reader: SentencePairReader,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    The labels of the highest `scores` next to the normalized raw gold labels. The predicted
+    labels are collapsed to entailment / non-entailment when the set is labelled that way.
+    """
+    gold = numpy.array(
+        [
+            label if label == COLLAPSED_LABEL else reader._normalize_label(label)
+            for label in gold_labels
+        ],
+        dtype=object,
+    )
+    predicted = numpy.array(labels, dtype=object)[numpy.asarray(scores).argmax(axis=-1)]
+    if COLLAPSED_LABEL in gold:
+        predicted = numpy.where(predicted == "entailment", "entailment", COLLAPSED_LABEL)
+    return predicted, gold
+
+
+def challenge_accuracy(
+    predictions: BulkPredictions, labels: List[str], reader: SentencePairReader
+) -> float:
+    """
+    Accuracy of `predictions` against the raw gold labels, see `predicted_and_gold_labels`.
+    """
+    if not predictions.gold_labels:
+        return 0.0
+    predicted, gold = predicted_and_gold_labels(
+        predictions.probs, labels, predictions.gold_labels, reader
+    )
+    return float((predicted == gold).mean())
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from typing import AbstractSet, Dict, Hashable, List, Union
+
+import torch
+
+from allennlp.data import TextFieldTensors
+from allennlp.nn import util
+
+
+def counterfactual_keys(cf_tokens: TextFieldTensors) -> List[Hashable]:
+    """
+    One key per row of a counterfactual input: its unpadded token ids and type ids. With the
+    "full_mask" strategy every content token is `[MASK]`, so the key only depends on the
+    premise and hypothesis lengths `(len_p, len_h)`.
+    """
+    mask = util.get_text_field_mask(cf_tokens).cpu()
+    tensors = next(iter(cf_tokens.values()))
+    token_ids = util.get_token_ids_from_text_field_tensors(cf_tokens).cpu()
+    type_ids = tensors.get("type_ids")
+    type_ids = type_ids.cpu() if type_ids is not None else None
+    keys: List[Hashable] = []
+    for row in range(token_ids.size(0)):
+        row_mask = mask[row]
+        row_type_ids = type_ids[row][row_mask].numpy().tobytes() if type_ids is not None else None
+        keys.append((token_ids[row][row_mask].numpy().tobytes(), row_type_ids))
+    return keys
+
+
+class CounterfactualLogitsCache:
+    """
+    An LRU cache of the logits of counterfactual inputs, used at inference time only. All-mask
+    counterfactuals only differ by their length pair, so an evaluation set needs one forward
+    pass per distinct `(len_p, len_h)` instead of one per example.
+
+    # Parameters
+
+    max_size : `int`
+        Maximum number of cached inputs.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._logits: "OrderedDict[Hashable, torch.Tensor]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._logits
+
+    def get(self, key: Hashable) -> torch.Tensor:
+        self._logits.move_to_end(key)
+        self.hits += 1
+        return self._logits[key]
+
+    def put(
+        self, key: Hashable, logits: torch.Tensor, pinned: AbstractSet[Hashable] = frozenset()
+    ) -> None:
+        """
+        Caches `logits` under `key`, evicting the least recently used key that is not in
+        `pinned` (the keys the current batch still reads). When every cached key is pinned the
+        new key is not kept.
+        """
+        self.misses += 1
+        self._logits[key] = logits.detach()
+        if len(self._logits) > self._max_size:
+            evicted = next((k for k in self._logits if k not in pinned), key)
+            del self._logits[evicted]
+
+    def clear(self) -> None:
+        self._logits.clear()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._logits),
+        }
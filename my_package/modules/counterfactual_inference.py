@@ -0,0 +1,108 @@
+"""
+Counterfactual inference debiasing of a classifier with a bias model, as in
+`counterfactual/cma_clean.py`, on in-memory probabilities instead of prediction files. With
+the probabilities `p` of the model and `b` of the bias model on an example, and the sum fusion
+`fuse(x, y) = log(sigmoid(x + y))`:
+
+* factual: `p`,
+* TIE (total indirect effect): `fuse(p, b) - fuse(c, b)`,
+* TE_model: `p - c_te * b`,
+
+where the constants `c` and `c_te` are fitted on a development set as by
+`counterfactual/kl_general.sharpness_correction`: `c` minimizes `KL(b || softmax(fuse(c,
+fuse(p, b))))` (its `DEFAULT_CONFIG`), and `c_te` minimizes `KL(b || softmax(mult_fuse(c_te,
+p)))` with the multiplicative fusion `mult_fuse(x, y) = softmax(x * y)` (its `TE_CONFIG`).
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy
+import torch
+from scipy.special import expit
+from sklearn.metrics import f1_score
+
+from my_package.data.dataset_readers.sentence_pair_reader import SentencePairReader
+from my_package.modules.bulk_inference import predicted_and_gold_labels
+
+
+def sum_fuse(a, b):
+    return numpy.log(expit(a + b))
+
+
+def torch_sum_fuse(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    return torch.log(torch.sigmoid(a + b))
+
+
+def torch_mult_fuse(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    return torch.softmax(a * b, dim=1)
+
+
+def fit_correction(
+    bias_probs: numpy.ndarray,
+    model_scores: numpy.ndarray,
+    fuse: Callable[[torch.Tensor, torch.Tensor], torch.Tensor] = torch_sum_fuse,
+    epochs: int = 16,
+    batch_size: int = 64,
+    learning_rate: float = 1e-4,
+    seed: int = 42,
+) -> numpy.ndarray:
+    """
+    Fits the scalar `c` minimizing `KL(bias_probs || softmax(fuse(c, model_scores)))` with
+    Adam over shuffled minibatches, and returns it repeated for every label. `fuse` is
+    `torch_sum_fuse` for the TIE constant and `torch_mult_fuse` for the TE_model one.
+    """
+    num_labels = bias_probs.shape[-1]
+    targets = torch.as_tensor(numpy.asarray(bias_probs, dtype=numpy.float64))
+    inputs = torch.as_tensor(numpy.asarray(model_scores, dtype=numpy.float64))
+    c = torch.nn.Parameter(torch.tensor(1.0 / num_labels))
+    optimizer = torch.optim.Adam([c], lr=learning_rate)
+    generator = torch.Generator().manual_seed(seed)
+    for _ in range(epochs):
+        for batch in torch.randperm(len(targets), generator=generator).split(batch_size):
+            optimizer.zero_grad()
+            probs = torch.softmax(fuse(c * torch.ones(num_labels), inputs[batch]), dim=1)
+            loss = torch.mean(targets[batch] * torch.log(targets[batch] / probs), dim=1).mean()
+            loss.backward()
+            optimizer.step()
+    return c.detach().numpy() * numpy.ones(num_labels)
+
+
+def fit_corrections(
+    probs: numpy.ndarray, bias_probs: numpy.ndarray, **kwargs
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    The `(c, c_te)` of the TIE and the TE_model scores, fitted on development predictions.
+    """
+    c = fit_correction(bias_probs, sum_fuse(probs, bias_probs), **kwargs)
+    c_te = fit_correction(bias_probs, probs, fuse=torch_mult_fuse, **kwargs)
+    return c, c_te
+
+
+def counterfactual_scores(
+    probs: numpy.ndarray, bias_probs: numpy.ndarray, c: numpy.ndarray, c_te: numpy.ndarray
+) -> Dict[str, numpy.ndarray]:
+    """
+    The factual, TIE and TE_model scores of every example, the predicted label being the
+    highest score.
+    """
+    return {
+        "factual": probs,
+        "tie": sum_fuse(probs, bias_probs) - sum_fuse(c, bias_probs),
+        "te_model": probs - c_te * bias_probs,
+    }
+
+
+def score_metrics(
+    scores: numpy.ndarray,
+    labels: List[str],
+    gold_labels: List[Optional[str]],
+    reader: SentencePairReader,
+) -> Dict[str, float]:
+    """
+    Accuracy and macro F1 (over the gold labels of the set) of the highest `scores`.
+    """
+    predicted, gold = predicted_and_gold_labels(scores, labels, gold_labels, reader)
+    gold_set = sorted(set(gold))
+    return {
+        "accuracy": float((predicted == gold).mean()),
+        "macro_f1": float(f1_score(gold, predicted, labels=gold_set, average="macro")),
+    }
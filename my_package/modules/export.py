@@ -0,0 +1,120 @@
+"""
+Export of the trained classifiers to a TorchScript or ONNX graph whose inputs are plain
+`token_ids`, `mask` and `type_ids` tensors and whose outputs are the `logits` and `probs` of
+the classification head, so that they can be served without the `Instance`, `Vocabulary`
+and `Model` machinery (see `utils/exported_classifier.py` for the runtime side).
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+from allennlp.common.checks import ConfigurationError
+from allennlp.models import Model
+from allennlp.modules.token_embedders import PretrainedTransformerEmbedder
+
+logger = logging.getLogger(__name__)
+
+INPUT_NAMES = ["token_ids", "mask", "type_ids"]
+OUTPUT_NAMES = ["logits", "probs"]
+RUNTIME_CONFIG = "runtime.json"
+EXPORT_FORMATS = {"torchscript": "model.pt", "onnx": "model.onnx"}
+
+
+class TensorInputClassifier(torch.nn.Module):
+    """
+    Wraps a classifier so that it takes `(token_ids, mask, type_ids)` tensors of shape
+    `(batch_size, num_tokens)` and returns its `(logits, probs)`, rebuilding the
+    `TextFieldTensors` its text field embedder expects.
+    """
+
+    def __init__(self, model: Model) -> None:
+        super().__init__()
+        self.model = model
+        token_embedders = model._text_field_embedder._token_embedders
+        if len(token_embedders) != 1:
+            raise ConfigurationError("Only classifiers with a single token embedder can be exported")
+        self._indexer_name, token_embedder = next(iter(token_embedders.items()))
+        self._is_transformer = isinstance(token_embedder, PretrainedTransformerEmbedder)
+        self._folds = self._is_transformer and token_embedder._max_length is not None
+
+    def forward(  # type: ignore
+        self, token_ids: torch.Tensor, mask: torch.Tensor, type_ids: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        if self._is_transformer:
+            tensors = {"token_ids": token_ids, "mask": mask.bool(), "type_ids": type_ids}
+            if self._folds:
+                tensors["segment_concat_mask"] = mask.bool()
+        else:
+            tensors = {"tokens": token_ids}
+        output_dict = self.model(tokens={self._indexer_name: tensors})
+        return output_dict["logits"], output_dict["probs"]
+
+
+def example_inputs(batch_size: int = 2, num_tokens: int = 16) -> Tuple[torch.Tensor, ...]:
+    # Both segments are present, so the type ids are not dropped while tracing.
+    token_ids = torch.full((batch_size, num_tokens), 1, dtype=torch.long)
+    mask = torch.ones((batch_size, num_tokens), dtype=torch.long)
+    type_ids = torch.zeros((batch_size, num_tokens), dtype=torch.long)
+    type_ids[:, num_tokens // 2 :] = 1
+    return token_ids, mask, type_ids
+
+
+def export_classifier(
+    model: Model,
+    output_dir: str,
+    export_format: str = "torchscript",
+    runtime_config: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Traces `model` (on CPU, in eval mode) to `output_dir` and writes the `runtime.json` the
+    runtime wrapper needs: the file and the format of the graph, the input and output names
+    and the label of every output index, updated with `runtime_config`.
+
+    Sequences are limited to the transformer's `max_length`: the folding of longer sequences
+    is not part of the graph.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ConfigurationError(
+            "Unknown export format %s, expected one of %s" % (export_format, list(EXPORT_FORMATS))
+        )
+    os.makedirs(output_dir, exist_ok=True)
+    wrapper = TensorInputClassifier(model.cpu().eval()).eval()
+    inputs = example_inputs()
+    model_file = EXPORT_FORMATS[export_format]
+    path = os.path.join(output_dir, model_file)
+
+    with torch.no_grad():
+        if export_format == "torchscript":
+            traced = torch.jit.trace(wrapper, inputs, check_trace=False)
+            torch.jit.save(traced, path)
+        else:
+            dynamic_axes = {name: {0: "batch_size", 1: "num_tokens"} for name in INPUT_NAMES}
+            dynamic_axes.update({name: {0: "batch_size"} for name in OUTPUT_NAMES})
+            torch.onnx.export(
+                wrapper,
+                inputs,
+                path,
+                input_names=INPUT_NAMES,
+                output_names=OUTPUT_NAMES,
+                dynamic_axes=dynamic_axes,
+                opset_version=12,
+            )
+
+    label_namespace = getattr(model, "_label_namespace", "labels")
+    index_to_label = model.vocab.get_index_to_token_vocabulary(label_namespace)
+    labels: List[str] = [index_to_label[index] for index in range(len(index_to_label))]
+    config = {
+        "format": export_format,
+        "model_file": model_file,
+        "input_names": INPUT_NAMES,
+        "output_names": OUTPUT_NAMES,
+        "labels": labels,
+    }
+    config.update(runtime_config or {})
+    with open(os.path.join(output_dir, RUNTIME_CONFIG), "w") as config_file:
+        json.dump(config, config_file, indent=2)
+    logger.info("Exported %s to %s", type(model).__name__, path)
+    return path
@@ -0,0 +1,37 @@
+"""
+Activation (gradient) checkpointing of the transformers inside a model. The
+`gradient_checkpointing` argument of AllenNLP's `PretrainedTransformerEmbedder` only updates
+the config of an already built HuggingFace model, which the recent versions of transformers
+no longer read, so the checkpointing is switched on the models themselves here.
+"""
+import logging
+
+import torch
+
+from allennlp.modules.token_embedders import PretrainedTransformerEmbedder
+
+logger = logging.getLogger(__name__)
+
+
+def enable_gradient_checkpointing(model: torch.nn.Module, enable: bool = True) -> int:
+    """
+    Turns activation checkpointing on (or off) in the transformer of every
+    `PretrainedTransformerEmbedder` of `model`: the activations of the transformer layers are
+    recomputed in the backward pass instead of being kept, which trades about a third more
+    compute for the activation memory of the whole stack. Returns the number of transformers
+    switched.
+    """
+    num_switched = 0
+    for module in model.modules():
+        if not isinstance(module, PretrainedTransformerEmbedder):
+            continue
+        transformer = module.transformer_model
+        if not getattr(transformer, "supports_gradient_checkpointing", False):
+            logger.warning("%s does not support gradient checkpointing", type(transformer).__name__)
+            continue
+        if enable:
+            transformer.gradient_checkpointing_enable()
+        else:
+            transformer.gradient_checkpointing_disable()
+        num_switched += 1
+    return num_switched
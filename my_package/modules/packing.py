@@ -0,0 +1,55 @@
+from typing import List, Tuple
+
+import torch
+
+from allennlp.data import TextFieldTensors
+
+
+def _cat_padded(tensors: List[torch.Tensor]) -> torch.Tensor:
+    # Pads the sequence dimension (dim 1) with zeros / False before concatenating the batches.
+    if tensors[0].dim() < 2:
+        return torch.cat(tensors)
+    length = max(tensor.size(1) for tensor in tensors)
+    padded = []
+    for tensor in tensors:
+        if tensor.size(1) < length:
+            padding = tensor.new_zeros(
+                (tensor.size(0), length - tensor.size(1)) + tuple(tensor.shape[2:])
+            )
+            tensor = torch.cat([tensor, padding], dim=1)
+        padded.append(tensor)
+    return torch.cat(padded)
+
+
+def pack_text_field_tensors(
+    text_fields: List[TextFieldTensors],
+) -> Tuple[TextFieldTensors, List[int]]:
+    """
+    Concatenates the batches of several text fields indexed the same way (e.g. `tokens` and
+    `cf_tokens`) into one batch, so that they go through the embedder in a single call.
+
+    # Returns
+
+    The packed `TextFieldTensors` and the batch size of every input, to `torch.split` the
+    outputs with.
+    """
+    packed: TextFieldTensors = {}
+    for indexer_name, tensors in text_fields[0].items():
+        packed[indexer_name] = {
+            key: _cat_padded([text_field[indexer_name][key] for text_field in text_fields])
+            for key in tensors
+        }
+    sizes = [
+        next(iter(next(iter(text_field.values())).values())).size(0) for text_field in text_fields
+    ]
+    return packed, sizes
+
+
+def select_text_field_rows(text_field: TextFieldTensors, rows: torch.Tensor) -> TextFieldTensors:
+    """
+    Returns the rows `rows` of every tensor of a text field.
+    """
+    return {
+        indexer_name: {key: tensor.index_select(0, rows) for key, tensor in tensors.items()}
+        for indexer_name, tensors in text_field.items()
+    }
@@ -0,0 +1,133 @@
+"""
+A memory-mapped cache of the pooled encoder outputs of a dataset. The classifiers in
+`my_package.models` only differ in their loss on top of the same
+`text_field_embedder` / `seq2vec_encoder` / `feedforward` stack, so once a frozen encoder has
+been run over a dataset, any of their heads can be trained and evaluated from the cache with
+the `"pooled_embedding_cache"` dataset reader and the `"pooled_embedding"` token embedder.
+
+A cache is a directory holding:
+
+* `embeddings.f32`: the float32 `(num_rows, dim)` pooled embeddings, memory-mapped when read,
+* `columns.npz`: the label and the side features (`bias_probs`, `sample_weight`, ...) of every
+  row, under the name of the model argument they were batched for,
+* `meta.json`: the shape and the source of the cache.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy
+import torch
+from overrides import overrides
+
+from allennlp.data import TextFieldTensors
+from allennlp.models import Model
+from allennlp.modules.token_embedders import TokenEmbedder
+from allennlp.nn.util import get_text_field_mask
+
+EMBEDDINGS_FILE = "embeddings.f32"
+COLUMNS_FILE = "columns.npz"
+META_FILE = "meta.json"
+
+
+def pooled_encode(model: Model, tokens: TextFieldTensors) -> torch.Tensor:
+    """
+    Runs the encoder part of a classifier (its text field embedder, optional seq2seq encoder
+    and seq2vec encoder) and returns the pooled `(batch_size, dim)` embeddings.
+    """
+    embedded_text = model._text_field_embedder(tokens)
+    mask = get_text_field_mask(tokens)
+    if getattr(model, "_seq2seq_encoder", None):
+        embedded_text = model._seq2seq_encoder(embedded_text, mask=mask)
+    return model._seq2vec_encoder(embedded_text, mask=mask)
+
+
+class PooledEmbeddingCacheWriter:
+    """
+    Appends batches of pooled embeddings and their columns to a cache directory. The
+    embeddings are streamed to disk; `close()` writes the columns and the metadata.
+    """
+
+    def __init__(self, directory: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._metadata = dict(metadata or {})
+        self._embeddings_file = open(os.path.join(directory, EMBEDDINGS_FILE), "wb")
+        self._columns: Dict[str, List[numpy.ndarray]] = {}
+        self._num_rows = 0
+        self._dim: Optional[int] = None
+
+    def append(self, embeddings: numpy.ndarray, columns: Dict[str, numpy.ndarray]) -> None:
+        embeddings = numpy.ascontiguousarray(embeddings, dtype=numpy.float32)
+        if self._dim is None:
+            self._dim = embeddings.shape[1]
+        assert embeddings.shape[1] == self._dim
+        self._embeddings_file.write(embeddings.tobytes())
+        for name, values in columns.items():
+            assert len(values) == len(embeddings)
+            self._columns.setdefault(name, []).append(numpy.asarray(values))
+        self._num_rows += len(embeddings)
+
+    def close(self) -> None:
+        self._embeddings_file.close()
+        numpy.savez(
+            os.path.join(self._directory, COLUMNS_FILE),
+            **{name: numpy.concatenate(values) for name, values in self._columns.items()},
+        )
+        metadata = dict(self._metadata, num_rows=self._num_rows, dim=self._dim or 0)
+        with open(os.path.join(self._directory, META_FILE), "w") as meta_file:
+            json.dump(metadata, meta_file, indent=2)
+
+    def __enter__(self) -> "PooledEmbeddingCacheWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def load_pooled_embedding_cache(directory: str):
+    """
+    Returns the memory-mapped `(num_rows, dim)` embeddings, the columns and the metadata of a
+    cache directory.
+    """
+    with open(os.path.join(directory, META_FILE)) as meta_file:
+        metadata = json.load(meta_file)
+    embeddings = numpy.memmap(
+        os.path.join(directory, EMBEDDINGS_FILE),
+        dtype=numpy.float32,
+        mode="r",
+        shape=(metadata["num_rows"], metadata["dim"]),
+    )
+    with numpy.load(os.path.join(directory, COLUMNS_FILE)) as columns_file:
+        columns = {name: columns_file[name] for name in columns_file.files}
+    return embeddings, columns, metadata
+
+
+@TokenEmbedder.register("pooled_embedding")
+class PooledEmbedding(TokenEmbedder):
+    """
+    Returns the cached pooled embeddings of a `PooledEmbeddingField` as a one token sequence
+    of shape `(batch_size, 1, embedding_dim)`; use a `"cls_pooler"` seq2vec encoder on top.
+
+    # Parameters
+
+    embedding_dim : `int`
+        Dimension of the cached embeddings.
+    """
+
+    def __init__(self, embedding_dim: int) -> None:
+        super().__init__()
+        self._embedding_dim = embedding_dim
+
+    @overrides
+    def get_output_dim(self) -> int:
+        return self._embedding_dim
+
+    @overrides
+    def forward(
+        self,
+        tokens: torch.LongTensor,
+        embedding: torch.FloatTensor,
+        mask: Optional[torch.BoolTensor] = None,
+    ) -> torch.Tensor:
+        return embedding
@@ -0,0 +1,276 @@
+"""
+A content-addressed cache of the evaluation outputs of a classifier. An entry holds the
+`logits` and `probs` of every example of an evaluation file, in file order, with the gold
+label indices and the metrics of the evaluation, under a key made of the hash of the archive
+(or weights file), the hash of the data file, the configuration of the dataset reader and the
+hashes of the files it names (e.g. score tables), so that re-running an evaluation, dumping
+predictions or analysing them does not need another forward pass.
+
+An entry is a directory `<cache_dir>/<key>/` holding:
+
+* `logits.npy` and `probs.npy`: float32 arrays of shape `(num_examples, num_labels)`,
+* `gold.npy`: the int64 gold label index of every example, `-1` when it has none,
+* `meta.json`: the label of every index, the metrics and the sources of the entry,
+* `predictions.jsonl`: the human-readable predictions `evaluate` wrote, when the evaluation
+  that filled the entry dumped them.
+
+The predictions of an evaluation can also be written in the same compact form, as one `.npz`
+file per dataset (see `write_binary_predictions`), instead of the JSON lines of `evaluate`.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy
+import torch
+
+from allennlp.common.checks import ConfigurationError
+from allennlp.common.params import parse_overrides, with_fallback
+from allennlp.models import Model
+
+from my_package.utils.hashing import path_digest
+
+META_FILE = "meta.json"
+PREDICTIONS_FILE = "predictions.jsonl"
+
+
+def referenced_paths(config: Any) -> List[str]:
+    """
+    The existing files and directories named by the strings of a (nested) configuration,
+    e.g. the `score_table` of a dataset reader.
+    """
+    if isinstance(config, dict):
+        return [path for value in config.values() for path in referenced_paths(value)]
+    if isinstance(config, list):
+        return [path for value in config for path in referenced_paths(value)]
+    if isinstance(config, str) and os.path.exists(config):
+        return [config]
+    return []
+
+
+def archive_config(archive_file: str, overrides: str = "") -> Dict[str, Any]:
+    """
+    The experiment configuration of an archive (a `model.tar.gz` or its extracted directory)
+    with `overrides` applied, read without extracting the weights.
+    """
+    if os.path.isdir(archive_file):
+        with open(os.path.join(archive_file, "config.json")) as fh:
+            config = json.load(fh)
+    else:
+        with tarfile.open(archive_file, "r:gz") as archive:
+            config = json.load(archive.extractfile("config.json"))
+    return with_fallback(preferred=parse_overrides(overrides), fallback=config)
+
+
+def prediction_cache_key(
+    model_digest: str,
+    data_path: str,
+    reader_config: Dict[str, Any],
+    extra: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    The key of the evaluation of the model whose archive hashes to `model_digest` on
+    `data_path` read with `reader_config`. The files the reader configuration names are part
+    of the key, so rebuilding e.g. a score table invalidates the entries read with it. `extra`
+    holds anything else the outputs depend on, e.g. the overrides or the quantization of the
+    model.
+    """
+    content = {
+        "model": model_digest,
+        "data": path_digest(data_path),
+        "reader": reader_config,
+        "reader_files": {path: path_digest(path) for path in referenced_paths(reader_config)},
+        "extra": extra or {},
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def evaluation_cache_keys(
+    archive_file: str,
+    data_paths: List[str],
+    weights_file: Optional[str] = None,
+    overrides: str = "",
+    quantize: bool = False,
+    extend_vocab: bool = False,
+    batch_weight_key: str = "",
+) -> List[str]:
+    """
+    The key of the evaluation of an archive (a `model.tar.gz` or its extracted directory) on
+    every file of `data_paths`, from the hashes of the archive, the weights file and the data
+    file and from the configuration of the validation dataset reader of the archive. The
+    `batch_weight_key` that weights the averaged loss is part of the key.
+    """
+    config = archive_config(archive_file, overrides)
+    reader_config = config.get("validation_dataset_reader") or config["dataset_reader"]
+    model_digest = path_digest(archive_file)
+    extra = {
+        "weights": path_digest(weights_file) if weights_file else None,
+        "overrides": overrides,
+        "quantize": quantize,
+        "extend_vocab": extend_vocab,
+        "batch_weight_key": batch_weight_key,
+    }
+    return [prediction_cache_key(model_digest, path, reader_config, extra) for path in data_paths]
+
+
+class CachedPredictions(NamedTuple):
+    logits: numpy.ndarray
+    probs: numpy.ndarray
+    gold: numpy.ndarray
+    meta: Dict[str, Any]
+
+
+class PredictionCache:
+    """
+    The entries of a cache directory, see the module docstring for the format. Entries are
+    written to a temporary directory first and moved in place, so a concurrent reader never
+    sees a partial entry.
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path(key), META_FILE))
+
+    def has_predictions(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path(key), PREDICTIONS_FILE))
+
+    def copy_predictions(self, key: str, predictions_output_file: str) -> None:
+        """
+        Copies the human-readable predictions of an entry, see `has_predictions`.
+        """
+        shutil.copyfile(os.path.join(self.path(key), PREDICTIONS_FILE), predictions_output_file)
+
+    def load(self, key: str, mmap: bool = True) -> CachedPredictions:
+        path = self.path(key)
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(path, META_FILE)) as fh:
+            meta = json.load(fh)
+        return CachedPredictions(
+            logits=numpy.load(os.path.join(path, "logits.npy"), mmap_mode=mmap_mode),
+            probs=numpy.load(os.path.join(path, "probs.npy"), mmap_mode=mmap_mode),
+            gold=numpy.load(os.path.join(path, "gold.npy"), mmap_mode=mmap_mode),
+            meta=meta,
+        )
+
+    def save(
+        self,
+        key: str,
+        logits: numpy.ndarray,
+        probs: numpy.ndarray,
+        gold: numpy.ndarray,
+        meta: Dict[str, Any],
+        predictions_file: Optional[str] = None,
+    ) -> None:
+        """
+        Stores an entry, with a copy of the human-readable `predictions_file` when given. An
+        existing entry is kept unless it lacks the predictions the new one has.
+        """
+        tmp_path = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp_")
+        try:
+            numpy.save(os.path.join(tmp_path, "logits.npy"), logits.astype(numpy.float32))
+            numpy.save(os.path.join(tmp_path, "probs.npy"), probs.astype(numpy.float32))
+            numpy.save(os.path.join(tmp_path, "gold.npy"), gold.astype(numpy.int64))
+            if predictions_file is not None:
+                shutil.copyfile(predictions_file, os.path.join(tmp_path, PREDICTIONS_FILE))
+            with open(os.path.join(tmp_path, META_FILE), "w") as fh:
+                json.dump(meta, fh, indent=2)
+            if key in self and (predictions_file is None or self.has_predictions(key)):
+                shutil.rmtree(tmp_path)
+            else:
+                shutil.rmtree(self.path(key), ignore_errors=True)
+                os.replace(tmp_path, self.path(key))
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+
+class PredictionRecorder:
+    """
+    Records the `logits`, `probs` and gold `label` of every forward pass of a classifier
+    while it is used as a context manager, through a forward hook, so that
+    `allennlp.training.util.evaluate` can be used unchanged.
+    """
+
+    def __init__(self, model: Model) -> None:
+        self._model = model
+        self._handle = None
+        self._logits: List[numpy.ndarray] = []
+        self._probs: List[numpy.ndarray] = []
+        self._gold: List[numpy.ndarray] = []
+
+    def _hook(self, module, args, kwargs, output) -> None:
+        if "logits" not in output or "probs" not in output:
+            raise ConfigurationError("Caching predictions needs a model with logits and probs")
+        logits = output["logits"].detach().float().cpu().numpy()
+        label = kwargs.get("label")
+        self._logits.append(logits)
+        self._probs.append(output["probs"].detach().float().cpu().numpy())
+        self._gold.append(
+            label.view(-1).cpu().numpy()
+            if isinstance(label, torch.Tensor)
+            else numpy.full(len(logits), -1, dtype=numpy.int64)
+        )
+
+    def __enter__(self) -> "PredictionRecorder":
+        self._handle = self._model.register_forward_hook(self._hook, with_kwargs=True)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._handle.remove()
+
+    def arrays(self):
+        """
+        The recorded `(logits, probs, gold)` arrays.
+        """
+        if not self._logits:
+            empty = numpy.zeros((0, 0), dtype=numpy.float32)
+            return empty, empty, numpy.zeros(0, dtype=numpy.int64)
+        return (
+            numpy.concatenate(self._logits),
+            numpy.concatenate(self._probs),
+            numpy.concatenate(self._gold),
+        )
+
+
+def write_binary_predictions(
+    predictions_output_file: str,
+    logits: numpy.ndarray,
+    probs: numpy.ndarray,
+    ids: Union[Sequence[str], Sequence[int]],
+    labels: List[str],
+    id_key: Optional[str] = None,
+    gold: Optional[numpy.ndarray] = None,
+) -> None:
+    """
+    Writes the predictions of a dataset as an (uncompressed) `.npz` holding the float32
+    `logits` and `probs` of shape `(num_examples, num_labels)`, the `id` of every row, the
+    `labels` of the columns and the `id_key` the ids were read from, `""` when they are the
+    line numbers of the examples, and when given the int64 `gold` label index of every row,
+    `-1` when it has none. Every array is a plain numpy array, so `numpy.load` reads the file
+    without pickle.
+    """
+    if len(ids) != len(probs):
+        raise ConfigurationError(
+            "%d ids for %d predictions in %s" % (len(ids), len(probs), predictions_output_file)
+        )
+    arrays = {
+        "logits": numpy.asarray(logits, dtype=numpy.float32),
+        "probs": numpy.asarray(probs, dtype=numpy.float32),
+        "id": numpy.asarray(ids, dtype=numpy.int64 if id_key is None else str),
+        "labels": numpy.asarray(labels, dtype=str),
+        "id_key": numpy.asarray(id_key or ""),
+    }
+    if gold is not None:
+        arrays["gold"] = numpy.asarray(gold, dtype=numpy.int64)
+    with open(predictions_output_file, "wb") as fh:
+        numpy.savez(fh, **arrays)
@@ -0,0 +1,38 @@
+"""
+Dynamic int8 quantization of the trained classifiers for CPU inference. The weights of the
+`torch.nn.Linear` layers of the encoder (the transformer in the text field embedder, the
+optional seq2seq encoder and the pooler) are stored as int8 and the activations are
+quantized on the fly, which makes the matrix multiplications of BERT-sized encoders
+noticeably faster on CPU. The classification head stays in float32.
+"""
+import copy
+import logging
+from typing import Tuple
+
+import torch
+
+from allennlp.models import Model
+
+logger = logging.getLogger(__name__)
+
+QUANTIZED_MODULES: Tuple[str, ...] = ("_text_field_embedder", "_seq2seq_encoder", "_seq2vec_encoder")
+
+
+def quantize_dynamic_int8(model: Model, inplace: bool = False) -> Model:
+    """
+    Returns `model` on CPU with the linear layers of its encoder modules dynamically quantized
+    to int8. Unless `inplace` is set, `model` itself is left unchanged.
+    """
+    if not inplace:
+        model = copy.deepcopy(model)
+    model = model.cpu().eval()
+    for name in QUANTIZED_MODULES:
+        module = getattr(model, name, None)
+        if module is not None:
+            setattr(
+                model,
+                name,
+                torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8),
+            )
+    logger.info("Quantized the linear layers of %s to int8", type(model).__name__)
+    return model
@@ -0,0 +1,306 @@
+"""
+Data-parallel evaluation on CPU. The instances of an evaluation file are split into contiguous
+shards on batch boundaries and evaluated by worker processes, each holding its own copy of the
+archived model and a fixed number of intra-op threads. The batches are the same as in a
+single-process evaluation in file order, so the results merge exactly: the counts behind the
+metrics of the model (correct predictions, confusion matrices, ...) and the batch losses are
+summed, and the outputs of the shards are concatenated in file order.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
+import multiprocessing
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy
+import torch
+
+from allennlp.common.checks import ConfigurationError
+from allennlp.common.params import Params
+from allennlp.common.util import sanitize
+from allennlp.data import Instance
+from allennlp.data.data_loaders import SimpleDataLoader
+from allennlp.models import Model
+from allennlp.models.archival import load_archive
+from allennlp.training.metrics import Average, CategoricalAccuracy, FBetaMeasure, Metric
+
+from my_package.modules.prediction_cache import PredictionRecorder
+from my_package.modules.quantization import quantize_dynamic_int8
+from my_package.training.metrics import FusedF1Measure
+
+# The fields of the metrics that hold counts, which are summed across shards.
+ADDITIVE_METRIC_STATES: Dict[type, Tuple[str, ...]] = {
+    CategoricalAccuracy: ("correct_count", "total_count"),
+    FusedF1Measure: ("_confusion",),
+    Average: ("_total_value", "_count"),
+    FBetaMeasure: ("_true_positive_sum", "_pred_sum", "_true_sum", "_total_sum"),
+}
+
+
+class ShardResult(NamedTuple):
+    metric_states: Dict[str, Dict[str, Any]]
+    total_loss: float
+    total_weight: float
+    loss_count: int
+    batch_count: int
+    logits: numpy.ndarray
+    probs: numpy.ndarray
+    gold: numpy.ndarray
+    predictions: Optional[List[str]]
+
+
+class ShardedEvaluation(NamedTuple):
+    metrics: Dict[str, Any]
+    logits: numpy.ndarray
+    probs: numpy.ndarray
+    gold: numpy.ndarray
+    predictions: Optional[List[str]]
+
+
+def evaluation_batch_size(data_loader_params: Params) -> int:
+    """
+    The batch size of the (validation) data loader configuration of an experiment, 32 when it
+    has none.
+    """
+    batch_sampler = data_loader_params.get("batch_sampler")
+    batch_size = data_loader_params.get("batch_size")
+    if batch_size is None and batch_sampler is not None:
+        batch_size = batch_sampler.get("batch_size")
+    return batch_size or 32
+
+
+def shard_bounds(num_instances: int, batch_size: int, num_shards: int) -> List[Tuple[int, int]]:
+    """
+    The `(start, end)` of at most `num_shards` contiguous shards of `num_instances`, every
+    shard but the last holding a whole number of batches.
+    """
+    num_batches = math.ceil(num_instances / batch_size)
+    shard_size = math.ceil(num_batches / max(num_shards, 1)) * batch_size
+    return [
+        (start, min(start + shard_size, num_instances))
+        for start in range(0, num_instances, shard_size or 1)
+    ]
+
+
+def _additive_fields(name: str, metric: Metric) -> Tuple[str, ...]:
+    for metric_type, fields in ADDITIVE_METRIC_STATES.items():
+        if isinstance(metric, metric_type):
+            return fields
+    raise ConfigurationError(
+        "Cannot merge metric %s (%s) across shards" % (name, type(metric).__name__)
+    )
+
+
+def _collect_metrics(path: str, value: Any, metrics: Dict[str, Metric], seen: set) -> None:
+    if isinstance(value, Metric):
+        if id(value) not in seen:
+            seen.add(id(value))
+            metrics[path] = value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _collect_metrics("%s[%s]" % (path, key), item, metrics, seen)
+    elif isinstance(value, (list, tuple)):
+        for index, item in enumerate(value):
+            _collect_metrics("%s[%d]" % (path, index), item, metrics, seen)
+
+
+def _model_metrics(model: Model) -> Dict[str, Metric]:
+    """
+    Every `Metric` of `model` by a path that is the same in every copy of the model: the
+    metrics set as attributes of the model or of any of its submodules (e.g. the heads of a
+    `MultiHeadClassifier`), directly or in dicts, lists and tuples (e.g. the per-exit metrics
+    of an `EarlyExitClassifier`).
+    """
+    metrics: Dict[str, Metric] = {}
+    seen: set = set()
+    for module_name, module in model.named_modules():
+        for name, value in vars(module).items():
+            if name in ("_modules", "_parameters", "_buffers"):
+                continue
+            path = "%s.%s" % (module_name, name) if module_name else name
+            _collect_metrics(path, value, metrics, seen)
+    return metrics
+
+
+def metric_states(model: Model) -> Dict[str, Dict[str, Any]]:
+    """
+    The counts accumulated by the metrics of `model`, see `ADDITIVE_METRIC_STATES`.
+    """
+    return {
+        name: {field: getattr(metric, field) for field in _additive_fields(name, metric)}
+        for name, metric in _model_metrics(model).items()
+    }
+
+
+def merge_metric_states(model: Model, states: Sequence[Dict[str, Dict[str, Any]]]) -> None:
+    """
+    Sets the metrics of `model` to the sum of the counts of `states`, so that
+    `model.get_metrics()` reports the metrics of the union of the shards.
+    """
+    for name, metric in _model_metrics(model).items():
+        metric.reset()
+        for field in _additive_fields(name, metric):
+            if any(name not in state for state in states):
+                raise ConfigurationError("Metric %s is missing from the states of a shard" % name)
+            values = [state[name][field] for state in states if state[name][field] is not None]
+            if values:
+                setattr(metric, field, sum(values[1:], values[0]))
+
+
+def evaluate_shard(
+    model: Model,
+    instances: List[Instance],
+    batch_size: int,
+    batch_weight_key: str = "",
+    human_readable: bool = False,
+) -> ShardResult:
+    """
+    Evaluates `model` on `instances` as `allennlp.training.util.evaluate` does on CPU, but
+    returns the unreduced loss and metric counts, the outputs of every instance and, if
+    `human_readable`, the JSON line of every batch instead of the final metrics.
+    """
+    model.eval()
+    for metric in _model_metrics(model).values():
+        metric.reset()
+    data_loader = SimpleDataLoader(instances, batch_size, vocab=model.vocab)
+    total_loss, total_weight, loss_count, batch_count = 0.0, 0.0, 0, 0
+    predictions: Optional[List[str]] = [] if human_readable else None
+    with torch.no_grad(), PredictionRecorder(model) as recorder:
+        for batch in data_loader:
+            batch_count += 1
+            output_dict = model(**batch)
+            loss = output_dict.get("loss")
+            if loss is not None:
+                loss_count += 1
+                weight = output_dict[batch_weight_key].item() if batch_weight_key else 1.0
+                total_weight += weight
+                total_loss += loss.item() * weight
+            if predictions is not None:
+                predictions.append(
+                    json.dumps(sanitize(model.make_output_human_readable(output_dict)))
+                )
+    logits, probs, gold = recorder.arrays()
+    states = metric_states(model)
+    for metric in _model_metrics(model).values():
+        metric.reset()
+    return ShardResult(
+        states, total_loss, total_weight, loss_count, batch_count, logits, probs, gold, predictions
+    )
+
+
+def merge_shards(model: Model, shards: Sequence[ShardResult]) -> ShardedEvaluation:
+    """
+    The metrics and outputs of the union of `shards`, in order. The metrics of `model` are
+    used to reduce the merged counts and are left reset.
+    """
+    merge_metric_states(model, [shard.metric_states for shard in shards])
+    metrics = model.get_metrics(reset=True)
+    loss_count = sum(shard.loss_count for shard in shards)
+    if loss_count > 0:
+        if loss_count != sum(shard.batch_count for shard in shards):
+            raise RuntimeError("The model you are trying to evaluate only sometimes produced a loss!")
+        metrics["loss"] = sum(shard.total_loss for shard in shards) / sum(
+            shard.total_weight for shard in shards
+        )
+    shards = [shard for shard in shards if len(shard.probs)] or shards[:1]
+    return ShardedEvaluation(
+        metrics=metrics,
+        logits=numpy.concatenate([shard.logits for shard in shards]),
+        probs=numpy.concatenate([shard.probs for shard in shards]),
+        gold=numpy.concatenate([shard.gold for shard in shards]),
+        predictions=(
+            None
+            if shards[0].predictions is None
+            else [line for shard in shards for line in shard.predictions]
+        ),
+    )
+
+
+# The model of a worker process, loaded once by `_init_worker`.
+_worker_model: Optional[Model] = None
+
+
+def _init_worker(
+    archive_file: str,
+    weights_file: Optional[str],
+    overrides: str,
+    quantize: bool,
+    num_threads: int,
+) -> None:
+    global _worker_model
+    torch.set_num_threads(num_threads)
+    model = load_archive(
+        archive_file, weights_file=weights_file, cuda_device=-1, overrides=overrides
+    ).model
+    if quantize:
+        model = quantize_dynamic_int8(model, inplace=True)
+    _worker_model = model.eval()
+
+
+def _evaluate_worker_shard(
+    instances: List[Instance], batch_size: int, batch_weight_key: str, human_readable: bool
+) -> ShardResult:
+    return evaluate_shard(_worker_model, instances, batch_size, batch_weight_key, human_readable)
+
+
+class ShardedEvaluator:
+    """
+    A pool of `num_shards` worker processes that each load the archive once, with
+    `threads_per_shard` intra-op threads (by default the CPUs split evenly between them), and
+    evaluate one shard of every dataset. Used as a context manager.
+    """
+
+    def __init__(
+        self,
+        num_shards: int,
+        archive_file: str,
+        weights_file: Optional[str] = None,
+        overrides: str = "",
+        quantize: bool = False,
+        threads_per_shard: Optional[int] = None,
+    ) -> None:
+        self.num_shards = num_shards
+        threads_per_shard = threads_per_shard or max(1, (os.cpu_count() or 1) // num_shards)
+        # Workers are spawned, forking a process with an initialized intra-op thread pool is
+        # not safe.
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_shards,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(archive_file, weights_file, overrides, quantize, threads_per_shard),
+        )
+
+    def __enter__(self) -> "ShardedEvaluator":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._executor.shutdown()
+
+    def evaluate(
+        self,
+        model: Model,
+        instances: List[Instance],
+        batch_size: int,
+        batch_weight_key: str = "",
+        human_readable: bool = False,
+    ) -> ShardedEvaluation:
+        """
+        Evaluates `instances` across the workers; `model` (a copy of the one of the workers)
+        reduces the merged metric counts.
+        """
+        if not instances:
+            return merge_shards(
+                model, [evaluate_shard(model, [], batch_size, batch_weight_key, human_readable)]
+            )
+        futures = [
+            self._executor.submit(
+                _evaluate_worker_shard,
+                instances[start:end],
+                batch_size,
+                batch_weight_key,
+                human_readable,
+            )
+            for start, end in shard_bounds(len(instances), batch_size, self.num_shards)
+        ]
+        return merge_shards(model, [future.result() for future in futures])
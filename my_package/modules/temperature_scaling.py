@@ -1,6 +1,9 @@
-# TO DO: test gpu
-from typing import Dict, Any, Union, Optional
+import json
+import logging
+import os
+from typing import Dict, Any, List, NamedTuple, Union, Optional, Tuple
 
+import numpy
 import torch
 from torch import nn, optim
 from torch.nn import functional as F
@@ -16,8 +19,17 @@ from allennlp.models.archival import CONFIG_NAME
 from allennlp.models.model import Model
 from allennlp.nn import util as nn_util
 
+from my_package.modules.prediction_cache import PredictionCache, evaluation_cache_keys
+from my_package.modules.sharded_evaluation import (
+    evaluate_shard,
+    evaluation_batch_size,
+    merge_shards,
+)
+
 import pickle
 
+logger = logging.getLogger(__name__)
+
 
 class ModelWithTemperature(nn.Module):
     """
@@ -33,8 +45,8 @@ class ModelWithTemperature(nn.Module):
         self.model = model
         self.temperature = nn.Parameter(torch.ones(1) * 1.5)
 
-    def forward(self, input):
-        output_dict = self.model(input)
+    def forward(self, **inputs):
+        output_dict = self.model(**inputs)
         logits = output_dict["logits"]
         return self.temperature_scale(logits)
 
@@ -48,65 +60,84 @@ class ModelWithTemperature(nn.Module):
         )
         return logits / temperature
 
-    # This function probably should live outside of this class, but whatever
     def set_temperature(self, valid_loader):
         """
         Tune the tempearature of the model (using the validation set).
         We're going to set it to optimize NLL.
         valid_loader (DataLoader): validation set loader
         """
-        self.cuda()
-        nll_criterion = nn.CrossEntropyLoss().cuda()
-        ece_criterion = _ECELoss().cuda()
+        device = self.temperature.device
 
         # First: collect all the logits and labels for the validation set
         logits_list = []
         labels_list = []
         with torch.no_grad():
-            self.model
-            for input in valid_loader:
-                input = input
-                label = input["label"].cuda()
-                output_dict = self.model(tokens=input["tokens"], label=label)
-                logits = output_dict["logits"]
-                logits_list.append(logits)
-                labels_list.append(label)
-            logits = torch.cat(logits_list).cuda()
-            labels = torch.cat(labels_list).cuda()
-
-        # Calculate NLL and ECE before temperature scaling
-        before_temperature_nll = nll_criterion(logits, labels).item()
-        before_temperature_ece = ece_criterion(logits, labels).item()
-        print(
-            "Before temperature - NLL: %.3f, ECE: %.3f"
-            % (before_temperature_nll, before_temperature_ece)
-        )
+            for batch in valid_loader:
+                batch = nn_util.move_to_device(batch, device)
+                output_dict = self.model(**batch)
+                logits_list.append(output_dict["logits"])
+                labels_list.append(batch["label"].view(-1))
+
+        fit = fit_temperature(torch.cat(logits_list), torch.cat(labels_list))
+        print("Before temperature - NLL: %.3f, ECE: %.3f" % (fit.nll_before, fit.ece_before))
+        print("Optimal temperature: %.3f" % fit.temperature)
+        print("After temperature - NLL: %.3f, ECE: %.3f" % (fit.nll_after, fit.ece_after))
+        with torch.no_grad():
+            self.temperature.fill_(fit.temperature)
+        return self
 
-        # Next: optimize the temperature w.r.t. NLL
-        optimizer = optim.LBFGS([self.temperature], lr=0.01, max_iter=50)
-
-        def eval():
-            optimizer.zero_grad()
-            loss = nll_criterion(self.temperature_scale(logits), labels)
-            loss.backward()
-            return loss
-
-        optimizer.step(eval)
-
-        # Calculate NLL and ECE after temperature scaling
-        after_temperature_nll = nll_criterion(
-            self.temperature_scale(logits), labels
-        ).item()
-        after_temperature_ece = ece_criterion(
-            self.temperature_scale(logits), labels
-        ).item()
-        print("Optimal temperature: %.3f" % self.temperature.item())
-        print(
-            "After temperature - NLL: %.3f, ECE: %.3f"
-            % (after_temperature_nll, after_temperature_ece)
-        )
 
-        return self
+class TemperatureFit(NamedTuple):
+    temperature: float
+    nll_before: float
+    ece_before: float
+    nll_after: float
+    ece_after: float
+
+
+def fit_temperature(
+    logits: torch.Tensor,
+    labels: torch.Tensor,
+    initial_temperature: float = 1.5,
+    lr: float = 0.01,
+    max_iter: int = 50,
+) -> TemperatureFit:
+    """
+    Fits the temperature minimizing the NLL of `logits / temperature` against the gold
+    `labels` with LBFGS, on the device of `logits` (e.g. on CPU from cached validation logits),
+    and reports the NLL and the ECE before and after scaling.
+    """
+    logits = logits.detach().float()
+    labels = labels.detach().long().to(logits.device)
+    temperature = nn.Parameter(torch.ones(1, device=logits.device) * initial_temperature)
+    nll_criterion = nn.CrossEntropyLoss()
+    ece_criterion = _ECELoss()
+
+    # Calculate NLL and ECE before temperature scaling
+    nll_before = nll_criterion(logits, labels).item()
+    ece_before = ece_criterion(logits, labels).item()
+
+    # Next: optimize the temperature w.r.t. NLL
+    optimizer = optim.LBFGS([temperature], lr=lr, max_iter=max_iter)
+
+    def eval():
+        optimizer.zero_grad()
+        loss = nll_criterion(logits / temperature, labels)
+        loss.backward()
+        return loss
+
+    optimizer.step(eval)
+
+    # Calculate NLL and ECE after temperature scaling
+    with torch.no_grad():
+        scaled = logits / temperature
+        return TemperatureFit(
+            temperature=temperature.item(),
+            nll_before=nll_before,
+            ece_before=ece_before,
+            nll_after=nll_criterion(scaled, labels).item(),
+            ece_after=ece_criterion(scaled, labels).item(),
+        )
 
 
 class _ECELoss(nn.Module):
@@ -180,165 +211,115 @@ def get_temp(
     """
     check_for_gpu(cuda_device)
     data_loader.set_target_device(int_to_device(cuda_device))
-    model_temp = ModelWithTemperature(model)
+    model_temp = ModelWithTemperature(model).to(int_to_device(cuda_device))
     model_temp.set_temperature(data_loader)
     # pickle.dump(model_temp, open(output_file, "wb"))
     torch.save(model_temp,output_file)
     return model_temp
 
 
-# @Subcommand.register("temp_scale")
-# class TempuratureScaledModel(Subcommand):
-#     @overrides
-#     def add_subparser(
-#         self, parser: argparse._SubParsersAction
-#     ) -> argparse.ArgumentParser:
-#         description = """Get tempurature scaled model"""
-#         subparser = parser.add_parser(
-#             self.name, description=description, help="Get tempurature scaled model."
-#         )
-
-#         subparser.add_argument(
-#             "archive_file", type=str, help="path to an archived trained model"
-#         )
-
-#         subparser.add_argument(
-#             "input_file",
-#             type=str,
-#             help="path to the file containing the evaluation data",
-#         )
-
-#         subparser.add_argument(
-#             "--output-file",
-#             type=str,
-#             help="optional path to write the metrics to as JSON",
-#         )
-
-#         subparser.add_argument(
-#             "--weights-file",
-#             type=str,
-#             help="a path that overrides which weights file to use",
-#         )
-
-#         cuda_device = subparser.add_mutually_exclusive_group(required=False)
-#         cuda_device.add_argument(
-#             "--cuda-device", type=int, default=-1, help="id of GPU to use (if any)"
-#         )
-
-#         subparser.add_argument(
-#             "-o",
-#             "--overrides",
-#             type=str,
-#             default="",
-#             help=(
-#                 "a json(net) structure used to override the experiment configuration, e.g., "
-#                 "'{\"iterator.batch_size\": 16}'.  Nested parameters can be specified either"
-#                 " with nested dictionaries or with dot syntax."
-#             ),
-#         )
-
-#         subparser.add_argument(
-#             "--batch-size",
-#             type=int,
-#             help="If non-empty, the batch size to use during evaluation.",
-#         )
-
-#         subparser.add_argument(
-#             "--batch-weight-key",
-#             type=str,
-#             default="",
-#             help="If non-empty, name of metric used to weight the loss on a per-batch basis.",
-#         )
-
-#         subparser.add_argument(
-#             "--extend-vocab",
-#             action="store_true",
-#             default=False,
-#             help="if specified, we will use the instances in your new dataset to "
-#             "extend your vocabulary. If pretrained-file was used to initialize "
-#             "embedding layers, you may also need to pass --embedding-sources-mapping.",
-#         )
-
-#         subparser.add_argument(
-#             "--embedding-sources-mapping",
-#             type=str,
-#             default="",
-#             help="a JSON dict defining mapping from embedding module path to embedding "
-#             "pretrained-file used during training. If not passed, and embedding needs to be "
-#             "extended, we will try to use the original file paths used during training. If "
-#             "they are not available we will use random vectors for embedding extension.",
-#         )
-#         subparser.add_argument(
-#             "--file-friendly-logging",
-#             action="store_true",
-#             default=False,
-#             help="outputs tqdm status on separate lines and slows tqdm refresh rate",
-#         )
-
-#         subparser.set_defaults(func=temp_scale_from_args)
-
-#         return subparser
-
-
-# def temp_scale_from_args(args: argparse.Namespace) -> Dict[str, Any]:
-#     common_logging.FILE_FRIENDLY_LOGGING = args.file_friendly_logging
-
-#     # Disable some of the more verbose logging statements
-#     logging.getLogger("allennlp.common.params").disabled = True
-#     logging.getLogger("allennlp.nn.initializers").disabled = True
-#     logging.getLogger("allennlp.modules.token_embedders.embedding").setLevel(
-#         logging.INFO
-#     )
-
-#     # Load from archive
-#     archive = load_archive(
-#         args.archive_file,
-#         weights_file=args.weights_file,
-#         cuda_device=args.cuda_device,
-#         overrides=args.overrides,
-#     )
-#     config = archive.config
-#     prepare_environment(config)
-#     model = archive.model
-#     model.eval()
-
-#     # Load the evaluation data
-#     dataset_reader = archive.validation_dataset_reader
-
-#     # output file
-#     output_file_path = None
-#     predictions_output_file_path = None
-
-#     evaluation_data_path = args.input_file
-#     if args.output_file != None:
-#         output_file_path = args.output_file
-
-#     logger.info("Reading evaluation data from %s", evaluation_data_path)
-#     data_loader_params = config.get("validation_data_loader", None)
-#     if data_loader_params is None:
-#         data_loader_params = config.get("data_loader")
-#     if args.batch_size:
-#         data_loader_params["batch_size"] = args.batch_size
-#     data_loader = DataLoader.from_params(
-#         params=data_loader_params, reader=dataset_reader, data_path=evaluation_data_path
-#     )
-
-#     embedding_sources = (
-#         json.loads(args.embedding_sources_mapping)
-#         if args.embedding_sources_mapping
-#         else {}
-#     )
-
-#     if args.extend_vocab:
-#         logger.info("Vocabulary is being extended with test instances.")
-#         model.vocab.extend_from_instances(instances=data_loader.iter_instances())
-#         model.extend_embedder_vocab(embedding_sources)
-
-#     data_loader.index_with(model.vocab)
-
-#     temp_scaled_model = get_temp(
-#         model, data_loader, args.cuda_device, output_file=output_file_path
-#     )
-#     logger.info("Finished calculating temp.")
-
-#     return temp_scaled_model.temperature
+def is_cache_entry(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, "logits.npy"))
+
+
+def archive_validation_logits(
+    archive_file: str,
+    input_file: str,
+    cache: Optional[PredictionCache] = None,
+    overrides: str = "",
+    batch_size: Optional[int] = None,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    The validation `(logits, gold)` of an archived model, from `cache` when it holds them.
+    Otherwise they are computed on CPU, in file order, and stored in `cache` under the key of
+    `evaluate_mult`, with the same metrics.
+    """
+    key = None
+    if cache is not None:
+        key = evaluation_cache_keys(archive_file, [input_file], overrides=overrides)[0]
+        if key in cache:
+            logger.info("Validation logits of %s found in the cache", archive_file)
+            cached = cache.load(key)
+            return cached.logits, cached.gold
+
+    archive = load_archive(archive_file, cuda_device=-1, overrides=overrides)
+    model = archive.model.eval()
+    config = archive.config
+    data_loader_params = config.get("validation_data_loader", None) or config.get("data_loader")
+    batch_size = batch_size or evaluation_batch_size(data_loader_params)
+    instances = list(archive.validation_dataset_reader.read(input_file))
+    evaluation = merge_shards(model, [evaluate_shard(model, instances, batch_size)])
+    if cache is not None:
+        label_namespace = getattr(model, "_label_namespace", "labels")
+        index_to_label = model.vocab.get_index_to_token_vocabulary(label_namespace)
+        cache.save(
+            key,
+            evaluation.logits,
+            evaluation.probs,
+            evaluation.gold,
+            meta={
+                "archive_file": archive_file,
+                "data_path": input_file,
+                "labels": [index_to_label[i] for i in range(len(index_to_label))],
+                "batch_size": batch_size,
+                "metrics": evaluation.metrics,
+            },
+        )
+    return evaluation.logits, evaluation.gold
+
+
+def validation_logits(
+    source: str,
+    input_file: Optional[str] = None,
+    cache: Optional[PredictionCache] = None,
+    overrides: str = "",
+    batch_size: Optional[int] = None,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    The validation `(logits, gold)` of `source`: the `.npz` predictions of `evaluate_mult`, an
+    entry of its prediction cache, or an archived model evaluated on `input_file`.
+    """
+    if source.endswith(".npz"):
+        with numpy.load(source) as predictions:
+            if "gold" not in predictions.files:
+                raise ConfigurationError("%s has no gold labels" % source)
+            return predictions["logits"], predictions["gold"]
+    if is_cache_entry(source):
+        cached = PredictionCache(os.path.dirname(os.path.abspath(source))).load(
+            os.path.basename(os.path.abspath(source))
+        )
+        return cached.logits, cached.gold
+    if input_file is None:
+        raise ConfigurationError("An input file is needed to fit the temperature of %s" % source)
+    return archive_validation_logits(
+        source, input_file, cache, overrides=overrides, batch_size=batch_size
+    )
+
+
+def fit_temperatures(
+    sources: List[str],
+    input_file: Optional[str] = None,
+    cache: Optional[PredictionCache] = None,
+    overrides: str = "",
+    batch_size: Optional[int] = None,
+    lr: float = 0.01,
+    max_iter: int = 500,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    The `TemperatureFit` (as a dict, with the number of examples it was fitted on) of every
+    source, see `validation_logits`. Examples without a gold label (`-1`) do not take part in
+    the fit.
+    """
+    report: Dict[str, Dict[str, Any]] = {}
+    for source in sources:
+        logits, gold = validation_logits(source, input_file, cache, overrides, batch_size)
+        labelled = numpy.asarray(gold) >= 0
+        fit = fit_temperature(
+            torch.from_numpy(numpy.asarray(logits)[labelled]),
+            torch.from_numpy(numpy.asarray(gold)[labelled]),
+            lr=lr,
+            max_iter=max_iter,
+        )
+        report[source] = dict(fit._asdict(), num_examples=int(labelled.sum()))
+        logger.info("%s: %s", source, json.dumps(report[source]))
+    return report
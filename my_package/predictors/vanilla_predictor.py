@@ -4,11 +4,14 @@ import numpy
 
 
 from allennlp.common.util import JsonDict
-from allennlp.data import Instance
+from allennlp.data import DatasetReader, Instance
+from allennlp.models import Model
 from allennlp.predictors.predictor import Predictor
 from allennlp.data.fields import LabelField
 from overrides.overrides import op_stream
 
+from my_package.modules.quantization import quantize_dynamic_int8
+
 
 @Predictor.register("vanilla_textual_entailment")
 class TextualEntailmentPredictor(Predictor):
@@ -16,8 +19,18 @@ class TextualEntailmentPredictor(Predictor):
     Predictor for the [`DecomposableAttention`](../models/decomposable_attention.md) model.
 
     Registered as a `Predictor` with name "textual_entailment".
+
+    With `quantize` (`--predictor-args '{"quantize": true}'`), the model runs on CPU with the
+    linear layers of its encoder dynamically quantized to int8.
     """
 
+    def __init__(
+        self, model: Model, dataset_reader: DatasetReader, frozen: bool = True, quantize: bool = False
+    ) -> None:
+        if quantize:
+            model = quantize_dynamic_int8(model, inplace=True)
+        super().__init__(model, dataset_reader, frozen)
+
     def predict(self, premise: str, hypothesis: str) -> JsonDict:
         """
         Predicts whether the hypothesis is entailed by the premise text.
@@ -0,0 +1,2 @@
+from my_package.training.callbacks.activation_memory import ActivationMemoryCallback
+from my_package.training.callbacks.padding_efficiency import PaddingEfficiencyCallback
@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import torch
+from overrides import overrides
+
+from allennlp.data import TensorDict
+from allennlp.training.callbacks.callback import TrainerCallback
+
+from my_package.modules.gradient_checkpointing import enable_gradient_checkpointing
+
+logger = logging.getLogger(__name__)
+
+PEAK_MEMORY_FILE = "peak_memory.json"
+
+
+@TrainerCallback.register("activation_memory")
+class ActivationMemoryCallback(TrainerCallback):
+    """
+    Switches activation checkpointing on in the transformer embedders of the trained model,
+    whatever classifier of `my_package.models` it is, and reports the peak GPU memory of every
+    batch, so that the batch size of the long input (`max_length: 512`) configs can be raised
+    on the same hardware.
+
+    The peak memory allocated during a training batch (forward, backward and optimizer step) is
+    shown as `peak_memory_MB` in the progress bar, and the largest and mean peaks of every epoch
+    are added to the epoch metrics and written to `peak_memory.json` in the serialization
+    directory. Nothing is measured on CPU.
+
+    Registered as a `TrainerCallback` with name "activation_memory".
+
+    # Parameters
+
+    serialization_dir : `str`
+    gradient_checkpointing : `bool`, optional (default = `True`)
+        Recompute the activations of the transformer layers in the backward pass instead of
+        keeping them.
+    """
+
+    def __init__(self, serialization_dir: str, gradient_checkpointing: bool = True) -> None:
+        super().__init__(serialization_dir)
+        self._gradient_checkpointing = gradient_checkpointing
+        self._device: Optional[torch.device] = None
+        self._batch_peaks: List[float] = []
+        self._epochs: List[Dict[str, float]] = []
+
+    @overrides
+    def on_start(self, trainer, is_primary: bool = True, **kwargs) -> None:
+        super().on_start(trainer, is_primary=is_primary, **kwargs)
+        if self._gradient_checkpointing:
+            num_switched = enable_gradient_checkpointing(trainer.model)
+            logger.info("Gradient checkpointing enabled in %d transformer(s)", num_switched)
+        device = torch.device(trainer.cuda_device)
+        if device.type == "cuda":
+            self._device = device
+            torch.cuda.reset_peak_memory_stats(device)
+
+    @overrides
+    def on_batch(
+        self,
+        trainer,
+        batch_inputs: List[TensorDict],
+        batch_outputs: List[Dict[str, Any]],
+        batch_metrics: Dict[str, Any],
+        epoch: int,
+        batch_number: int,
+        is_training: bool,
+        is_primary: bool = True,
+        batch_grad_norm: Optional[float] = None,
+        **kwargs,
+    ) -> None:
+        if self._device is None:
+            return
+        peak = torch.cuda.max_memory_allocated(self._device) / 2 ** 20
+        torch.cuda.reset_peak_memory_stats(self._device)
+        if is_training:
+            self._batch_peaks.append(peak)
+            batch_metrics["peak_memory_MB"] = peak
+
+    @overrides
+    def on_epoch(
+        self, trainer, metrics: Dict[str, Any], epoch: int, is_primary: bool = True, **kwargs
+    ) -> None:
+        if not self._batch_peaks:
+            return
+        summary = {
+            "epoch": epoch,
+            "max_batch_peak_memory_MB": max(self._batch_peaks),
+            "mean_batch_peak_memory_MB": sum(self._batch_peaks) / len(self._batch_peaks),
+        }
+        self._batch_peaks = []
+        self._epochs.append(summary)
+        metrics.update({key: value for key, value in summary.items() if key != "epoch"})
+        logger.info("Peak memory per batch: %s", summary)
+        if is_primary:
+            with open(os.path.join(self.serialization_dir, PEAK_MEMORY_FILE), "w") as fh:
+                json.dump(self._epochs, fh, indent=2)
@@ -0,0 +1,68 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from overrides import overrides
+
+from allennlp.data import TensorDict
+from allennlp.training.callbacks.callback import TrainerCallback
+
+from my_package.data.samplers.token_budget_sampler import TokenBudgetBatchSampler
+
+logger = logging.getLogger(__name__)
+
+
+def sampler_padding_efficiency(data_loader) -> Optional[float]:
+    """
+    The padding efficiency of the last epoch of a data loader batched by the "token_budget"
+    sampler, or `None` (other samplers, or batches drawn in worker processes).
+    """
+    batch_sampler = getattr(data_loader, "batch_sampler", None)
+    if isinstance(batch_sampler, TokenBudgetBatchSampler):
+        return batch_sampler.last_padding_efficiency
+    return None
+
+
+@TrainerCallback.register("padding_efficiency")
+class PaddingEfficiencyCallback(TrainerCallback):
+    """
+    Reports the padding efficiency (real tokens / padded tokens) of the batches of the
+    "token_budget" sampler: as `padding_efficiency` in the progress bar, and as
+    `training_padding_efficiency` and `validation_padding_efficiency` in the epoch metrics
+    (and so in `metrics.json`).
+
+    Registered as a `TrainerCallback` with name "padding_efficiency".
+    """
+
+    @overrides
+    def on_batch(
+        self,
+        trainer,
+        batch_inputs: List[TensorDict],
+        batch_outputs: List[Dict[str, Any]],
+        batch_metrics: Dict[str, Any],
+        epoch: int,
+        batch_number: int,
+        is_training: bool,
+        is_primary: bool = True,
+        batch_grad_norm: Optional[float] = None,
+        **kwargs,
+    ) -> None:
+        if not is_training:
+            return
+        efficiency = sampler_padding_efficiency(trainer.data_loader)
+        if efficiency is not None:
+            batch_metrics["padding_efficiency"] = efficiency
+
+    @overrides
+    def on_epoch(
+        self, trainer, metrics: Dict[str, Any], epoch: int, is_primary: bool = True, **kwargs
+    ) -> None:
+        data_loaders = {
+            "training": trainer.data_loader,
+            "validation": getattr(trainer, "_validation_data_loader", None),
+        }
+        for split, data_loader in data_loaders.items():
+            efficiency = sampler_padding_efficiency(data_loader)
+            if efficiency is not None:
+                metrics[f"{split}_padding_efficiency"] = efficiency
+                logger.info("Epoch %d %s padding efficiency: %.3f", epoch, split, efficiency)
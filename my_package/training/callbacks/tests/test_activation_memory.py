@@ -0,0 +1,85 @@
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+
+import torch
+from transformers import BertConfig, BertTokenizer
+
+from allennlp.data import Vocabulary
+from allennlp.modules.seq2vec_encoders import BertPooler
+from allennlp.modules.text_field_embedders import BasicTextFieldEmbedder
+from allennlp.modules.token_embedders import PretrainedTransformerEmbedder
+
+from my_package.models.product_of_expert_classifier import ProductofExpertBasicClassifier
+from my_package.modules.gradient_checkpointing import enable_gradient_checkpointing
+from my_package.training.callbacks import ActivationMemoryCallback
+
+
+class TestActivationMemory(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        bert_dir = self.tmp_dir.name
+        words = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [str(i) for i in range(45)]
+        vocab_file = os.path.join(bert_dir, "vocab.txt")
+        with open(vocab_file, "w") as f:
+            f.write("\n".join(words) + "\n")
+        BertTokenizer(vocab_file).save_pretrained(bert_dir)
+        BertConfig(
+            vocab_size=50,
+            hidden_size=16,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=32,
+            hidden_dropout_prob=0.0,
+            attention_probs_dropout_prob=0.0,
+        ).save_pretrained(bert_dir)
+
+        vocab = Vocabulary()
+        vocab.add_tokens_to_namespace(["entailment", "neutral", "contradiction"], "labels")
+        self.embedder = PretrainedTransformerEmbedder(bert_dir, load_weights=False)
+        self.model = ProductofExpertBasicClassifier(
+            vocab,
+            text_field_embedder=BasicTextFieldEmbedder({"tokens": self.embedder}),
+            seq2vec_encoder=BertPooler(bert_dir, load_weights=False),
+        )
+        token_ids = torch.randint(5, 50, (3, 9))
+        mask = torch.ones_like(token_ids, dtype=torch.bool)
+        mask[2, 6:] = False
+        self.batch = {
+            "tokens": {"tokens": {"token_ids": token_ids, "mask": mask}},
+            "label": torch.tensor([0, 1, 2]),
+            "bias_probs": torch.softmax(torch.randn(3, 3), dim=-1),
+        }
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _gradients(self):
+        self.model.zero_grad()
+        self.model.train()
+        self.model(**self.batch)["loss"].backward()
+        return [p.grad.clone() for p in self.embedder.parameters() if p.grad is not None]
+
+    def test_checkpointing_keeps_the_gradients(self):
+        expected = self._gradients()
+        self.assertEqual(enable_gradient_checkpointing(self.model), 1)
+        self.assertTrue(self.embedder.transformer_model.encoder.gradient_checkpointing)
+        gradients = self._gradients()
+        self.assertEqual(len(gradients), len(expected))
+        for gradient, expected_gradient in zip(gradients, expected):
+            torch.testing.assert_close(gradient, expected_gradient)
+
+        enable_gradient_checkpointing(self.model, enable=False)
+        self.assertFalse(self.embedder.transformer_model.encoder.gradient_checkpointing)
+
+    def test_callback_switches_checkpointing_on(self):
+        callback = ActivationMemoryCallback(self.tmp_dir.name)
+        callback.on_start(SimpleNamespace(model=self.model, cuda_device=torch.device("cpu")))
+        self.assertTrue(self.embedder.transformer_model.encoder.gradient_checkpointing)
+
+        metrics = {"loss": 1.0}
+        callback.on_batch(None, [self.batch], [{}], metrics, 0, 1, is_training=True)
+        callback.on_epoch(None, metrics, 0)
+        self.assertEqual(metrics, {"loss": 1.0})
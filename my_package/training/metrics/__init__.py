@@ -0,0 +1,2 @@
+from my_package.training.metrics.example_average import ExampleAverage
+from my_package.training.metrics.fused_f1_measure import FusedF1Measure
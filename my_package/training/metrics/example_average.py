@@ -0,0 +1,29 @@
+from overrides import overrides
+
+from allennlp.nn.util import dist_reduce_sum
+from allennlp.training.metrics import Average
+from allennlp.training.metrics.metric import Metric
+
+
+@Metric.register("example_average")
+class ExampleAverage(Average):
+    """
+    The mean of a per-example value over all the examples seen, e.g. the number of layers an
+    example went through. Unlike `Average`, which averages one value per call (a batch mean),
+    every batch weighs as many examples as it holds, so a partial last batch does not bias the
+    result.
+
+    Registered as a `Metric` with name "example_average".
+    """
+
+    @overrides
+    def __call__(self, values):
+        """
+        # Parameters
+
+        values : `torch.Tensor`
+            The value of every example of the batch.
+        """
+        (values,) = self.detach_tensors(values)
+        self._count += dist_reduce_sum(values.numel())
+        self._total_value += dist_reduce_sum(float(values.float().sum()))
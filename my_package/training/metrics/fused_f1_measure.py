@@ -0,0 +1,88 @@
+from typing import Dict, List, Optional
+
+import torch
+from overrides import overrides
+
+from allennlp.data import Vocabulary
+from allennlp.nn.util import dist_reduce_sum
+from allennlp.training.metrics.metric import Metric
+
+
+@Metric.register("fused_f1")
+class FusedF1Measure(Metric):
+    """
+    Per-class precision, recall and F1 and the macro F1 of a K-class classifier from a single
+    K x K confusion matrix, updated with one scatter-add per batch instead of one
+    `F1Measure` per label. The metric names are `"<label>_precision"`, `"<label>_recall"`,
+    `"<label>_f1"` (the names the per-label `F1Measure` loops used to report) and `"macro_f1"`.
+
+    Registered as a `Metric` with name "fused_f1".
+
+    # Parameters
+
+    labels : `List[str]`
+        Name of every class index, used as the prefix of its metrics.
+    """
+
+    def __init__(self, labels: List[str]) -> None:
+        self._labels = list(labels)
+        self._num_classes = len(self._labels)
+        self._confusion = torch.zeros(self._num_classes, self._num_classes)
+
+    @classmethod
+    def from_vocab(
+        cls, vocab: Vocabulary, namespace: str = "labels", num_labels: Optional[int] = None
+    ) -> "FusedF1Measure":
+        index_to_label = vocab.get_index_to_token_vocabulary(namespace)
+        num_labels = num_labels or len(index_to_label)
+        return cls([index_to_label.get(i, str(i)) for i in range(num_labels)])
+
+    def __call__(
+        self,
+        predictions: torch.Tensor,
+        gold_labels: torch.Tensor,
+        mask: Optional[torch.BoolTensor] = None,
+    ):
+        """
+        # Parameters
+
+        predictions : `torch.Tensor`
+            Logits or probabilities of shape `(batch_size, ..., num_classes)`.
+        gold_labels : `torch.Tensor`
+            Class indices of shape `(batch_size, ...)`.
+        mask : `torch.BoolTensor`, optional (default = `None`)
+            Same shape as `gold_labels`.
+        """
+        predictions, gold_labels, mask = self.detach_tensors(predictions, gold_labels, mask)
+        if self._confusion.device != predictions.device:
+            self._confusion = self._confusion.to(predictions.device)
+
+        cells = gold_labels.long().view(-1) * self._num_classes + predictions.argmax(-1).view(-1)
+        weights = (
+            mask.view(-1).to(self._confusion.dtype)
+            if mask is not None
+            else torch.ones_like(cells, dtype=self._confusion.dtype)
+        )
+        batch_confusion = torch.zeros_like(self._confusion).view(-1)
+        batch_confusion.scatter_add_(0, cells, weights)
+        self._confusion += dist_reduce_sum(batch_confusion.view_as(self._confusion))
+
+    def get_metric(self, reset: bool = False) -> Dict[str, float]:
+        true_positives = self._confusion.diagonal()
+        precision = true_positives / self._confusion.sum(0).clamp(min=1)
+        recall = true_positives / self._confusion.sum(1).clamp(min=1)
+        f1 = 2 * precision * recall / (precision + recall).clamp(min=1e-13)
+
+        metrics: Dict[str, float] = {}
+        for index, label in enumerate(self._labels):
+            metrics["%s_precision" % label] = precision[index].item()
+            metrics["%s_recall" % label] = recall[index].item()
+            metrics["%s_f1" % label] = f1[index].item()
+        metrics["macro_f1"] = f1.mean().item()
+        if reset:
+            self.reset()
+        return metrics
+
+    @overrides
+    def reset(self) -> None:
+        self._confusion = torch.zeros_like(self._confusion)
@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+import torch
+
+from allennlp.training.metrics import F1Measure
+
+from my_package.training.metrics import FusedF1Measure
+
+
+class TestFusedF1Measure(TestCase):
+    def test_matches_per_label_f1_measures(self):
+        torch.manual_seed(0)
+        labels = ["entailment", "neutral", "contradiction"]
+        fused = FusedF1Measure(labels)
+        per_label = [F1Measure(positive_label=i) for i in range(len(labels))]
+        for _ in range(3):
+            predictions = torch.rand(16, 3)
+            gold_labels = torch.randint(0, 3, (16,))
+            fused(predictions, gold_labels)
+            for metric in per_label:
+                metric(predictions, gold_labels)
+
+        metrics = fused.get_metric(reset=True)
+        expected_f1 = []
+        for label, metric in zip(labels, per_label):
+            for name, value in metric.get_metric().items():
+                self.assertAlmostEqual(metrics["%s_%s" % (label, name)], value, places=5)
+            expected_f1.append(metric.get_metric()["f1"])
+        self.assertAlmostEqual(metrics["macro_f1"], sum(expected_f1) / 3, places=5)
+        self.assertEqual(fused.get_metric()["macro_f1"], 0.0)
+
+    def test_mask_and_empty_classes(self):
+        fused = FusedF1Measure(["a", "b", "c"])
+        predictions = torch.tensor([[0.9, 0.1, 0.0], [0.2, 0.8, 0.0], [0.1, 0.9, 0.0]])
+        fused(predictions, torch.tensor([0, 1, 0]), mask=torch.tensor([True, True, False]))
+        metrics = fused.get_metric()
+        self.assertEqual(metrics["a_f1"], 1.0)
+        self.assertEqual(metrics["b_f1"], 1.0)
+        self.assertEqual(metrics["c_f1"], 0.0)
+        self.assertAlmostEqual(metrics["macro_f1"], 2 / 3, places=6)
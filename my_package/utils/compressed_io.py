@@ -0,0 +1,124 @@
+import gzip
+import io
+import queue
+import threading
+from typing import IO, Iterator, List, Optional, Union
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+_END = object()
+
+
+def detect_compression(file_path: str) -> Optional[str]:
+    """
+    Returns `"gzip"`, `"zstd"` or `None`, from the file extension or, failing that, from the
+    magic bytes at the start of the file.
+    """
+    if file_path.endswith((".gz", ".gzip")):
+        return "gzip"
+    if file_path.endswith((".zst", ".zstd")):
+        return "zstd"
+    with open(file_path, "rb") as fh:
+        magic = fh.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return "gzip"
+    if magic.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+def _open_decompressed(file_path: str, compression: str) -> IO[str]:
+    if compression == "gzip":
+        return gzip.open(file_path, "rt", encoding="utf-8")
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "Reading %s needs the `zstandard` package: pip install zstandard" % file_path
+        )
+    raw = open(file_path, "rb")
+    return io.TextIOWrapper(
+        zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8"
+    )
+
+
+class PrefetchingLineReader:
+    """
+    Iterates over the lines of a text stream that is read (and decompressed) by a background
+    thread, so that decompression overlaps with the work done on the lines by the caller.
+    Decompression in `gzip` and `zstandard` releases the GIL.
+
+    # Parameters
+
+    stream : `IO[str]`
+        The stream to read; it is closed together with this reader.
+    chunk_size : `int`, optional (default = `1 << 20`)
+        Approximate number of characters read by the background thread per chunk.
+    max_chunks : `int`, optional (default = `8`)
+        Number of chunks that may be read ahead of the caller.
+    """
+
+    def __init__(self, stream: IO[str], chunk_size: int = 1 << 20, max_chunks: int = 8) -> None:
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._queue: "queue.Queue[Union[List[str], BaseException, object]]" = queue.Queue(
+            max_chunks
+        )
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> None:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _produce(self) -> None:
+        try:
+            while not self._stop.is_set():
+                lines = self._stream.readlines(self._chunk_size)
+                if not lines:
+                    break
+                self._put(lines)
+        except BaseException as error:
+            self._put(error)
+        finally:
+            self._put(_END)
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield from item  # type: ignore
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._stream.close()
+
+    def __enter__(self) -> "PrefetchingLineReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def open_text(file_path: str, prefetch: bool = True) -> Union[IO[str], PrefetchingLineReader]:
+    """
+    Opens a (possibly gzip or zstd compressed) text file for line iteration. Plain files are
+    opened as usual; compressed files are decompressed by a background thread unless
+    `prefetch` is False.
+    """
+    compression = detect_compression(file_path)
+    if compression is None:
+        return open(file_path, "r")
+    stream = _open_decompressed(file_path, compression)
+    return PrefetchingLineReader(stream) if prefetch else stream
@@ -0,0 +1,26 @@
+import hashlib
+import os
+
+
+def file_digest(path: str, chunk_size: int = 1 << 22) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def path_digest(path: str) -> str:
+    """
+    The hash of a file, or of the relative paths and contents of all the files of a directory.
+    """
+    if not os.path.isdir(path):
+        return file_digest(path)
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+            digest.update(file_digest(file_path).encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,46 @@
+import gzip
+import os
+import tempfile
+from unittest import TestCase
+
+from ..compressed_io import PrefetchingLineReader, detect_compression, open_text
+
+
+class TestCompressedIO(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.lines = ['{"id": %d}\n' % i for i in range(1000)]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, name, opener=open):
+        path = os.path.join(self.tmp_dir.name, name)
+        with opener(path, "wt") as f:
+            f.writelines(self.lines)
+        return path
+
+    def test_plain_file(self):
+        path = self._write("data.jsonl")
+        self.assertIsNone(detect_compression(path))
+        with open_text(path) as f:
+            self.assertListEqual(list(f), self.lines)
+
+    def test_gzip_by_extension(self):
+        path = self._write("data.jsonl.gz", gzip.open)
+        self.assertEqual(detect_compression(path), "gzip")
+        with open_text(path) as f:
+            self.assertIsInstance(f, PrefetchingLineReader)
+            self.assertListEqual(list(f), self.lines)
+
+    def test_gzip_by_magic_bytes(self):
+        path = self._write("data.jsonl", gzip.open)
+        self.assertEqual(detect_compression(path), "gzip")
+        with open_text(path, prefetch=False) as f:
+            self.assertListEqual(list(f), self.lines)
+
+    def test_close_before_the_end(self):
+        path = self._write("data.jsonl.gz", gzip.open)
+        reader = PrefetchingLineReader(gzip.open(path, "rt"), chunk_size=16, max_chunks=1)
+        self.assertEqual(next(iter(reader)), self.lines[0])
+        reader.close()
@@ -0,0 +1,117 @@
+"""
+CPU throughput of the counterfactual classifier with the factual and counterfactual inputs
+encoded in one packed forward pass versus two separate passes, with a tiny randomly
+initialized BERT (no download needed).
+
+Run from the repository root:
+
+    PYTHONPATH=. python utils/benchmark_counterfactual_forward.py --batch_size 32 --seq_len 128
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import torch
+from transformers import BertConfig, BertTokenizer
+
+from allennlp.data import Vocabulary
+from allennlp.modules.seq2vec_encoders import BertPooler
+from allennlp.modules.text_field_embedders import BasicTextFieldEmbedder
+from allennlp.modules.token_embedders import PretrainedTransformerEmbedder
+
+from my_package.models.counterfactual_weight_classifier import CounterfactualWeightBasicClassifier
+
+
+def build_tiny_bert(model_dir: str, hidden_size: int, num_layers: int) -> None:
+    words = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [str(i) for i in range(995)]
+    vocab_file = os.path.join(model_dir, "vocab.txt")
+    with open(vocab_file, "w") as f:
+        f.write("\n".join(words) + "\n")
+    BertTokenizer(vocab_file).save_pretrained(model_dir)
+    BertConfig(
+        vocab_size=len(words),
+        hidden_size=hidden_size,
+        num_hidden_layers=num_layers,
+        num_attention_heads=2,
+        intermediate_size=hidden_size * 4,
+    ).save_pretrained(model_dir)
+
+
+def build_model(model_dir: str) -> CounterfactualWeightBasicClassifier:
+    vocab = Vocabulary()
+    vocab.add_tokens_to_namespace(["entailment", "neutral", "contradiction"], "labels")
+    embedder = PretrainedTransformerEmbedder(model_dir, load_weights=False)
+    return CounterfactualWeightBasicClassifier(
+        vocab,
+        text_field_embedder=BasicTextFieldEmbedder({"tokens": embedder}),
+        seq2vec_encoder=BertPooler(model_dir, load_weights=False),
+        counterfactual_loss_weight=1.0,
+    )
+
+
+def random_batch(batch_size: int, seq_len: int, mask_token_id: int):
+    token_ids = torch.randint(5, 1000, (batch_size, seq_len))
+    token_ids[:, 0] = 2
+    token_ids[:, -1] = 3
+    mask = torch.ones_like(token_ids, dtype=torch.bool)
+    type_ids = torch.zeros_like(token_ids)
+    tokens = {"tokens": {"token_ids": token_ids, "mask": mask, "type_ids": type_ids}}
+    cf_ids = token_ids.clone()
+    cf_ids[:, 1:-1] = mask_token_id
+    cf_tokens = {"tokens": {"token_ids": cf_ids, "mask": mask, "type_ids": type_ids}}
+    return tokens, cf_tokens, torch.randint(0, 3, (batch_size,))
+
+
+def throughput(step, batch_size: int, iterations: int) -> float:
+    step()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        step()
+    return batch_size * iterations / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--seq_len", type=int, default=128)
+    parser.add_argument("--hidden_size", type=int, default=128)
+    parser.add_argument("--num_layers", type=int, default=2)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        build_tiny_bert(model_dir, args.hidden_size, args.num_layers)
+        model = build_model(model_dir)
+    tokens, cf_tokens, label = random_batch(args.batch_size, args.seq_len, mask_token_id=4)
+
+    def separate_inference():
+        with torch.no_grad():
+            model(tokens=tokens, label=label)
+            model(tokens=cf_tokens, label=label)
+
+    def packed_inference():
+        with torch.no_grad():
+            model(tokens=tokens, label=label, cf_tokens=cf_tokens)
+
+    def separate_training():
+        (model(tokens=tokens, label=label)["loss"] + model(tokens=cf_tokens, label=label)["loss"]).backward()
+
+    def packed_training():
+        model(tokens=tokens, label=label, cf_tokens=cf_tokens)["loss"].backward()
+
+    print("pairs/s          separate   packed   speedup")
+    for name, separate, packed in [
+        ("inference", separate_inference, packed_inference),
+        ("training ", separate_training, packed_training),
+    ]:
+        model.train(name.startswith("training"))
+        separate_speed = throughput(separate, args.batch_size, args.iterations)
+        packed_speed = throughput(packed, args.batch_size, args.iterations)
+        print(
+            "%s  %10.1f %8.1f %8.2fx"
+            % (name, separate_speed, packed_speed, packed_speed / separate_speed)
+        )
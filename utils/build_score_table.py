@@ -0,0 +1,165 @@
+"""
+Builds an id-keyed score table that the dataset readers join onto the training data with
+`"score_table": <output_dir>`, instead of writing another copy of the training file with the
+extra column merged in (see `my_package/data/score_tables.py` for the format).
+
+Examples:
+
+    # sample weights / bias probs from an existing merged file, keyed by pairID
+    python build_score_table.py --input train_prob_korn.jsonl --id_key pairID \
+        --column sample_weight --column bias_probs --output_dir tables/korn
+
+    # teacher probs from `allennlp predict`, aligned line by line with the training file
+    python build_score_table.py --input raw_train.jsonl --ids_jsonl fever.train.jsonl \
+        --id_key id --column probs:distill_probs --output_dir tables/teacher
+
+    # Utama et al. bias logits ({id: logits}), with the probability of the gold label
+    python build_score_table.py --input raw/utama_bias_preds.json --softmax \
+        --column value:distill_probs --ids_jsonl fever.train.jsonl --id_key id \
+        --gold_prob_column bias_prob --label_key gold_label \
+        --labels "SUPPORTS,REFUTES,NOT ENOUGH INFO" --output_dir tables/utama
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+from typing import IO, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _open_text(file_path: str) -> IO[str]:
+    # plain, gzip (.gz) or zstd (.zst) compressed, also detected from the magic bytes
+    with open(file_path, "rb") as f:
+        magic = f.read(4)
+    if file_path.endswith(".gz") or magic.startswith(b"\x1f\x8b"):
+        return gzip.open(file_path, "rt")
+    if file_path.endswith(".zst") or magic.startswith(b"\x28\xb5\x2f\xfd"):
+        import zstandard
+        raw = open(file_path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return open(file_path, "r")
+
+
+def _read_jsonl(file_path: str) -> List[dict]:
+    output = []
+    with _open_text(file_path) as f:
+        for line in f:
+            output.append(json.loads(line))
+    return output
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    x = np.exp(x - x.max(axis=-1, keepdims=True))
+    return x / x.sum(axis=-1, keepdims=True)
+
+
+def _load_records(
+    input_path: str,
+    id_key: Optional[str],
+    ids_jsonl: Optional[str],
+) -> Tuple[List[dict], Optional[List[str]], Dict[str, dict]]:
+    """
+    Returns the score records, their ids (`None` for a positional table) and the documents of
+    `ids_jsonl` by id, which are used to look up gold labels.
+    """
+    id_docs = _read_jsonl(ids_jsonl) if ids_jsonl else []
+    docs_by_id = {str(doc[id_key]): doc for doc in id_docs} if id_key else {}
+
+    if input_path.endswith(".json"):
+        # {id: values}
+        with open(input_path, "r") as f:
+            data = json.load(f)
+        ids = [str(key) for key in data.keys()]
+        records = [{"value": value} for value in data.values()]
+        return records, ids, docs_by_id
+
+    records = _read_jsonl(input_path)
+    if id_docs:
+        if len(id_docs) != len(records):
+            raise Exception("Length Mismatch: %s and %s" % (input_path, ids_jsonl))
+        for record, doc in zip(records, id_docs):
+            for key, value in doc.items():
+                record.setdefault(key, value)
+    ids = [str(record[id_key]) for record in records] if id_key else None
+    return records, ids, docs_by_id
+
+
+def _write_table(
+    output_dir: str,
+    ids: Optional[List[str]],
+    id_key: Optional[str],
+    columns: Dict[str, np.ndarray],
+) -> None:
+    os.makedirs(output_dir, exist_ok=True)
+    size = len(next(iter(columns.values())))
+    if ids is not None:
+        ids_array = np.array(ids)
+        order = np.argsort(ids_array, kind="stable")
+        if len(np.unique(ids_array)) != len(ids_array):
+            print("Warning: duplicated ids, only the first occurrence will be joined.")
+        np.save(os.path.join(output_dir, "ids.npy"), ids_array[order])
+        columns = {name: column[order] for name, column in columns.items()}
+    for name, column in columns.items():
+        np.save(os.path.join(output_dir, "%s.npy" % name), column.astype(np.float32))
+    with open(os.path.join(output_dir, "meta.json"), "w") as f:
+        json.dump(
+            {"id_key": id_key if ids is not None else None, "size": size, "columns": list(columns)},
+            f,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--input", required=True, help="JSONL file with score columns, or a JSON {id: values}"
+    )
+    parser.add_argument("--output_dir", required=True)
+    parser.add_argument(
+        "--column",
+        action="append",
+        required=True,
+        help="SRC[:DST], take column SRC of the input and store it as DST (repeatable)",
+    )
+    parser.add_argument(
+        "--id_key",
+        default=None,
+        help="example id key, e.g. pairID or id; positional if omitted (JSONL input only)",
+    )
+    parser.add_argument(
+        "--ids_jsonl",
+        default=None,
+        help="data file aligned line by line with --input, used for ids and gold labels",
+    )
+    parser.add_argument("--softmax", action="store_true", help="apply softmax to the columns")
+    parser.add_argument(
+        "--gold_prob_column",
+        default=None,
+        help="also store the probability of the gold label of the first column under this name",
+    )
+    parser.add_argument("--label_key", default="gold_label")
+    parser.add_argument("--labels", default=None, help="comma separated labels in column order")
+    args = parser.parse_args()
+    if args.input.endswith(".json") and not args.id_key:
+        # the rows of a {id: values} input are stored sorted by id, they can only be joined by it
+        parser.error("--id_key is required for a JSON {id: values} input")
+
+    records, ids, docs_by_id = _load_records(args.input, args.id_key, args.ids_jsonl)
+
+    columns = {}
+    for spec in args.column:
+        src, _, dst = spec.partition(":")
+        column = np.array([record[src] for record in records], dtype=np.float32)
+        columns[dst or src] = _softmax(column) if args.softmax else column
+
+    if args.gold_prob_column:
+        labels = args.labels.split(",")
+        probs = next(iter(columns.values()))
+        gold = []
+        for i, record in enumerate(records):
+            doc = docs_by_id.get(ids[i], record) if ids is not None else record
+            gold.append(labels.index(doc[args.label_key]))
+        columns[args.gold_prob_column] = probs[np.arange(len(records)), gold]
+
+    _write_table(args.output_dir, ids, args.id_key, columns)
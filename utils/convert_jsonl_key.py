@@ -1,12 +1,27 @@
 import argparse
+import gzip
+import io
 import copy
 import json
-from typing import Dict, List, Union
+from typing import IO, Dict, List, Union
+
+
+def _open_text(file_path: str) -> IO[str]:
+    # plain, gzip (.gz) or zstd (.zst) compressed, also detected from the magic bytes
+    with open(file_path, 'rb') as f:
+        magic = f.read(4)
+    if file_path.endswith('.gz') or magic.startswith(b'\x1f\x8b'):
+        return gzip.open(file_path, 'rt')
+    if file_path.endswith('.zst') or magic.startswith(b'\x28\xb5\x2f\xfd'):
+        import zstandard
+        raw = open(file_path, 'rb')
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return open(file_path, 'r')
 
 
 def _read_jsonl(file_path: str) -> List[Dict[str, Union[str, int]]]:
     output = []
-    f = open(file_path, 'r')
+    f = _open_text(file_path)
     line = f.readline()
     while line:
         doc = json.loads(line)
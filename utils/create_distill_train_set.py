@@ -1,7 +1,24 @@
+import gzip
+import io
+from typing import IO
+
 import jsonlines
 import sys, getopt
 
 
+def _open_text(file_path: str) -> IO[str]:
+    # plain, gzip (.gz) or zstd (.zst) compressed, also detected from the magic bytes
+    with open(file_path, 'rb') as f:
+        magic = f.read(4)
+    if file_path.endswith('.gz') or magic.startswith(b'\x1f\x8b'):
+        return gzip.open(file_path, 'rt')
+    if file_path.endswith('.zst') or magic.startswith(b'\x28\xb5\x2f\xfd'):
+        import zstandard
+        raw = open(file_path, 'rb')
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return open(file_path, 'r')
+
+
 def main(argv):
     output_path = ''
 
@@ -24,11 +41,11 @@ def main(argv):
 
     # load files here
     out = []
-    with jsonlines.open(train_path) as f1,jsonlines.open(pred_path) as f2:
+    with jsonlines.Reader(_open_text(train_path)) as f1,jsonlines.Reader(_open_text(pred_path)) as f2:
         if len(list(f1.iter())) != len(list(f2.iter())):
            raise Exception('Length Mismatch: Please check the files')
 
-    with jsonlines.open(train_path) as f1,jsonlines.open(pred_path) as f2:
+    with jsonlines.Reader(_open_text(train_path)) as f1,jsonlines.Reader(_open_text(pred_path)) as f2:
         for line, line_pred in zip(f1.iter(),f2.iter()):
             line['logits'] = line_pred['logits']
             line['distill_probs'] = line_pred['probs']
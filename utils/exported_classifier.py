@@ -0,0 +1,120 @@
+"""
+Lightweight runtime for a classifier exported with `allennlp export_model`. It only needs
+torch (or onnxruntime for an ONNX export) and the transformers tokenizer, not AllenNLP.
+
+    classifier = ExportedClassifier("exported/mnli_bert_base")
+    classifier.predict([("A man is sleeping.", "A person sleeps.")])
+
+or, from the command line, for a jsonl file of premise/hypothesis (sentence1/sentence2 or
+evidence/claim) pairs:
+
+    python utils/exported_classifier.py exported/mnli_bert_base dev.jsonl --output-file raw_dev.jsonl
+"""
+import argparse
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy
+
+
+class ExportedClassifier:
+    def __init__(self, export_dir: str, num_threads: Optional[int] = None) -> None:
+        with open(os.path.join(export_dir, "runtime.json")) as config_file:
+            self.config = json.load(config_file)
+        self.labels: List[str] = self.config["labels"]
+        path = os.path.join(export_dir, self.config["model_file"])
+        if self.config["format"] == "onnx":
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            if num_threads:
+                options.intra_op_num_threads = num_threads
+            self._session = onnxruntime.InferenceSession(path, options)
+            self._module = None
+        else:
+            import torch
+
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            self._module = torch.jit.load(path).eval()
+        self._tokenizer = None
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            self._tokenizer = AutoTokenizer.from_pretrained(self.config["transformer_model"])
+        return self._tokenizer
+
+    def predict_ids(
+        self, token_ids: numpy.ndarray, mask: numpy.ndarray, type_ids: numpy.ndarray
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Returns the logits and probabilities for `(batch_size, num_tokens)` int64 inputs.
+        """
+        inputs = [numpy.asarray(array, dtype=numpy.int64) for array in (token_ids, mask, type_ids)]
+        if self._module is None:
+            logits, probs = self._session.run(None, dict(zip(self.config["input_names"], inputs)))
+            return logits, probs
+        import torch
+
+        with torch.no_grad():
+            logits, probs = self._module(*[torch.from_numpy(array) for array in inputs])
+        return logits.numpy(), probs.numpy()
+
+    def encode(self, pairs: Sequence[Tuple[str, str]]) -> Tuple[numpy.ndarray, ...]:
+        encoded = self.tokenizer(
+            [premise for premise, _ in pairs],
+            [hypothesis for _, hypothesis in pairs],
+            padding=True,
+            truncation=True,
+            max_length=self.config.get("max_length") or self.tokenizer.model_max_length,
+            return_tensors="np",
+        )
+        token_ids = encoded["input_ids"]
+        type_ids = encoded.get("token_type_ids", numpy.zeros_like(token_ids))
+        return token_ids, encoded["attention_mask"], type_ids
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32) -> List[Dict]:
+        predictions = []
+        for start in range(0, len(pairs), batch_size):
+            logits, probs = self.predict_ids(*self.encode(pairs[start : start + batch_size]))
+            for row_logits, row_probs in zip(logits, probs):
+                predictions.append(
+                    {
+                        "label": self.labels[int(row_probs.argmax())],
+                        "probs": row_probs.tolist(),
+                        "logits": row_logits.tolist(),
+                    }
+                )
+        return predictions
+
+
+def read_pair(example: Dict) -> Tuple[str, str]:
+    if "premise" in example:
+        return example["premise"], example["hypothesis"]
+    if "claim" in example:
+        return example.get("evidence", example.get("evidence_sentence")), example["claim"]
+    return example["sentence1"], example["sentence2"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("export_dir")
+    parser.add_argument("input_file")
+    parser.add_argument("--output-file", default=None)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    classifier = ExportedClassifier(args.export_dir, num_threads=args.threads)
+    with open(args.input_file) as input_file:
+        pairs = [read_pair(json.loads(line)) for line in input_file if line.strip()]
+    predictions = classifier.predict(pairs, batch_size=args.batch_size)
+    output = open(args.output_file, "w") if args.output_file else None
+    for prediction in predictions:
+        print(json.dumps(prediction), file=output)
+    if output is not None:
+        output.close()
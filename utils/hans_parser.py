@@ -1,8 +1,25 @@
 import sys, getopt
 import jsonlines
+import gzip
+import io
+from typing import IO
 import datetime
 import time
 
+
+def _open_text(file_path: str) -> IO[str]:
+    # plain, gzip (.gz) or zstd (.zst) compressed, also detected from the magic bytes
+    with open(file_path, 'rb') as f:
+        magic = f.read(4)
+    if file_path.endswith('.gz') or magic.startswith(b'\x1f\x8b'):
+        return gzip.open(file_path, 'rt')
+    if file_path.endswith('.zst') or magic.startswith(b'\x28\xb5\x2f\xfd'):
+        import zstandard
+        raw = open(file_path, 'rb')
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return open(file_path, 'r')
+
+
 def main(argv):
    inputfile = ''
    outputfile = ''
@@ -21,7 +38,7 @@ def main(argv):
          outputfile = arg
    print('Input file is ', inputfile)
    print('Output file is ', outputfile)
-   with jsonlines.open(inputfile) as reader:
+   with jsonlines.Reader(_open_text(inputfile)) as reader:
        with open(outputfile, 'w') as writer:
            writer.write("pairID,gold_label\n")
            for idx, obj in enumerate(reader):